@@ -0,0 +1 @@
+""" Offline benchmarks of pydx: a local Metadata API stand-in, synthetic metadata and the suite running them """
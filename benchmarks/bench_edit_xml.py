@@ -0,0 +1,54 @@
+""" Scaling of Helper.editXML by number of worker processes on synthetic profiles
+
+Usage: python benchmarks/bench_edit_xml.py [--profiles N] [--entries N] [--workers 1,2,4]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.generators import buildProfile
+from pydx.engine.helpers import Helper
+from pydx.standard_plugins import standard_plugins
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--profiles', type=int, default=200, help='Number of profiles')
+  parser.add_argument('--entries', type=int, default=500, help='Class accesses in each profile (field permissions are 4 times as many)')
+  parser.add_argument('--workers', default=','.join(str(2 ** i) for i in range(os.cpu_count().bit_length()) if 2 ** i <= os.cpu_count()), help='Comma separated worker counts')
+  args = parser.parse_args()
+
+  profile = buildProfile(args.entries)
+  source = tempfile.mkdtemp()
+  os.makedirs(f'{source}/profiles')
+  for i in range(args.profiles):
+    with open(f'{source}/profiles/Profile{i}.profile', 'w') as f:
+      f.write(profile)
+
+  print(f'{args.profiles} profiles of {len(profile) / 1024 / 1024:.2f} MB, {os.cpu_count()} CPUs')
+
+  baseline = None
+  try:
+    for workers in [int(value) for value in args.workers.split(',')]:
+      outputDir = tempfile.mkdtemp()
+      shutil.copytree(f'{source}/profiles', f'{outputDir}/profiles')
+
+      helper = Helper(outputDir, workers=workers)
+      start = time.perf_counter()
+      helper.editXML('profiles/*.profile', standard_plugins.enableClassAccessLevel)
+      elapsed = time.perf_counter() - start
+      helper.close()
+      shutil.rmtree(outputDir)
+
+      baseline = baseline or elapsed
+      print(f'workers={workers:<3} {elapsed:8.2f} s   speedup {baseline / elapsed:5.2f}x')
+  finally:
+    shutil.rmtree(source)
+
+if __name__ == '__main__':
+  main()
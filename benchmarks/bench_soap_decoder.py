@@ -0,0 +1,88 @@
+""" Per-poll CPU cost of decoding a large checkDeployStatus response
+
+Usage: python benchmarks/bench_soap_decoder.py [--response recorded.xml] [--components N] [--tests N] [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pydx.sfdc import soap_decoder
+
+def buildResponse(components, tests):
+  """
+  Build a checkDeployStatus response with details, as returned for a large deploy.
+  """
+  successes = ''.join(
+    f'<componentSuccesses><changed>true</changed><componentType>ApexClass</componentType><created>false</created><createdDate>2022-06-01T10:00:00.000Z</createdDate><deleted>false</deleted><fileName>classes/Class{i}.cls</fileName><fullName>Class{i}</fullName><id>01p000000000{i:06d}</id><success>true</success></componentSuccesses>'
+    for i in range(components)
+  )
+  testSuccesses = ''.join(
+    f'<successes><id>01p000000000{i:06d}</id><methodName>testMethod{i}</methodName><name>Class{i}Test</name><namespace xsi:nil="true"/><time>{i % 1000}.0</time></successes>'
+    for i in range(tests)
+  )
+
+  return f'''<?xml version="1.0" encoding="UTF-8"?><soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns="http://soap.sforce.com/2006/04/metadata" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"><soapenv:Body><checkDeployStatusResponse><result><checkOnly>true</checkOnly><completedDate>2022-06-01T10:30:00.000Z</completedDate><createdBy>005000000000001</createdBy><createdByName>User</createdByName><createdDate>2022-06-01T10:00:00.000Z</createdDate><details>{successes}<runTestResult><numFailures>0</numFailures><numTestsRun>{tests}</numTestsRun>{testSuccesses}<totalTime>1000.0</totalTime></runTestResult></details><done>false</done><id>0Af000000000001</id><ignoreWarnings>false</ignoreWarnings><lastModifiedDate>2022-06-01T10:30:00.000Z</lastModifiedDate><numberComponentErrors>0</numberComponentErrors><numberComponentsDeployed>{components}</numberComponentsDeployed><numberComponentsTotal>{components}</numberComponentsTotal><numberTestErrors>0</numberTestErrors><numberTestsCompleted>{tests // 2}</numberTestsCompleted><numberTestsTotal>{tests}</numberTestsTotal><rollbackOnError>true</rollbackOnError><runTestsEnabled>true</runTestsEnabled><startDate>2022-06-01T10:00:00.000Z</startDate><stateDetail>Running Test: Class1Test.testMethod1</stateDetail><status>InProgress</status><success>false</success></result></checkDeployStatusResponse></soapenv:Body></soapenv:Envelope>'''.encode()
+
+def decodeWithBeautifulSoup(content):
+  """
+  The BeautifulSoup parsing previously done by Sfdc.isDeploying for every poll.
+  """
+  soup = BeautifulSoup(content, 'xml')
+  result = soup.Body.checkDeployStatusResponse.result.done
+
+  deployResult = {
+    'numberComponentsDeployed': int(soup.Body.checkDeployStatusResponse.result.numberComponentsDeployed.text),
+    'numberComponentErrors': int(soup.Body.checkDeployStatusResponse.result.numberComponentErrors.text),
+    'componentsDone': int(soup.Body.checkDeployStatusResponse.result.numberComponentsDeployed.text) + int(soup.Body.checkDeployStatusResponse.result.numberComponentErrors.text),
+    'numberComponentsTotal': int(soup.Body.checkDeployStatusResponse.result.numberComponentsTotal.text),
+    'numberTestsCompleted': int(soup.Body.checkDeployStatusResponse.result.numberTestsCompleted.text),
+    'numberTestErrors': int(soup.Body.checkDeployStatusResponse.result.numberTestErrors.text),
+    'testsDone': int(soup.Body.checkDeployStatusResponse.result.numberTestsCompleted.text) + int(soup.Body.checkDeployStatusResponse.result.numberTestErrors.text),
+    'numberTestsTotal': int(soup.Body.checkDeployStatusResponse.result.numberTestsTotal.text),
+    'stateDetail': soup.Body.checkDeployStatusResponse.result.stateDetail.text if soup.Body.checkDeployStatusResponse.result.stateDetail else None,
+    'status': soup.Body.checkDeployStatusResponse.result.status.text,
+  }
+
+  return (result.text == 'true', deployResult)
+
+def measure(decode, content, repeat):
+  """
+  Returns the best CPU time of a single decode, in milliseconds.
+  """
+  timings = []
+  for _ in range(repeat):
+    start = time.process_time()
+    decode(content)
+    timings.append(time.process_time() - start)
+  return min(timings) * 1000
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--response', help='A recorded checkDeployStatus response to decode')
+  parser.add_argument('--components', type=int, default=5000, help='Components in the synthetic response')
+  parser.add_argument('--tests', type=int, default=10000, help='Test results in the synthetic response')
+  parser.add_argument('--repeat', type=int, default=5, help='Decodes measured for each decoder')
+  args = parser.parse_args()
+
+  if args.response:
+    with open(args.response, 'rb') as f:
+      content = f.read()
+  else:
+    content = buildResponse(args.components, args.tests)
+
+  before = measure(decodeWithBeautifulSoup, content, args.repeat)
+  after = measure(soap_decoder.decodeDeployStatus, content, args.repeat)
+
+  print(f'Response size:           {len(content) / 1024 / 1024:.2f} MB')
+  print(f'BeautifulSoup per poll:  {before:.1f} ms')
+  print(f'soap_decoder per poll:   {after:.1f} ms')
+  print(f'Speedup:                 {before / after:.1f}x')
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,136 @@
+""" Synthetic metadata in the Metadata API format, sized like the orgs we deploy """
+
+import os
+
+# Share of the generated bytes and size of each file, for each kind of metadata
+LAYOUT = {
+  'profiles': (0.5, 2 * 1024 * 1024),
+  'objects': (0.3, 256 * 1024),
+  'layouts': (0.15, 32 * 1024),
+  'classes': (0.05, 8 * 1024)
+}
+
+# User permissions and list views removed by the standard plugins, so they have some work to do
+REMOVED_PERMISSIONS = ['ManageSandboxes', 'ManageTranslation', 'ViewUserPII']
+REMOVED_LIST_VIEWS = ['CompletedTasks', 'OpenTasks', 'TodaysTasks']
+
+def buildProfile(entries):
+  """
+  Build a profile with the given number of class accesses, field permissions and user permissions.
+  """
+  parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<Profile xmlns="http://soap.sforce.com/2006/04/metadata">']
+  for i in range(entries):
+    parts.append(f'    <classAccesses>\n        <apexClass>Class{i}</apexClass>\n        <enabled>false</enabled>\n    </classAccesses>')
+  for i in range(entries * 4):
+    parts.append(f'    <fieldPermissions>\n        <editable>true</editable>\n        <field>Account.Field{i}__c</field>\n        <readable>true</readable>\n    </fieldPermissions>')
+  for i in range(entries):
+    name = REMOVED_PERMISSIONS[i % len(REMOVED_PERMISSIONS)] if i % 50 == 0 else f'Permission{i}'
+    parts.append(f'    <userPermissions>\n        <enabled>true</enabled>\n        <name>{name}</name>\n    </userPermissions>')
+  parts.append('</Profile>\n')
+  return '\n'.join(parts)
+
+def buildObject(fields):
+  """
+  Build a custom object with the given number of fields and a few list views.
+  """
+  parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<CustomObject xmlns="http://soap.sforce.com/2006/04/metadata">']
+  for i in range(fields):
+    parts.append(f'    <fields>\n        <fullName>Field{i}__c</fullName>\n        <externalId>false</externalId>\n        <label>Field {i}</label>\n        <length>255</length>\n        <required>false</required>\n        <trackHistory>false</trackHistory>\n        <type>Text</type>\n        <unique>false</unique>\n    </fields>')
+  for name in REMOVED_LIST_VIEWS + [f'View{i}' for i in range(max(1, fields // 20))]:
+    parts.append(f'    <listViews>\n        <fullName>{name}</fullName>\n        <filterScope>Mine</filterScope>\n        <label>{name}</label>\n    </listViews>')
+  parts.append('    <label>Object</label>\n    <sharingModel>ReadWrite</sharingModel>\n</CustomObject>\n')
+  return '\n'.join(parts)
+
+def buildLayout(fields):
+  """
+  Build a page layout showing the given number of fields.
+  """
+  parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<Layout xmlns="http://soap.sforce.com/2006/04/metadata">\n    <layoutSections>\n        <customLabel>false</customLabel>\n        <detailHeading>false</detailHeading>\n        <editHeading>true</editHeading>\n        <label>Information</label>\n        <layoutColumns>']
+  for i in range(fields):
+    parts.append(f'            <layoutItems>\n                <behavior>Edit</behavior>\n                <field>Field{i}__c</field>\n            </layoutItems>')
+  parts.append('        </layoutColumns>\n        <style>OneColumn</style>\n    </layoutSections>\n</Layout>\n')
+  return '\n'.join(parts)
+
+def buildClass(methods):
+  """
+  Build an Apex class with the given number of methods.
+  """
+  body = ''.join(f'\n  public static Integer method{i}(Integer value) {{\n    return value + {i};\n  }}\n' for i in range(methods))
+  return f'public with sharing class Generated {{{body}}}\n'
+
+def buildConnectedApp():
+  return '<?xml version="1.0" encoding="UTF-8"?>\n<ConnectedApp xmlns="http://soap.sforce.com/2006/04/metadata">\n    <contactEmail>admin@example.com</contactEmail>\n    <label>App</label>\n    <oauthConfig>\n        <callbackUrl>https://example.com/callback</callbackUrl>\n        <consumerKey>3MVG9000000000000000000000000000000000000000000000000000000000000000000000000000</consumerKey>\n        <scopes>Api</scopes>\n    </oauthConfig>\n</ConnectedApp>\n'
+
+# Connected apps are few and small in every org
+CONNECTED_APPS = 10
+
+BUILDERS = {
+  'profiles': (buildProfile, 'Profile', '.profile'),
+  'objects': (buildObject, 'CustomObject', '.object'),
+  'layouts': (buildLayout, 'Layout', '.layout'),
+  'classes': (buildClass, 'ApexClass', '.cls')
+}
+
+CLASS_META = '<?xml version="1.0" encoding="UTF-8"?>\n<ApexClass xmlns="http://soap.sforce.com/2006/04/metadata">\n    <apiVersion>{version}</apiVersion>\n    <status>Active</status>\n</ApexClass>\n'
+
+def unitsFor(builder, size):
+  """
+  Number of units (entries, fields, methods) giving a file of about the given size.
+  """
+  sample = len(builder(100).encode())
+  return max(1, size * 100 // sample)
+
+def generateOrg(folder, megabytes, apiVersion='55.0'):
+  """
+  Write about the given number of megabytes of profiles, objects, layouts and classes (and a few connected apps) into folder,
+  with a package.xml listing all of them. Returns the number of files and bytes written.
+  """
+  total = megabytes * 1024 * 1024
+  files = 0
+  written = 0
+  members = {}
+
+  for directory, (share, fileSize) in LAYOUT.items():
+    builder, typeName, suffix = BUILDERS[directory]
+    count = max(1, int(total * share) // fileSize)
+    content = builder(unitsFor(builder, min(fileSize, int(total * share)))).encode()
+
+    os.makedirs(os.path.join(folder, directory), exist_ok=True)
+    for i in range(count):
+      # Layouts are named after their object, as Salesforce does
+      name = f'Object{i}__c-Object{i} Layout' if directory == 'layouts' else f'Object{i}__c' if directory == 'objects' else f'{typeName}{i}'
+      with open(os.path.join(folder, directory, name + suffix), 'wb') as f:
+        f.write(content)
+      written += len(content)
+      files += 1
+      members.setdefault(typeName, []).append(name)
+
+      if directory == 'classes':
+        meta = CLASS_META.format(version=apiVersion).encode()
+        with open(os.path.join(folder, directory, name + suffix + '-meta.xml'), 'wb') as f:
+          f.write(meta)
+        written += len(meta)
+        files += 1
+
+  os.makedirs(os.path.join(folder, 'connectedApps'), exist_ok=True)
+  content = buildConnectedApp().encode()
+  for i in range(CONNECTED_APPS):
+    with open(os.path.join(folder, 'connectedApps', f'App{i}.connectedApp'), 'wb') as f:
+      f.write(content)
+    written += len(content)
+    files += 1
+    members.setdefault('ConnectedApp', []).append(f'App{i}')
+
+  package = ['<?xml version="1.0" encoding="UTF-8"?>', '<Package xmlns="http://soap.sforce.com/2006/04/metadata">']
+  for typeName in sorted(members):
+    package.append('    <types>')
+    package.extend(f'        <members>{member}</members>' for member in members[typeName])
+    package.append(f'        <name>{typeName}</name>')
+    package.append('    </types>')
+  package.append(f'    <version>{apiVersion}</version>')
+  package.append('</Package>\n')
+
+  with open(os.path.join(folder, 'package.xml'), 'w') as f:
+    f.write('\n'.join(package))
+
+  return files, written
@@ -0,0 +1,100 @@
+""" Startup cost of the pydx CLI: import time of each command (python -X importtime) and wall time of light commands
+
+Usage: python -m benchmarks.import_time [--repeat N] [--budget MS] [--top N] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Dependencies which only the commands talking to Salesforce or running plugins should import
+HEAVY_MODULES = ['requests', 'bs4', 'lxml', 'yaspin', 'xmltodict', 'aiohttp']
+
+# (name, arguments) of the measured invocations, the commands are run with --help so they do nothing
+INVOCATIONS = [
+  ('pydx --help', ['--help']),
+  ('pydx init', ['init']),
+  ('pydx retrieve --help', ['retrieve', '--help']),
+  ('pydx deploy --help', ['deploy', '--help']),
+]
+
+# Invocations which must not import HEAVY_MODULES
+LIGHT = {'pydx --help', 'pydx init'}
+
+def runPydx(arguments, cwd, importTime=False):
+  """
+  Run the CLI in a new interpreter, returning its wall time and its stderr.
+  """
+  # Same as the "pydx" script installed by setup.py
+  command = [sys.executable] + (['-X', 'importtime'] if importTime else []) + ['-c', 'from pydx.pydx import main; main(prog_name="pydx")'] + arguments
+  environment = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+
+  start = time.perf_counter()
+  result = subprocess.run(command, cwd=cwd, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+  elapsed = time.perf_counter() - start
+
+  if result.returncode != 0:
+    raise RuntimeError(f'{" ".join(arguments)} failed: {result.stderr[-2000:]}')
+  return elapsed, result.stderr
+
+def parseImportTime(output):
+  """
+  The (module, self us, cumulative us) of each line printed by -X importtime.
+  """
+  modules = []
+  for line in output.splitlines():
+    if not line.startswith('import time:') or 'self [us]' in line:
+      continue
+    selfTime, cumulative, name = line[len('import time:'):].split('|')
+    modules.append((name.strip(), int(selfTime), int(cumulative)))
+  return modules
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--repeat', type=int, default=5, help='Runs of each invocation, the best wall time is kept')
+  parser.add_argument('--budget', type=float, help='Fail if the import time of pydx.pydx is above this number of milliseconds')
+  parser.add_argument('--top', type=int, default=10, help='Slowest modules printed for each invocation')
+  parser.add_argument('--output', help='Write the results to this JSON file')
+  args = parser.parse_args()
+
+  failures = []
+  results = []
+
+  with tempfile.TemporaryDirectory() as cwd:
+    for name, arguments in INVOCATIONS:
+      wall = min(runPydx(arguments, cwd)[0] for _ in range(args.repeat))
+      _, output = runPydx(arguments, cwd, importTime=True)
+      modules = parseImportTime(output)
+
+      imported = {module for module, _, _ in modules}
+      total = sum(selfTime for _, selfTime, _ in modules)
+      cli = next((cumulative for module, _, cumulative in modules if module == 'pydx.pydx'), 0)
+      heavy = [module for module in HEAVY_MODULES if module in imported]
+
+      print(f'{name:<24} wall {wall * 1000:7.1f} ms   imports {total / 1000:7.1f} ms   pydx.pydx {cli / 1000:6.1f} ms   heavy: {", ".join(heavy) or "-"}')
+      for module, selfTime, _ in sorted(modules, key=lambda module: -module[1])[:args.top]:
+        print(f'    {module:<50}{selfTime / 1000:7.1f} ms')
+
+      if name in LIGHT and heavy:
+        failures.append(f'{name} imports {", ".join(heavy)}')
+      if args.budget is not None and cli / 1000 > args.budget:
+        failures.append(f'{name}: pydx.pydx takes {cli / 1000:.1f} ms to import (budget {args.budget} ms)')
+
+      results.append({'name': name, 'wallMs': round(wall * 1000, 1), 'importMs': round(total / 1000, 1), 'cliImportMs': round(cli / 1000, 1), 'heavy': heavy})
+
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump({'python': sys.version.split()[0], 'results': results}, f, indent=2)
+
+  if failures:
+    print('\n'.join(failures))
+    sys.exit(1)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,201 @@
+""" Local stand-in for the Salesforce login and Metadata API endpoints used by pydx """
+
+import base64
+import itertools
+import os
+import re
+import tempfile
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENVELOPE_HEAD = b'<?xml version="1.0" encoding="UTF-8"?><soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns="http://soap.sforce.com/2006/04/metadata"><soapenv:Body>'
+ENVELOPE_TAIL = b'</soapenv:Body></soapenv:Envelope>'
+
+# Bytes read from the ZIP file for each base64 chunk of a retrieve response, multiple of 3
+CHUNK_SIZE = 3 * 256 * 1024
+
+def zipFolder(folder):
+  """
+  Zip a folder into a temporary file, returning its path.
+  """
+  fd, path = tempfile.mkstemp(suffix='.zip')
+  with os.fdopen(fd, 'wb') as f, zipfile.ZipFile(f, 'w', zipfile.ZIP_DEFLATED) as archive:
+    for dirname, _, files in os.walk(folder):
+      for filename in sorted(files):
+        filePath = os.path.join(dirname, filename)
+        archive.write(filePath, os.path.relpath(filePath, folder).replace(os.sep, '/'))
+  return path
+
+class MetadataHandler(BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+
+  def log_message(self, *args):
+    pass
+
+  def readBody(self, keep=True):
+    """
+    Read the request body, chunked or not. Deploy bodies are only counted, not kept.
+    """
+    body = bytearray()
+    size = 0
+
+    def consume(data):
+      nonlocal size
+      size += len(data)
+      if keep or len(body) < 64 * 1024:
+        body.extend(data)
+
+    if self.headers.get('transfer-encoding', '').lower() == 'chunked':
+      while True:
+        length = int(self.rfile.readline().split(b';')[0].strip(), 16)
+        if length == 0:
+          while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+            pass
+          break
+        while length:
+          data = self.rfile.read(min(length, 1024 * 1024))
+          consume(data)
+          length -= len(data)
+        self.rfile.readline()
+    else:
+      remaining = int(self.headers.get('content-length', 0))
+      while remaining:
+        data = self.rfile.read(min(remaining, 1024 * 1024))
+        consume(data)
+        remaining -= len(data)
+
+    return bytes(body), size
+
+  def send(self, result, status=200):
+    content = ENVELOPE_HEAD + result.encode() + ENVELOPE_TAIL
+    self.send_response(status)
+    self.send_header('content-type', 'text/xml')
+    self.send_header('content-length', str(len(content)))
+    self.end_headers()
+    self.wfile.write(content)
+
+  def do_POST(self):
+    server = self.server
+    action = self.headers.get('SOAPAction', '')
+    body, size = self.readBody(keep=action != 'deploy')
+
+    time.sleep(server.latency)
+    server.requests[action] = server.requests.get(action, 0) + 1
+
+    if action == 'login':
+      self.send(f'<loginResponse><result><serverUrl>{server.url}/services/Soap/u/{server.apiVersion}/00D000000000001</serverUrl><sessionId>00D000000000001!SESSION</sessionId><userInfo><sessionSecondsValid>7200</sessionSecondsValid></userInfo></result></loginResponse>')
+    elif action in ('retrieve', 'deploy'):
+      jobId = server.newJob(size)
+      self.send(f'<{action}Response><result><done>false</done><id>{jobId}</id><state>Queued</state></result></{action}Response>')
+    elif action == 'deployRecentValidation':
+      validationId = re.search(rb'<met:validationId>(.*?)</met:validationId>', body).group(1).decode()
+      if server.quickDeploy(validationId):
+        self.send(f'<deployRecentValidationResponse><result>{server.newJob(0)}</result></deployRecentValidationResponse>')
+      else:
+        self.send(f'<soapenv:Fault><faultcode>sf:INVALID_ID_FIELD</faultcode><faultstring>No validation {validationId} to deploy</faultstring></soapenv:Fault>', status=500)
+    elif action == 'checkRetrieveStatus':
+      jobId = re.search(rb'<met:asyncProcessId>(.*?)</met:asyncProcessId>', body).group(1).decode()
+      if b'<met:includeZip>True</met:includeZip>' in body:
+        self.sendZipFile(jobId)
+      else:
+        done = server.poll(jobId) >= server.polls
+        self.send(f'<checkRetrieveStatusResponse><result><done>{str(done).lower()}</done><id>{jobId}</id><status>{"Succeeded" if done else "InProgress"}</status></result></checkRetrieveStatusResponse>')
+    elif action == 'checkDeployStatus':
+      jobId = re.search(rb'<met:asyncProcessId>(.*?)</met:asyncProcessId>', body).group(1).decode()
+      polls = server.poll(jobId)
+      done = polls >= server.polls
+      total = server.components
+      deployed = total if done else total * polls // server.polls
+      self.send(
+        f'<checkDeployStatusResponse><result><done>{str(done).lower()}</done><id>{jobId}</id>'
+        f'<numberComponentErrors>0</numberComponentErrors><numberComponentsDeployed>{deployed}</numberComponentsDeployed><numberComponentsTotal>{total}</numberComponentsTotal>'
+        f'<numberTestErrors>0</numberTestErrors><numberTestsCompleted>0</numberTestsCompleted><numberTestsTotal>0</numberTestsTotal>'
+        f'<status>{"Succeeded" if done else "InProgress"}</status></result></checkDeployStatusResponse>'
+      )
+    else:
+      self.send(f'<soapenv:Fault><faultcode>sf:INVALID_OPERATION</faultcode><faultstring>Unknown action {action}</faultstring></soapenv:Fault>', status=500)
+
+  def sendZipFile(self, jobId):
+    """
+    Stream the retrieve result, encoding the ZIP file one chunk at a time like Salesforce does for large retrieves.
+    """
+    head = ENVELOPE_HEAD + f'<checkRetrieveStatusResponse><result><done>true</done><id>{jobId}</id><status>Succeeded</status><zipFile>'.encode()
+    tail = b'</zipFile></result></checkRetrieveStatusResponse>' + ENVELOPE_TAIL
+    zipSize = os.path.getsize(self.server.zipPath)
+
+    self.send_response(200)
+    self.send_header('content-type', 'text/xml')
+    self.send_header('content-length', str(len(head) + 4 * -(-zipSize // 3) + len(tail)))
+    self.end_headers()
+
+    self.wfile.write(head)
+    with open(self.server.zipPath, 'rb') as f:
+      for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+        self.wfile.write(base64.b64encode(chunk))
+    self.wfile.write(tail)
+
+class MockMetadataServer(ThreadingHTTPServer):
+  """
+  Serves login, retrieve, checkRetrieveStatus, deploy, deployRecentValidation and checkDeployStatus on localhost.
+  Every response waits "latency" seconds, async jobs complete after "polls" status checks
+  and retrieves return the content of retrieveFolder zipped.
+  """
+
+  daemon_threads = True
+
+  def __init__(self, retrieveFolder=None, latency=0.0, polls=2, components=100, apiVersion='55.0'):
+    super().__init__(('127.0.0.1', 0), MetadataHandler)
+    self.latency = latency
+    self.polls = polls
+    self.components = components
+    self.apiVersion = apiVersion
+    self.url = f'http://127.0.0.1:{self.server_port}'
+
+    self.zipPath = zipFolder(retrieveFolder) if retrieveFolder else zipFolder(tempfile.mkdtemp())
+    self.jobs = {}
+    self.quickDeployed = set()
+    self.jobIds = itertools.count(1)
+    self.requests = {}
+    self.uploadedBytes = 0
+    self.lock = threading.Lock()
+    self.thread = None
+
+  def newJob(self, uploadedBytes):
+    with self.lock:
+      jobId = f'09S{next(self.jobIds):012d}'
+      self.jobs[jobId] = 0
+      self.uploadedBytes += uploadedBytes
+    return jobId
+
+  def quickDeploy(self, validationId):
+    """
+    Any deploy job can be quick deployed, once.
+    """
+    with self.lock:
+      if validationId not in self.jobs or validationId in self.quickDeployed:
+        return False
+      self.quickDeployed.add(validationId)
+      return True
+
+  def poll(self, jobId):
+    with self.lock:
+      self.jobs[jobId] += 1
+      return self.jobs[jobId]
+
+  def start(self):
+    self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+    self.thread.start()
+    return self
+
+  def stop(self):
+    self.shutdown()
+    self.server_close()
+    os.remove(self.zipPath)
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, *exc):
+    self.stop()
@@ -0,0 +1,208 @@
+""" End-to-end and micro benchmarks of pydx against a local Metadata API stand-in, tracking time and peak memory
+
+Usage: python -m benchmarks.suite [--scale 10,100,1000] [--latency S] [--repeat N] [--only NAME] [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.generators import generateOrg
+from benchmarks.mock_server import MockMetadataServer
+from pydx.engine.helpers import Helper
+from pydx.standard_plugins import standard_plugins
+from pydx.utils import sfdc_utils, preflight, snapshots
+
+SETTINGS = {'preDeploy': [], 'postRetrieve': []}
+
+# Changes smaller than these are noise, whatever their relative size
+MIN_CHANGE = {'seconds': 0.05, 'peakMB': 1}
+
+def runCli(args):
+  """
+  Run a pydx command in this process, hiding its output.
+  """
+  from pydx.pydx import main
+
+  with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+    main(args, standalone_mode=False)
+
+class Workspace:
+  """
+  A generated org, a copy of it which benchmarks can modify, and a mock server retrieving the generated org.
+  """
+
+  def __init__(self, megabytes, latency):
+    self.root = tempfile.mkdtemp(prefix=f'pydx-bench-{megabytes}-')
+    self.source = os.path.join(self.root, 'source')
+    self.files, self.bytes = generateOrg(self.source, megabytes)
+
+    self.settingFile = os.path.join(self.root, 'pydx.json')
+    with open(self.settingFile, 'w') as f:
+      json.dump(SETTINGS, f)
+
+    self.server = MockMetadataServer(self.source, latency=latency, polls=1).start()
+    self.store = os.path.join(self.root, 'store')
+
+  def copy(self, name='work'):
+    path = os.path.join(self.root, name)
+    shutil.rmtree(path, ignore_errors=True)
+    shutil.copytree(self.source, path)
+    return path
+
+  def empty(self, name='output'):
+    path = os.path.join(self.root, name)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    return path
+
+  def checkedOut(self, name='checkout'):
+    """
+    A folder holding the "source" snapshot of the store, which also has a "changed" one with 1% of the files changed.
+    """
+    store = snapshots.SnapshotStore(self.store)
+    if not store.snapshots('changed'):
+      # Committed from copies, since the committed files become links to the store
+      store.commit('source', self.copy('snapshot-source'))
+      changed = self.copy('snapshot-changed')
+      for relPath in sfdc_utils.listFiles(changed)[::100]:
+        path = os.path.join(changed, relPath)
+        content = open(path, 'rb').read()
+        os.remove(path)
+        with open(path, 'wb') as f:
+          f.write(content + b'\n')
+      store.commit('changed', changed)
+
+    path = os.path.join(self.root, name)
+    store.checkout(store.resolve('source'), path, force=True)
+    return path
+
+  def close(self):
+    self.server.stop()
+    shutil.rmtree(self.root)
+
+def editXML(path, callback):
+  def run(folder):
+    helper = Helper(folder)
+    helper.editXML(path, callback)
+    helper.close()
+  return run
+
+def benchmarks(workspace):
+  """
+  The (name, setup, run) of each benchmark: setup is not measured and returns the argument of run.
+  """
+  # The commands log in to the mock server instead of Salesforce
+  os.environ['PYDX_LOGIN_URL'] = workspace.server.url
+  login = ['-u', 'bench@example.com', '-p', 'password', '--noSessionCache', '-se', workspace.settingFile]
+
+  return [
+    ('package_creator', lambda: os.path.join(workspace.source, 'package.xml'), sfdc_utils.package_creator),
+    ('zipDirectory', lambda: workspace.source, lambda folder: sum(len(chunk) for chunk in sfdc_utils.zipDirectory(folder))),
+    ('editXML.enableClassAccessLevel', workspace.copy, editXML('profiles/*.profile', standard_plugins.enableClassAccessLevel)),
+    ('editXML.deleteProfilePermissions', workspace.copy, editXML('profiles/*.profile', standard_plugins.deleteProfilePermissions)),
+    ('editXML.removeUselessListViews', workspace.copy, editXML('objects/*.object', standard_plugins.removeUselessListViews)),
+    ('editXML.removeOAuthConfig', workspace.copy, editXML('connectedApps/*.connectedApp', standard_plugins.removeOAuthConfig)),
+    ('check', lambda: workspace.source, lambda folder: preflight.checkFolder(folder)),
+    ('retrieve', workspace.empty, lambda output: runCli(['retrieve'] + login + ['--package', os.path.join(workspace.source, 'package.xml'), '-o', output])),
+    # After the first run, the retrieved files are already in the store
+    ('retrieve.store', workspace.empty, lambda output: runCli(['retrieve'] + login + ['--package', os.path.join(workspace.source, 'package.xml'), '-o', output, '--store', workspace.store])),
+    ('checkout', workspace.checkedOut, lambda folder: runCli(['checkout', 'changed', '-f', folder, '--store', workspace.store])),
+    ('deploy', lambda: workspace.source, lambda folder: runCli(['deploy', '-s'] + login + ['--noArtifactCache', '--package', os.path.join(folder, 'package.xml')])),
+    # After the first run, the encoded ZIP file comes from the artifact cache
+    ('deploy.cachedArtifact', lambda: workspace.source, lambda folder: runCli(['deploy', '-s'] + login + ['--package', os.path.join(folder, 'package.xml')])),
+  ]
+
+def measure(setup, run, repeat):
+  """
+  Best time of "repeat" runs, then the peak of the memory allocated by Python in one more run
+  (measured apart, since tracing the allocations slows the run down).
+  """
+  times = []
+  for _ in range(repeat):
+    argument = setup()
+    start = time.perf_counter()
+    run(argument)
+    times.append(time.perf_counter() - start)
+
+  argument = setup()
+  tracemalloc.start()
+  try:
+    run(argument)
+    _, peak = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+
+  return min(times), peak
+
+def compare(results, baselineFile, tolerance):
+  """
+  Print the change of each result against a baseline, returning the names of the regressions.
+  """
+  with open(baselineFile) as f:
+    baseline = {(result['name'], result['scale']): result for result in json.load(f)['results']}
+
+  regressions = []
+  for result in results:
+    previous = baseline.get((result['name'], result['scale']))
+    if previous is None:
+      continue
+    for metric in ('seconds', 'peakMB'):
+      if previous[metric] > 0:
+        change = result[metric] / previous[metric] - 1
+        flag = ' REGRESSION' if change > tolerance and result[metric] - previous[metric] > MIN_CHANGE[metric] else ''
+        print(f'{result["name"]:<36}{result["scale"]:>6} MB  {metric:<8}{change:+8.1%}{flag}')
+        if flag:
+          regressions.append(f'{result["name"]}@{result["scale"]}MB {metric}')
+
+  return regressions
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--scale', default='10', help='Comma separated sizes of the generated orgs, in MB (e.g. 10,100,1000)')
+  parser.add_argument('--latency', type=float, default=0.0, help='Seconds waited by the mock server before each response')
+  parser.add_argument('--repeat', type=int, default=3, help='Timed runs of each benchmark, the best one is kept')
+  parser.add_argument('--only', action='append', help='Run only the benchmarks whose name starts with this prefix (can be repeated)')
+  parser.add_argument('--output', help='Write the results to this JSON file')
+  parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+  parser.add_argument('--tolerance', type=float, default=0.2, help='Relative increase reported as a regression by --compare')
+  args = parser.parse_args()
+
+  results = []
+
+  for scale in [int(value) for value in args.scale.split(',')]:
+    workspace = Workspace(scale, args.latency)
+    print(f'{scale} MB org: {workspace.files} files, {workspace.bytes / 1024 / 1024:.1f} MB')
+
+    try:
+      for name, setup, run in benchmarks(workspace):
+        if args.only and not any(name.startswith(prefix) for prefix in args.only):
+          continue
+        seconds, peak = measure(setup, run, args.repeat)
+        results.append({'name': name, 'scale': scale, 'seconds': round(seconds, 4), 'peakMB': round(peak / 1024 / 1024, 2)})
+        print(f'  {name:<36}{seconds:9.3f} s {peak / 1024 / 1024:9.1f} MB')
+    finally:
+      workspace.close()
+
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump({'python': platform.python_version(), 'cpus': os.cpu_count(), 'results': results}, f, indent=2)
+
+  if args.compare:
+    regressions = compare(results, args.compare, args.tolerance)
+    if regressions:
+      print(f'{len(regressions)} regressions: {", ".join(regressions)}')
+      sys.exit(1)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1 @@
+""" Commands of the pydx CLI, each module is imported only when one of its commands runs (see pydx.LazyGroup) """
@@ -0,0 +1,24 @@
+import sys
+
+import click
+
+from .common import DEFAULT_SRC, PWD, printCheckResult
+from ..utils import preflight, tracing
+
+@click.command(name='check')
+@click.option('--package', 'packageFile', help='Path to the "package.xml" file', default=f'{DEFAULT_SRC}/package.xml', type=click.Path(exists=True, file_okay=True, dir_okay=False))
+@click.option('-w', '--workers', 'workers', help='Processes parsing the files, default is the number of CPUs', type=click.IntRange(1))
+@click.option('--noCache', 'noCache', help='Parse all the files instead of reusing the results of the unchanged ones', is_flag=True, default=False)
+@click.option('-se', '--settingFile', 'settingFile', help='Setting file', default=f'{PWD}/pydx.json', type=click.Path(file_okay=True, dir_okay=False))
+def check(packageFile, workers, noCache, settingFile):
+  """Check locally that the metadata files and the "package.xml" can be deployed"""
+  folder = packageFile.rpartition('/')[0]
+
+  with tracing.span('check', workers=workers) as span:
+    result = preflight.checkFolder(folder, cacheFile=None if noCache else preflight.CheckCache.location(settingFile, folder), workers=workers)
+    span['parsed'] = result.parsed
+    span['errors'] = len(result.errors)
+
+  printCheckResult(result)
+  if result.errors:
+    sys.exit(1)
@@ -0,0 +1,38 @@
+import os
+
+import click
+
+DEFAULT_SRC = os.path.join(os.getcwd(), 'src')
+PWD = os.getcwd()
+
+def printExtractStats(stats):
+  print('{}{}'.format(click.style('Files changed: ', fg='yellow'), click.style('{}/{} ({} bytes written)'.format(stats.changed, stats.files, stats.bytesWritten), fg='green')))
+
+def printCheckResult(result, limit=20):
+  """
+  Print the errors and (the first) warnings of a preflight check.
+  """
+  for relPath, message in result.errors:
+    click.echo(click.style(f'  {relPath}: {message}', fg='red'))
+  for relPath, message in result.warnings[:limit]:
+    click.echo(click.style(f'  {relPath}: {message}', fg='yellow'))
+  if len(result.warnings) > limit:
+    click.echo(click.style(f'  ... and {len(result.warnings) - limit} more warnings', fg='yellow'))
+
+  summary = '{} files checked ({} parsed), {} errors, {} warnings'.format(result.files, result.parsed, len(result.errors), len(result.warnings))
+  print('{}{}'.format(click.style('Check: ', fg='yellow'), click.style(summary, fg='red' if result.errors else 'green')))
+
+def storeSnapshot(storePath, linkMode, org, folder):
+  """
+  Commit a retrieved folder as a new snapshot of the org in the snapshot store (the default one if storePath is empty).
+  """
+  from ..utils import snapshots, tracing
+
+  store = snapshots.SnapshotStore(storePath or snapshots.defaultStore(), linkMode=linkMode)
+  with tracing.span('snapshot.commit', org=org) as span:
+    snapshot, stats = store.commit(org, folder)
+    span.update(files=stats.files, added=stats.added, bytes=stats.bytesAdded)
+
+  summary = '{} ({} files, {} new for {} bytes, {} deduplicated, {} hashed{})'.format(snapshot.ref, stats.files, stats.added, stats.bytesAdded, stats.linked, stats.hashed, f', {stats.mode}' if stats.mode else '')
+  print('{}{}'.format(click.style('Snapshot: ', fg='yellow'), click.style(summary, fg='green')))
+  return snapshot
@@ -0,0 +1,273 @@
+import os
+import sys
+import time
+from datetime import timedelta
+
+import click
+from yaspin import yaspin
+
+from .common import DEFAULT_SRC, PWD, printCheckResult
+from ..sfdc import Sfdc
+from ..sfdc.exceptions import SalesforceSoapFault
+from ..sfdc.session_cache import SessionCache
+from ..sfdc.streaming import encodeZipFile
+from ..engine.plugin_engine import PluginEngine
+from ..utils import sfdc_utils, metadata, delta, tracing, artifacts, apex_tests, preflight
+from ..utils.polling import Poller
+
+@click.command(name='deploy')
+@click.option('-u', '--username', 'username', required=True, help='Salesforce username')
+@click.option('-p', '--password', 'password', required=True, help='Salesforce password')
+@click.option('--package', 'packageFile', help='Path to the "package.xml" file', default=f'{DEFAULT_SRC}/package.xml', type=click.Path(exists=True, file_okay=True, dir_okay=False))
+@click.option('-s', '--sandbox', 'isSandbox', help='Set SFDC URL to sandbox', is_flag=True, default=False)
+@click.option('-t', '--testLevel', 'testLevel', help='Test level', default='NoTestRun', type=click.Choice(['RunAllTests', 'RunSpecifiedTests', 'RunLocalTests', 'NoTestRun', 'Auto']))
+@click.option('-r', '--runTests', 'runTests', help='Test to be run if selected "RunSpecifiedTests"', default=[])
+@click.option('-v', '--validate', 'validate', help='Perform only a validation', is_flag=True, default=False)
+@click.option('-z', '--compressLevel', 'compressLevel', help='ZIP compression level (0 to store files uncompressed)', default=6, type=click.IntRange(0, 9))
+@click.option('--since', 'since', help='Deploy only the metadata changed since this git ref')
+@click.option('--delta', 'isDelta', help='Deploy only the metadata changed since the last successful deploy to this org', is_flag=True, default=False)
+@click.option('--noSessionCache', 'noSessionCache', help='Always login instead of reusing the cached session of the org', is_flag=True, default=False)
+@click.option('--noQuickDeploy', 'noQuickDeploy', help='Always send the metadata, even if the same files have been successfully validated with the same tests', is_flag=True, default=False)
+@click.option('--skipCheck', 'skipCheck', help='Do not check the metadata files and the "package.xml" locally before sending them', is_flag=True, default=False)
+@click.option('--noArtifactCache', 'noArtifactCache', help='Always zip the metadata instead of reusing the encoded ZIP file of a previous deploy of the same files', is_flag=True, default=False)
+@click.option('-se', '--settingFile', 'settingFile', help='Setting file', default=f'{PWD}/pydx.json', type=click.Path(exists=True, file_okay=True, dir_okay=False))
+def deploy(username, password, packageFile, isSandbox, testLevel, runTests, validate, compressLevel, since, isDelta, noSessionCache, noQuickDeploy, skipCheck, noArtifactCache, settingFile):
+  """Initiate a validation/deployment process on Salesforce"""
+  sfdcURL = sfdc_utils.sfdc_url(isSandbox)
+
+  with tracing.span('package.parse', file=packageFile):
+    packageVersion, _ = sfdc_utils.package_creator(packageFile)
+
+  print('{:<30}{:<40}'.format(click.style('SFDC URL: ', fg='yellow'), click.style(sfdcURL, fg='green')))
+  print('{:<30}{:<40}'.format(click.style('Username: ', fg='yellow'), click.style(username, fg='green')))
+  print('{:<30}{:<40}'.format(click.style('Password: ', fg='yellow'), click.style(password, fg='green')))
+  print('{:<30}{:<40}'.format(click.style('Package.xml file: ', fg='yellow'), click.style(packageFile, fg='green')))
+  print('{:<30}{:<40}'.format(click.style('API Version: ', fg='yellow'), click.style(packageVersion, fg='green')))
+  print('\n{:<30}{:<40}\n'.format(click.style('Validate or Deploy: ', fg='yellow'), click.style('Validate' if validate else 'Deploy', fg='green')))
+
+  folder = packageFile.rpartition('/')[0]
+
+  pe = PluginEngine(settingFile=settingFile, outputFolder=folder)
+
+  pe.preDeploy()
+
+  zipFile = lambda: sfdc_utils.zipDirectory(folder, compressLevel=compressLevel)
+  manifest = delta.DeployManifest(delta.DeployManifest.location(settingFile, username, sfdcURL, folder))
+  hashes = None
+  # Files sent (None for the whole folder) and the generated ones
+  deployedFiles = None
+  extraFiles = None
+
+  changedFiles = None
+
+  if since or isDelta:
+    if since:
+      with tracing.span('delta.changes', since=since):
+        changedFiles = delta.changedSince(folder, since)
+    else:
+      with tracing.span('delta.hashes') as span:
+        hashes = delta.folderHashes(folder)
+        span['files'] = len(hashes)
+      if manifest.exists():
+        changedFiles = manifest.changed(hashes)
+      else:
+        print(click.style('No previous deploy to this org, deploying everything\n', fg='yellow'))
+
+    if changedFiles is not None:
+      try:
+        components, files = delta.deltaPackage(folder, changedFiles)
+      except Exception as e:
+        print(click.style(f'{e}, deploying everything\n', fg='yellow'))
+      else:
+        if not components:
+          print(click.style('Nothing to deploy', fg='green'))
+          return
+
+        print('{:<30}{:<40}\n'.format(click.style('Delta: ', fg='yellow'), click.style('{} components, {} files'.format(sum(len(members) for members in components.values()), len(files)), fg='green')))
+        deltaPackageXml = metadata.packageXml(components, packageVersion)
+        deployedFiles = files
+        extraFiles = {'package.xml': deltaPackageXml}
+        zipFile = lambda: sfdc_utils.zipFiles(folder, files, compressLevel=compressLevel, extraFiles=extraFiles)
+
+  if testLevel == 'Auto' and not isSandbox and deployedFiles is None:
+    # In production the specified tests must cover every class and trigger deployed, not only the changed ones
+    print(click.style('Automatic test selection in PROD needs a delta deploy (--since or --delta), running local tests\n', fg='yellow'))
+    testLevel = 'RunLocalTests'
+  elif testLevel == 'Auto':
+    # Without a delta, the changes are the files which differ from the last deploy to this org
+    if changedFiles is None and manifest.exists():
+      with tracing.span('delta.hashes') as span:
+        hashes = hashes or delta.folderHashes(folder)
+        span['files'] = len(hashes)
+      changedFiles = manifest.changed(hashes)
+    testLevel, runTests = selectTests(folder, settingFile, deployedFiles or changedFiles, production=not isSandbox)
+
+  if not isSandbox and testLevel == 'NoTestRun':
+    print(click.style("Since you're {} in PROD, tests must be run\n".format('deploying' if not validate else 'validating'), fg='yellow'))
+    testLevel = 'RunLocalTests'
+
+  # Content hash of what is deployed: the same files can be quick deployed after a validation and reuse the same ZIP file
+  with tracing.span('deploy.hash') as span:
+    if deployedFiles is None:
+      hashes = hashes or delta.folderHashes(folder)
+      deployedHashes = hashes
+    else:
+      deployedHashes = {path: (hashes or {}).get(path) or sfdc_utils.fileHash(os.path.join(folder, path)) for path in deployedFiles}
+    treeHash = artifacts.treeHash(deployedHashes, extraFiles)
+    span['files'] = len(deployedHashes)
+
+  # Problems which Salesforce would only report after the upload and the queue, found in seconds
+  if not skipCheck:
+    with tracing.span('check') as span:
+      checkResult = preflight.checkFolder(folder, preflight.CheckCache.location(settingFile, folder), deployedHashes, package=deployedFiles is None)
+      span['parsed'] = checkResult.parsed
+      span['errors'] = len(checkResult.errors)
+    printCheckResult(checkResult)
+    if checkResult.errors:
+      print(click.style('Fix the errors or deploy with --skipCheck', fg='red'))
+      sys.exit(1)
+    print()
+
+  validations = artifacts.Validations(artifacts.Validations.location(settingFile, username, sfdcURL))
+  validationId = None if validate or noQuickDeploy else validations.find(treeHash, testLevel, runTests)
+
+  artifactCache = None if noArtifactCache else artifacts.ArtifactCache(os.path.join(artifacts.pydxFolder(settingFile), 'artifacts'))
+  cachedArtifact = artifactCache and artifactCache.get(treeHash, compressLevel)
+
+  connection = Sfdc(username, password, sfdcURL, packageVersion, sessionCache=None if noSessionCache else SessionCache())
+
+  print(click.style('Connecting to SFDC...', fg='bright_black'))
+  with tracing.span('login') as span:
+    connection.login()
+    span['cached'] = connection.sessionFromCache
+  print('{}{}{}'.format(click.style('Connected as: ', fg='yellow'), click.style(connection.username, fg='green'), click.style(' (cached session)' if connection.sessionFromCache else '', fg='bright_black')))
+
+  quickDeployed = False
+  if validationId:
+    print(click.style(f'Quick deploy of validation {validationId}...', fg='bright_black'))
+    try:
+      with tracing.span('deploy.quick', validationId=validationId):
+        connection.deployRecentValidation(validationId)
+      quickDeployed = True
+    except SalesforceSoapFault as e:
+      print(click.style(f'Quick deploy not available ({e}), deploying the metadata\n', fg='yellow'))
+    # A validation can only be deployed once
+    validations.drop(treeHash)
+    validations.save()
+
+  if not quickDeployed:
+    print(click.style('Submitting {} request{}...'.format('deploy' if not validate else 'validation', ' (cached ZIP file)' if cachedArtifact else ''), fg='bright_black'))
+    with tracing.span('deploy.upload', compressLevel=compressLevel, cached=bool(cachedArtifact)):
+      if cachedArtifact:
+        connection.deploy(cachedArtifact, testLevel=testLevel, runTests=runTests, validateOnly=validate, encoded=True)
+      elif artifactCache:
+        connection.deploy(lambda: artifactCache.store(treeHash, compressLevel, encodeZipFile(zipFile())), testLevel=testLevel, runTests=runTests, validateOnly=validate, encoded=True)
+      else:
+        connection.deploy(zipFile, testLevel=testLevel, runTests=runTests, validateOnly=validate)
+  print('{}{}'.format(click.style('Async ID: ', fg='yellow'), click.style(connection.asyncProcessId, fg='green')))
+
+  deployResult = waitForDeploy(connection, validate)
+
+  if deployResult.status == 'Succeeded':
+    if validate:
+      # Validations running tests can be quick deployed
+      if testLevel not in (None, 'NoTestRun'):
+        validations.add(treeHash, connection.asyncProcessId, testLevel, runTests)
+        validations.save()
+    else:
+      # The next delta deploy starts from what has just been deployed
+      manifest.save(hashes or delta.folderHashes(folder))
+      # Older validations no longer match the org
+      validations.clear()
+      validations.save()
+
+  print('{}{}'.format(click.style('API calls: ', fg='yellow'), click.style(str(connection.apiCalls), fg='green')))
+
+def waitForDeploy(connection, validate):
+  """
+  Wait for the deploy of the connection to complete, showing its progress, and report its result.
+  Returns the final DeployResult, with the details of the failures if there are some.
+  """
+  spinner = yaspin(text=click.style('Waiting for {} to start...'.format('deployment' if not validate else 'validation'), fg='bright_black'), color="green")
+  spinner.start()
+  deploy_start = time.time()
+
+  poller = Poller()
+
+  with tracing.span('deploy.wait') as span:
+    # Lightweight checks while the deploy is in progress, details are only needed to report the errors
+    deployFinished, deployResult = connection.isDeploying(includeDetails=False)
+    span['polls'] = 1
+
+    while not deployFinished:
+      # Time spent by the deploy in the Salesforce queue, before it starts
+      if deployResult.status != 'Pending' and 'queued' not in span:
+        span['queued'] = round(time.time() - deploy_start, 3)
+      if deployResult.numberComponentsTotal + deployResult.numberTestsTotal > 0:
+        spinner.stop()
+        progress(deployResult.componentsDone + deployResult.testsDone, deployResult.numberComponentsTotal + deployResult.numberTestsTotal, suffix='[{}/{}]'.format(deployResult.componentsDone + deployResult.testsDone, deployResult.numberComponentsTotal + deployResult.numberTestsTotal))
+      poller.wait((deployResult.status, deployResult.componentsDone, deployResult.testsDone))
+      deployFinished, deployResult = connection.isDeploying(includeDetails=False)
+      span['polls'] += 1
+
+    span['status'] = deployResult.status
+    span['components'] = deployResult.numberComponentsTotal
+    span['tests'] = deployResult.numberTestsTotal
+
+  if deployResult.status == 'Failed' or deployResult.numberComponentErrors + deployResult.numberTestErrors > 0:
+    _, deployResult = connection.isDeploying(includeDetails=True)
+
+  if deployResult.status == 'Failed':
+    spinner.text = '{} {}'.format(click.style('{} Failed'.format('Deployment' if not validate else 'Validation'), fg='red'), click.style('[Elapsed time: {}]'.format(timedelta(seconds=int(time.time() - deploy_start))), fg='bright_black'))
+    spinner.fail("❌")
+    click.echo(click.style('Broken components: {}, Broken tests: {}'.format(deployResult.numberComponentErrors, deployResult.numberTestErrors), fg='red'))
+    for failure in deployResult.componentFailures:
+      click.echo(click.style('  {}: {}'.format(failure.get('fileName'), failure.get('problem')), fg='red'))
+    for failure in deployResult.testFailures:
+      click.echo(click.style('  {}.{}: {}'.format(failure.get('name'), failure.get('methodName'), failure.get('message')), fg='red'))
+  elif deployResult.status == 'Canceled':
+    spinner.text = '{} {}'.format(click.style('{} Canceled'.format('Deployment' if not validate else 'Validation'), fg='bright_black'), click.style('[Elapsed time: {}]'.format(timedelta(seconds=int(time.time() - deploy_start))), fg='bright_black'))
+    spinner.fail("🚫")
+  else:
+    spinner.text = '{} {}'.format(click.style('{} Completed'.format('Deployment' if not validate else 'Validation'), fg='green'), click.style('[Elapsed time: {}]'.format(timedelta(seconds=int(time.time() - deploy_start))), fg='bright_black'))
+    spinner.ok("✅")
+
+  return deployResult
+
+def selectTests(folder, settingFile, changedFiles, production=False):
+  """
+  Test level and tests of "--testLevel Auto": the test classes exercising the changed Apex classes and triggers.
+  In production a deploy without Apex gets no test level (None), so Salesforce applies its default and runs no tests.
+  """
+  if changedFiles is None:
+    print(click.style('No previous deploy to this org to find the changes, running local tests\n', fg='yellow'))
+    return 'RunLocalTests', []
+
+  index = apex_tests.TestIndex(apex_tests.TestIndex.location(settingFile, folder))
+  with tracing.span('tests.index') as span:
+    span['parsed'] = index.update(folder)
+    index.save()
+  with tracing.span('tests.select') as span:
+    tests = index.testsFor(changedFiles)
+    span['tests'] = len(tests)
+
+  changedApex = {apex_tests.apexName(relPath) for relPath in changedFiles} - {None}
+  if not tests:
+    if changedApex and production:
+      print(click.style('No test references the changed Apex classes and triggers, running local tests\n', fg='yellow'))
+      return 'RunLocalTests', []
+    if changedApex:
+      print(click.style('No test references the changed Apex classes and triggers, no test will run\n', fg='yellow'))
+    return (None if production else 'NoTestRun'), []
+
+  print('{:<30}{:<40}\n'.format(click.style('Tests: ', fg='yellow'), click.style('{} tests for {} changed classes and triggers'.format(len(tests), len(changedApex)), fg='green')))
+  return 'RunSpecifiedTests', tests
+
+def progress(count, total, bar_len=60, suffix=''):
+  filled_len = int(round(bar_len * count / float(total)))
+
+  percents = round(100.0 * count / float(total), 1)
+  bar = '=' * filled_len + '-' * (bar_len - filled_len)
+
+  sys.stdout.write(click.style('[%s] %s%s %s\r' % (bar, percents, '%', suffix), fg='yellow'))
+  sys.stdout.flush()
@@ -0,0 +1,16 @@
+import json
+
+import click
+
+from .common import PWD
+
+@click.command(name='init')
+def initConfig():
+  """Create the "pydx.json" file inside the current directory"""
+  jsonConfig = {
+    'preDeploy': [],
+    'postRetrieve': []
+  }
+
+  with open(f'{PWD}/pydx.json', 'w') as json_file:
+    json.dump(jsonConfig, json_file, indent=2)
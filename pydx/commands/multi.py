@@ -0,0 +1,114 @@
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+import click
+
+from .common import DEFAULT_SRC, PWD, storeSnapshot
+from ..engine.plugin_engine import PluginEngine
+from ..utils import sfdc_utils, tracing
+
+@click.command(name='deploy-multi')
+@click.option('--orgs', 'orgsFile', required=True, help='JSON file with the list of target orgs', type=click.Path(exists=True, file_okay=True, dir_okay=False))
+@click.option('--package', 'packageFile', help='Path to the "package.xml" file', default=f'{DEFAULT_SRC}/package.xml', type=click.Path(exists=True, file_okay=True, dir_okay=False))
+@click.option('-t', '--testLevel', 'testLevel', help='Test level', default='NoTestRun', type=click.Choice(['RunAllTests', 'RunSpecifiedTests', 'RunLocalTests', 'NoTestRun']))
+@click.option('-r', '--runTests', 'runTests', help='Test to be run if selected "RunSpecifiedTests"', default=[])
+@click.option('-v', '--validate', 'validate', help='Perform only a validation', is_flag=True, default=False)
+@click.option('-z', '--compressLevel', 'compressLevel', help='ZIP compression level (0 to store files uncompressed)', default=6, type=click.IntRange(0, 9))
+@click.option('-c', '--concurrency', 'concurrency', help='Maximum number of orgs deployed at the same time', default=4, type=click.IntRange(1))
+@click.option('-se', '--settingFile', 'settingFile', help='Setting file', default=f'{PWD}/pydx.json', type=click.Path(exists=True, file_okay=True, dir_okay=False))
+def deployMulti(orgsFile, packageFile, testLevel, runTests, validate, compressLevel, concurrency, settingFile):
+  """Deploy the same metadata to many orgs concurrently"""
+  multi_org = importMultiOrg()
+  targets = multi_org.loadTargets(orgsFile)
+
+  with tracing.span('package.parse', file=packageFile):
+    packageVersion, _ = sfdc_utils.package_creator(packageFile)
+
+  print('{:<30}{:<40}'.format(click.style('Target orgs: ', fg='yellow'), click.style(', '.join(target['name'] for target in targets), fg='green')))
+  print('{:<30}{:<40}'.format(click.style('Package.xml file: ', fg='yellow'), click.style(packageFile, fg='green')))
+  print('{:<30}{:<40}'.format(click.style('API Version: ', fg='yellow'), click.style(packageVersion, fg='green')))
+  print('\n{:<30}{:<40}\n'.format(click.style('Validate or Deploy: ', fg='yellow'), click.style('Validate' if validate else 'Deploy', fg='green')))
+
+  pe = PluginEngine(settingFile=settingFile, outputFolder=packageFile.rpartition('/')[0])
+
+  pe.preDeploy()
+
+  # The ZIP file is built once and then read again for each org
+  with tempfile.NamedTemporaryFile(suffix='.zip') as zipFile:
+    for chunk in sfdc_utils.zipDirectory(packageFile.rpartition('/')[0], compressLevel=compressLevel):
+      zipFile.write(chunk)
+    zipFile.flush()
+
+    start = time.time()
+    results = multi_org.deployMulti(targets, packageVersion, zipFile.name, testLevel, runTests, validate, concurrency)
+
+  printMultiResults(results, start)
+
+@click.command(name='retrieve-multi')
+@click.option('--orgs', 'orgsFile', required=True, help='JSON file with the list of target orgs', type=click.Path(exists=True, file_okay=True, dir_okay=False))
+@click.option('--package', 'packageFile', help='Path to the "package.xml" file', default=f'{DEFAULT_SRC}/package.xml', type=click.Path(exists=True, file_okay=True, dir_okay=False))
+@click.option('-o', '--output', 'outputPath', help='Output directory, each org is retrieved into a sub folder named as the org', default=PWD, type=click.Path(exists=True, file_okay=False, dir_okay=True))
+@click.option('-c', '--concurrency', 'concurrency', help='Maximum number of orgs retrieved at the same time', default=4, type=click.IntRange(1))
+@click.option('--store', 'storePath', help='Also keep the retrieved files as a snapshot of each org (named as in the orgs file) in this content-addressed store, ~/.pydx/store if no folder is given', is_flag=False, flag_value='', default=None, type=click.Path(file_okay=False, dir_okay=True))
+@click.option('--link', 'linkMode', help='How the files share the content of the store: the first supported of reflink, hardlink (read-only files) and copy by default', default='auto', type=click.Choice(['auto', 'reflink', 'hardlink', 'copy']))
+@click.option('-se', '--settingFile', 'settingFile', help='Setting file', default=f'{PWD}/pydx.json', type=click.Path(exists=True, file_okay=True, dir_okay=False))
+def retrieveMulti(orgsFile, packageFile, outputPath, concurrency, storePath, linkMode, settingFile):
+  """Retrieve the metadata specified inside the "package.xml" from many orgs concurrently"""
+  multi_org = importMultiOrg()
+  targets = multi_org.loadTargets(orgsFile)
+
+  with tracing.span('package.parse', file=packageFile):
+    packageVersion, packageText = sfdc_utils.package_creator(packageFile)
+
+  print('{:<30}{:<40}'.format(click.style('Target orgs: ', fg='yellow'), click.style(', '.join(target['name'] for target in targets), fg='green')))
+  print('{:<30}{:<40}'.format(click.style('Package.xml file: ', fg='yellow'), click.style(packageFile, fg='green')))
+  print('{:<30}{:<40}'.format(click.style('API Version: ', fg='yellow'), click.style(packageVersion, fg='green')))
+  print('{:<30}{:<40}'.format(click.style('Output directory: ', fg='yellow'), click.style(outputPath, fg='green')))
+
+  outputPaths = {target['name']: os.path.join(outputPath, target['name']) for target in targets}
+  for path in outputPaths.values():
+    os.makedirs(path, exist_ok=True)
+
+  start = time.time()
+  results = multi_org.retrieveMulti(targets, packageVersion, packageText, outputPaths, concurrency)
+
+  for result in results:
+    if result.status == 'Retrieved':
+      pe = PluginEngine(settingFile=settingFile, outputFolder=outputPaths[result.name])
+      pe.postRetrieve()
+
+      if storePath is not None:
+        storeSnapshot(storePath, linkMode, result.name, outputPaths[result.name])
+
+  printMultiResults(results, start)
+
+def importMultiOrg():
+  try:
+    from ..utils import multi_org
+  except ImportError as e:
+    raise click.ClickException(str(e))
+  return multi_org
+
+def printMultiResults(results, start):
+  click.echo()
+  for result in results:
+    color = 'green' if result.status in ('Succeeded', 'Retrieved') else 'red'
+    details = ''
+    if result.deployResult is not None:
+      details = 'components {}/{}, tests {}/{}'.format(result.deployResult.numberComponentsDeployed, result.deployResult.numberComponentsTotal, result.deployResult.numberTestsCompleted, result.deployResult.numberTestsTotal)
+    elif result.error is not None:
+      details = result.error
+    click.echo('{:<30}{:<30}{:<30} {}'.format(
+      click.style(result.name, fg='yellow'),
+      click.style(result.status, fg=color),
+      click.style('[Elapsed time: {}, API calls: {}]'.format(timedelta(seconds=int(result.elapsed)), result.apiCalls), fg='bright_black'),
+      details
+    ))
+
+  click.echo(click.style('[Total elapsed time: {}]'.format(timedelta(seconds=int(time.time() - start))), fg='bright_black'))
+
+  if any(result.status not in ('Succeeded', 'Retrieved') for result in results):
+    sys.exit(1)
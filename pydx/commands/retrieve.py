@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+from datetime import timedelta
+
+import click
+from yaspin import yaspin
+
+from .common import DEFAULT_SRC, PWD, printExtractStats, storeSnapshot
+from ..sfdc import Sfdc
+from ..sfdc.session_cache import SessionCache
+from ..engine.plugin_engine import PluginEngine
+from ..utils import sfdc_utils, tracing
+from ..utils.polling import Poller
+from ..utils.extract import ExtractStats, extractZip
+
+@click.command(name='retrieve')
+@click.option('-u', '--username', 'username', required=True, help='Salesforce username')
+@click.option('-p', '--password', 'password', required=True, help='Salesforce password')
+@click.option('--package', 'packageFile', help='Path to the "package.xml" file', default=f'{DEFAULT_SRC}/package.xml', type=click.Path(exists=True, file_okay=True, dir_okay=False))
+@click.option('-s', '--sandbox', 'isSandbox', help='Set SFDC URL to sandbox', is_flag=True, default=False)
+@click.option('-o', '--output', 'outputPath', help='Output directory', default=DEFAULT_SRC, type=click.Path(exists=True, file_okay=False, dir_okay=True))
+@click.option('--chunkSize', 'chunkSize', help='Split the package into retrieve jobs of at most this number of members', default=None, type=click.IntRange(1))
+@click.option('-c', '--concurrency', 'concurrency', help='Maximum number of retrieve jobs running at the same time with --chunkSize', default=4, type=click.IntRange(1))
+@click.option('--store', 'storePath', help='Also keep the retrieved files as a snapshot of the org (named as the username) in this content-addressed store, ~/.pydx/store if no folder is given', is_flag=False, flag_value='', default=None, type=click.Path(file_okay=False, dir_okay=True))
+@click.option('--link', 'linkMode', help='How the files share the content of the store: the first supported of reflink, hardlink (read-only files) and copy by default', default='auto', type=click.Choice(['auto', 'reflink', 'hardlink', 'copy']))
+@click.option('--noSessionCache', 'noSessionCache', help='Always login instead of reusing the cached session of the org', is_flag=True, default=False)
+@click.option('-se', '--settingFile', 'settingFile', help='Setting file', default=f'{PWD}/pydx.json', type=click.Path(exists=True, file_okay=True, dir_okay=False))
+def retrieve(username, password, packageFile, isSandbox, outputPath, chunkSize, concurrency, storePath, linkMode, noSessionCache, settingFile):
+  """Retrieve metadatas specified inside the "package.xml" from Salesforce"""
+
+  sfdcURL = sfdc_utils.sfdc_url(isSandbox)
+
+  with tracing.span('package.parse', file=packageFile):
+    packageVersion, packageText = sfdc_utils.package_creator(packageFile)
+
+  print('{:<30}{:<40}'.format(click.style('SFDC URL: ', fg='yellow'), click.style(sfdcURL, fg='green')))
+  print('{:<30}{:<40}'.format(click.style('Username: ', fg='yellow'), click.style(username, fg='green')))
+  print('{:<30}{:<40}'.format(click.style('Password: ', fg='yellow'), click.style(password, fg='green')))
+  print('{:<30}{:<40}'.format(click.style('Package.xml file: ', fg='yellow'), click.style(packageFile, fg='green')))
+  print('{:<30}{:<40}'.format(click.style('API Version: ', fg='yellow'), click.style(packageVersion, fg='green')))
+  print('{:<30}{:<40}'.format(click.style('Output directory: ', fg='yellow'), click.style(outputPath, fg='green')))
+  print('{:<30}{:<40}'.format(click.style('Setting File: ', fg='yellow'), click.style(settingFile, fg='green')))
+
+  connection = Sfdc(username, password, sfdcURL, packageVersion, sessionCache=None if noSessionCache else SessionCache())
+
+  print(click.style('Connecting to SFDC...', fg='bright_black'))
+  with tracing.span('login') as span:
+    connection.login()
+    span['cached'] = connection.sessionFromCache
+  print('{}{}{}'.format(click.style('Connected as: ', fg='yellow'), click.style(connection.username, fg='green'), click.style(' (cached session)' if connection.sessionFromCache else '', fg='bright_black')))
+
+  with tracing.span('retrieve', chunkSize=chunkSize):
+    if chunkSize:
+      retrieveChunked(connection, packageFile, outputPath, chunkSize, concurrency)
+    else:
+      retrieveSingle(connection, packageText, outputPath)
+
+  pe = PluginEngine(settingFile=settingFile, outputFolder=outputPath)
+
+  pe.postRetrieve()
+
+  if storePath is not None:
+    storeSnapshot(storePath, linkMode, connection.username, outputPath)
+
+def retrieveSingle(connection, packageText, outputPath):
+  print(click.style('Submit retrieve request...', fg='bright_black'))
+  connection.retrieve(package=packageText)
+  print('{}{}'.format(click.style('Async ID: ', fg='yellow'), click.style(connection.asyncProcessId, fg='green')))
+
+  retrieving_start = time.time()
+
+  poller = Poller(initial=2)
+
+  with yaspin(text=click.style('Retrieving...', fg='bright_black'), color="green") as spinner, tracing.span('retrieve.wait') as span:
+    span['polls'] = 1
+    while not connection.isRetrievingMetadata():
+      poller.wait()
+      span['polls'] += 1
+    spinner.text = '{} {}'.format(click.style('Retrieve completed', fg='green'), click.style('[Elapsed time: {}]'.format(timedelta(seconds=int(time.time() - retrieving_start))), fg='bright_black'))
+    spinner.ok("✅")
+
+  with tracing.span('retrieve.download') as span:
+    zipFile = connection.getZipFile()
+    span['bytes'] = os.fstat(zipFile.fileno()).st_size
+
+  printExtractStats(extractZip(zipFile, outputPath))
+
+  print('{}{}'.format(click.style('API calls: ', fg='yellow'), click.style(str(connection.apiCalls), fg='green')))
+
+def retrieveChunked(connection, packageFile, outputPath, chunkSize, concurrency):
+  from ..utils import chunked_retrieve
+
+  _, packageTypes = sfdc_utils.package_types(packageFile)
+  packages = sfdc_utils.package_batches(packageTypes, chunkSize)
+
+  print(click.style('Submit {} retrieve requests...'.format(len(packages)), fg='bright_black'))
+
+  retrieving_start = time.time()
+
+  with yaspin(text=click.style('Retrieving [0/{}]...'.format(len(packages)), fg='bright_black'), color="green") as spinner:
+    def onProgress(completed, total):
+      spinner.text = click.style('Retrieving [{}/{}]...'.format(completed, total), fg='bright_black')
+
+    results = chunked_retrieve.retrieveChunks(connection, packages, outputPath, concurrency=concurrency, onProgress=onProgress)
+    failed = [result for result in results if not result.succeeded]
+
+    elapsed = click.style('[Elapsed time: {}]'.format(timedelta(seconds=int(time.time() - retrieving_start))), fg='bright_black')
+    if failed:
+      spinner.text = '{} {}'.format(click.style('Retrieve failed for {} of {} chunks'.format(len(failed), len(packages)), fg='red'), elapsed)
+      spinner.fail("❌")
+    else:
+      spinner.text = '{} {}'.format(click.style('Retrieve completed', fg='green'), elapsed)
+      spinner.ok("✅")
+
+  for result in failed:
+    click.echo(click.style('  Chunk {}: {}'.format(result.index + 1, result.errors[-1]), fg='red'))
+
+  stats = ExtractStats()
+  for result in results:
+    stats.add(result.stats)
+  # Profiles and the like are only complete with the entries of every chunk
+  if failed:
+    click.echo(click.style('  Profiles, permission sets and translations are not updated', fg='red'))
+  else:
+    stats.add(chunked_retrieve.mergeChunkFiles(results, outputPath))
+  printExtractStats(stats)
+
+  print('{}{}'.format(click.style('Retried chunks: ', fg='yellow'), click.style(str(sum(1 for result in results if result.attempts > 1)), fg='green')))
+  print('{}{}'.format(click.style('API calls: ', fg='yellow'), click.style(str(connection.apiCalls + sum(result.apiCalls for result in results)), fg='green')))
+
+  if failed:
+    sys.exit(1)
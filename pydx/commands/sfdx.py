@@ -0,0 +1,114 @@
+import os
+import subprocess
+import sys
+
+import click
+
+from .common import DEFAULT_SRC, PWD, printExtractStats
+from .deploy import waitForDeploy
+from .retrieve import retrieveSingle
+from ..sfdc import Sfdc
+from ..sfdc import sfdx_auth
+from ..sfdc.exceptions import SfdxAuthError
+from ..engine.plugin_engine import PluginEngine
+from ..utils import sfdc_utils, tracing
+from ..utils.extract import extractZip
+
+@click.command(name='retrieve-sfdx')
+@click.option('-f', '--folder', 'folder', required=True, help='Where to unpack the retrieved metadatas', default=DEFAULT_SRC, type=click.Path(exists=True))
+@click.option('-o', '--orgalias', 'orgAlias', required=True, help='The organization alias')
+@click.option('-p', '--packageFile', 'packageFile', required=True, help='Path to package.xml file', default=f'{DEFAULT_SRC}/package.xml', type=click.Path(exists=True, file_okay=True, dir_okay=False))
+@click.option('--cli', 'useCli', help='Run the SFDX CLI instead of using its authorization', is_flag=True, default=False)
+@click.option('-se', '--settingFile', 'settingFile', help='Setting file', default=f'{PWD}/pydx.json', type=click.Path(exists=True, file_okay=True, dir_okay=False))
+def retrieveSFDX(folder, orgAlias, packageFile, useCli, settingFile):
+  """Retrieve from an org authorized with the SFDX CLI"""
+  click.echo('Retrieve SFDX')
+
+  packageVersion, packageText = sfdc_utils.package_creator(packageFile)
+  connection = None if useCli else sfdxConnection(orgAlias, packageVersion)
+
+  if connection is None:
+    runSfdx(['sfdx', 'force:mdapi:retrieve', '-r', folder, '-u', orgAlias, '-k', packageFile])
+
+    printExtractStats(extractZip(f'{folder}/unpackaged.zip', folder, stripPrefix='unpackaged/'))
+
+    os.remove(f'{folder}/unpackaged.zip')
+  else:
+    with tracing.span('retrieve'):
+      retrieveSingle(connection, packageText, folder)
+
+  pe = PluginEngine(settingFile=settingFile, outputFolder=folder)
+
+  pe.postRetrieve()
+
+@click.command(name='deploy-sfdx')
+@click.option('-f', '--folder', 'folder', required=True, help='Where metadata and package.xml are', default=DEFAULT_SRC, type=click.Path(exists=True))
+@click.option('-o', '--orgalias', 'orgAlias', required=True, help='The organization alias')
+@click.option('-v', '--validate', 'validate', help='Perform only a validation', is_flag=True, default=False)
+@click.option('-l', '--runLocalTests', 'runLocalTests', help='Run also Local Tests for this deploy', is_flag=True, default=False)
+@click.option('--cli', 'useCli', help='Run the SFDX CLI instead of using its authorization', is_flag=True, default=False)
+@click.option('-se', '--settingFile', 'settingFile', help='Setting file', default=f'{PWD}/pydx.json', type=click.Path(exists=True, file_okay=True, dir_okay=False))
+def deploySFDX(folder, orgAlias, validate, runLocalTests, useCli, settingFile):
+  """Deploy to an org authorized with the SFDX CLI"""
+  click.echo('Deploy SFDX')
+
+  packageVersion, _ = sfdc_utils.package_creator(f'{folder}/package.xml')
+  connection = None if useCli else sfdxConnection(orgAlias, packageVersion)
+
+  pe = PluginEngine(settingFile=settingFile, outputFolder=folder)
+
+  pe.preDeploy()
+
+  if connection is None:
+    command = ['sfdx', 'force:mdapi:deploy', '-d', folder, '-u', orgAlias, '-w', '10']
+
+    if validate:
+      command.append('-c')
+
+    if runLocalTests:
+      command.append('-l')
+
+    runSfdx(command)
+    return
+
+  print(click.style('Submitting {} request...'.format('deploy' if not validate else 'validation'), fg='bright_black'))
+  with tracing.span('deploy.upload'):
+    # Without -l the default test level of the org is used, like the SFDX CLI does
+    connection.deploy(lambda: sfdc_utils.zipDirectory(folder), testLevel='RunLocalTests' if runLocalTests else None, validateOnly=validate)
+  print('{}{}'.format(click.style('Async ID: ', fg='yellow'), click.style(connection.asyncProcessId, fg='green')))
+
+  deployResult = waitForDeploy(connection, validate)
+
+  print('{}{}'.format(click.style('API calls: ', fg='yellow'), click.style(str(connection.apiCalls), fg='green')))
+
+  if deployResult.status != 'Succeeded':
+    sys.exit(1)
+
+def runSfdx(command):
+  """
+  Run the SFDX CLI, exiting with its exit code if it fails.
+  """
+  try:
+    with tracing.span('sfdx', command=command[1]):
+      result = subprocess.run(command)
+  except FileNotFoundError:
+    raise click.ClickException('The SFDX CLI is not installed, authorize the org with it on another machine and copy its ~/.sfdx folder')
+  if result.returncode != 0:
+    sys.exit(result.returncode)
+
+def sfdxConnection(orgAlias, apiVersion):
+  """
+  A connection to an org using its SFDX authorization, or None (after telling why) to fall back to the SFDX CLI.
+  """
+  try:
+    with tracing.span('sfdx.auth'):
+      auth = sfdx_auth.readAuth(orgAlias)
+  except SfdxAuthError as e:
+    print(click.style(f'{e}, running the SFDX CLI', fg='yellow'))
+    return None
+
+  connection = Sfdc.fromAccessToken(auth.accessToken, auth.instanceUrl, apiVersion, username=auth.username, orgId=auth.orgId)
+  connection.refreshSession = lambda: sfdx_auth.refreshAccessToken(auth, connection.transport)
+
+  print('{}{}{}'.format(click.style('Connected as: ', fg='yellow'), click.style(auth.username, fg='green'), click.style(f' ({auth.instanceUrl})', fg='bright_black')))
+  return connection
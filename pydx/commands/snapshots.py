@@ -0,0 +1,67 @@
+import time
+from datetime import datetime
+
+import click
+
+from .common import DEFAULT_SRC
+from ..utils import snapshots, tracing
+
+@click.command(name='checkout')
+@click.argument('ref')
+@click.option('-f', '--folder', 'folder', help='Folder which will hold the files of the snapshot', default=DEFAULT_SRC, type=click.Path(file_okay=False, dir_okay=True))
+@click.option('--store', 'storePath', help='Snapshot store', default=snapshots.defaultStore(), type=click.Path(file_okay=False, dir_okay=True))
+@click.option('--link', 'linkMode', help='How the files share the content of the store: the first supported of reflink, hardlink (read-only files) and copy by default', default='auto', type=click.Choice(snapshots.LINK_MODES))
+@click.option('--force', 'force', help='Overwrite the files changed since the last snapshot or checkout of the folder', is_flag=True, default=False)
+def checkout(ref, folder, storePath, linkMode, force):
+  """Switch a folder to a snapshot of an org kept in the snapshot store
+
+  REF is "ORG" for the last snapshot of the org, or "ORG@ID" for the last one whose id starts with ID.
+  """
+  store = snapshots.SnapshotStore(storePath, linkMode=linkMode)
+  start = time.time()
+
+  try:
+    snapshot = store.resolve(ref)
+    with tracing.span('snapshot.checkout', snapshot=snapshot.ref) as span:
+      stats = store.checkout(snapshot, folder, force=force)
+      span.update(written=stats.written, removed=stats.removed, hashed=stats.hashed)
+  except Exception as e:
+    raise click.ClickException(str(e))
+
+  summary = '{} files written, {} removed, {} unchanged ({} hashed{})'.format(stats.written, stats.removed, stats.files - stats.written, stats.hashed, f', {stats.mode}' if stats.mode else '')
+  print('{}{}'.format(click.style('Checked out: ', fg='yellow'), click.style(f'{snapshot.ref} into {folder}', fg='green')))
+  print('{}{} {}'.format(click.style('Files: ', fg='yellow'), click.style(summary, fg='green'), click.style('[{:.1f} s]'.format(time.time() - start), fg='bright_black')))
+
+@click.command(name='snapshots')
+@click.argument('org', required=False)
+@click.option('--store', 'storePath', help='Snapshot store', default=snapshots.defaultStore(), type=click.Path(file_okay=False, dir_okay=True))
+@click.option('--keep', 'keep', help='Remove all but the last KEEP snapshots of each org, and the content no snapshot uses', type=click.IntRange(0))
+@click.option('--verify', 'verify', help='Check the content of the store, removing the files changed since they were added', is_flag=True, default=False)
+def listSnapshots(org, storePath, keep, verify):
+  """List the snapshots of the retrieved orgs kept in the snapshot store"""
+  store = snapshots.SnapshotStore(storePath)
+
+  if verify:
+    with tracing.span('snapshot.verify'):
+      damaged = store.verify()
+    color = 'red' if damaged else 'green'
+    print('{}{}'.format(click.style('Verify: ', fg='yellow'), click.style('{} damaged files removed'.format(len(damaged)), fg=color)))
+    if damaged:
+      click.echo(click.style('The snapshots using them cannot be checked out until they are retrieved again', fg='red'))
+
+  if keep is not None:
+    with tracing.span('snapshot.prune'):
+      removed, blobs, freed = store.prune(keep)
+    print('{}{}'.format(click.style('Prune: ', fg='yellow'), click.style(f'{removed} snapshots and {blobs} files removed, {freed} bytes freed', fg='green')))
+
+  orgSnapshots = store.snapshots(org)
+  for snapshot in orgSnapshots:
+    click.echo('{:<60}{:<30} {}'.format(
+      click.style(snapshot.ref, fg='yellow'),
+      click.style(datetime.fromtimestamp(snapshot.createdAt).strftime('%Y-%m-%d %H:%M:%S'), fg='bright_black'),
+      '{} files, {} bytes'.format(snapshot.files, snapshot.bytes)
+    ))
+
+  blobs, size = store.usage()
+  total = sum(snapshot.bytes for snapshot in store.snapshots())
+  print('{}{}'.format(click.style('Store: ', fg='yellow'), click.style('{} ({} files, {} bytes for {} bytes of snapshots)'.format(storePath, blobs, size, total), fg='green')))
@@ -0,0 +1,183 @@
+import os
+import time
+
+import click
+
+from .common import DEFAULT_SRC, PWD, printCheckResult
+from ..sfdc import Sfdc
+from ..sfdc.session_cache import SessionCache
+from ..engine.plugin_engine import PluginEngine
+from ..utils import sfdc_utils, metadata, delta, tracing, preflight, watcher
+from ..utils.polling import Poller
+
+@click.command(name='watch')
+@click.option('-u', '--username', 'username', required=True, help='Salesforce username')
+@click.option('-p', '--password', 'password', required=True, help='Salesforce password')
+@click.option('--package', 'packageFile', help='Path to the "package.xml" file', default=f'{DEFAULT_SRC}/package.xml', type=click.Path(exists=True, file_okay=True, dir_okay=False))
+@click.option('-s', '--sandbox', 'isSandbox', help='Set SFDC URL to sandbox', is_flag=True, default=False)
+@click.option('-t', '--testLevel', 'testLevel', help='Test level', default='NoTestRun', type=click.Choice(['RunAllTests', 'RunLocalTests', 'NoTestRun']))
+@click.option('-z', '--compressLevel', 'compressLevel', help='ZIP compression level (0 to store files uncompressed)', default=1, type=click.IntRange(0, 9))
+@click.option('--debounce', 'debounce', help='Seconds without changes before the changed files are deployed', default=0.5, type=click.FloatRange(0))
+@click.option('--polling', 'polling', help='Look for changes by scanning the folder, instead of using watchdog', is_flag=True, default=False)
+@click.option('--interval', 'interval', help='Seconds between two scans of the folder when polling', default=1.0, type=click.FloatRange(0.1))
+@click.option('--skipCheck', 'skipCheck', help='Do not check the changed files locally before sending them', is_flag=True, default=False)
+@click.option('--noSessionCache', 'noSessionCache', help='Always login instead of reusing the cached session of the org', is_flag=True, default=False)
+@click.option('-se', '--settingFile', 'settingFile', help='Setting file', default=f'{PWD}/pydx.json', type=click.Path(exists=True, file_okay=True, dir_okay=False))
+def watch(username, password, packageFile, isSandbox, testLevel, compressLevel, debounce, polling, interval, skipCheck, noSessionCache, settingFile):
+  """Deploy the changed metadata to Salesforce every time files are saved"""
+  sfdcURL = sfdc_utils.sfdc_url(isSandbox)
+  packageVersion, _ = sfdc_utils.package_creator(packageFile)
+  folder = packageFile.rpartition('/')[0]
+
+  if not isSandbox and testLevel == 'NoTestRun':
+    print(click.style("Since you're deploying in PROD, tests must be run\n", fg='yellow'))
+    testLevel = 'RunLocalTests'
+
+  connection = Sfdc(username, password, sfdcURL, packageVersion, sessionCache=None if noSessionCache else SessionCache())
+  print(click.style('Connecting to SFDC...', fg='bright_black'))
+  connection.login()
+  print('{}{}{}'.format(click.style('Connected as: ', fg='yellow'), click.style(connection.username, fg='green'), click.style(' (cached session)' if connection.sessionFromCache else '', fg='bright_black')))
+
+  manifest = delta.DeployManifest(delta.DeployManifest.location(settingFile, username, sfdcURL, folder))
+  session = WatchSession(connection, manifest, folder, settingFile, packageVersion, testLevel, compressLevel, skipCheck)
+  fileWatcher = watcher.createWatcher(folder, polling=polling, interval=interval).start()
+  print('{}{}'.format(click.style('Watching: ', fg='yellow'), click.style('{} ({})'.format(folder, 'polling' if isinstance(fileWatcher, watcher.PollingWatcher) else 'watchdog'), fg='green')))
+
+  try:
+    # What changed since the last deploy to this org is pushed first
+    if manifest.exists():
+      session.tryPush(set(session.known) | set(sfdc_utils.listFiles(folder)))
+    else:
+      print(click.style('No previous deploy to this org, only the next changes will be deployed', fg='yellow'))
+
+    print(click.style('Waiting for changes, press Ctrl+C to stop', fg='bright_black'))
+    for changed in watcher.batches(fileWatcher, debounce):
+      session.tryPush(changed)
+  except KeyboardInterrupt:
+    print(click.style('\nStopped', fg='bright_black'))
+  finally:
+    fileWatcher.stop()
+    session.close()
+
+class WatchSession:
+  """
+  State kept between the deploys of pydx watch: the logged in connection, the plugins (imported once)
+  and the hashes of the files as deployed to the org, shared with "pydx deploy --delta".
+  """
+
+  def __init__(self, connection, manifest, folder, settingFile, packageVersion, testLevel, compressLevel, skipCheck):
+    self.connection = connection
+    self.folder = folder
+    self.settingFile = settingFile
+    self.packageVersion = packageVersion
+    self.testLevel = testLevel
+    self.compressLevel = compressLevel
+    self.skipCheck = skipCheck
+
+    self.pluginEngine = PluginEngine(settingFile=settingFile, outputFolder=folder)
+    # Each plugin pass only edits the files which changed, with the same helpers (and process pool) for the whole session
+    self.pluginEngine.cache = True
+    self.pluginEngine.keepHelpers()
+
+    # Without a previous deploy the org is assumed to match the folder, which is not recorded for "pydx deploy --delta"
+    self.manifest = manifest if manifest.exists() else None
+    if manifest.exists():
+      self.known = dict(manifest.hashes)
+    else:
+      # The files rewritten by the first plugin pass (e.g. all the profiles) are not changes, so it runs before hashing the folder
+      self.pluginEngine.preDeploy()
+      self.known = delta.folderHashes(folder)
+    # Hashes of the files of the last failed deploy, which are not sent again until they change
+    self.failed = {}
+
+  def close(self):
+    self.pluginEngine.close()
+
+  def tryPush(self, relPaths):
+    """
+    Push the files, printing the errors: the next changes are deployed anyway.
+    """
+    try:
+      self.push(relPaths)
+    except Exception as e:
+      print(click.style(f'Error while deploying: {e}', fg='red'))
+
+  def push(self, relPaths):
+    """
+    Deploy the components of the given files whose content differs from the org.
+    """
+    start = time.time()
+
+    self.pluginEngine.preDeploy()
+
+    hashes = {relPath: sfdc_utils.fileHash(os.path.join(self.folder, relPath)) for relPath in relPaths if os.path.isfile(os.path.join(self.folder, relPath))}
+    changed = sorted(relPath for relPath, value in hashes.items() if value != self.known.get(relPath) and value != self.failed.get(relPath))
+
+    deleted = sorted(relPath for relPath in relPaths if relPath not in hashes and relPath in self.known)
+    if deleted:
+      print(click.style('Deleted files are not deployed: {}'.format(', '.join(deleted)), fg='yellow'))
+      for relPath in deleted:
+        del self.known[relPath]
+
+    if not changed:
+      return
+
+    try:
+      components, files = delta.deltaPackage(self.folder, changed)
+    except Exception as e:
+      print(click.style(f'{e}, not deployed', fg='red'))
+      self.failed.update((relPath, hashes[relPath]) for relPath in changed)
+      return
+
+    fileHashes = {relPath: hashes.get(relPath) or sfdc_utils.fileHash(os.path.join(self.folder, relPath)) for relPath in files}
+    if not components:
+      self.known.update(fileHashes)
+      return
+
+    names = sorted('{}:{}'.format(typeName, member) for typeName, members in components.items() for member in members)
+    print('\n{}{}'.format(click.style('Changed: ', fg='yellow'), click.style(', '.join(names), fg='green')))
+
+    if not self.skipCheck:
+      checkResult = preflight.checkFolder(self.folder, preflight.CheckCache.location(self.settingFile, self.folder), fileHashes, package=False)
+      if checkResult.errors:
+        printCheckResult(checkResult)
+        self.failed.update(fileHashes)
+        return
+
+    with tracing.span('watch.deploy', files=len(files)) as span:
+      deployResult = self.deploy(components, files)
+      span['status'] = deployResult.status
+
+    elapsed = time.time() - start
+    if deployResult.status == 'Succeeded':
+      print('{} {}'.format(click.style('✅ Deployed {} components'.format(len(names)), fg='green'), click.style(f'[{elapsed:.1f} s]', fg='bright_black')))
+      self.known.update(fileHashes)
+      if self.manifest is not None:
+        self.manifest.save(self.known)
+      for relPath in fileHashes:
+        self.failed.pop(relPath, None)
+    else:
+      print('{} {}'.format(click.style('❌ Deployment {}'.format(deployResult.status), fg='red'), click.style(f'[{elapsed:.1f} s]', fg='bright_black')))
+      for failure in deployResult.componentFailures:
+        click.echo(click.style('  {}: {}'.format(failure.get('fileName'), failure.get('problem')), fg='red'))
+      for failure in deployResult.testFailures:
+        click.echo(click.style('  {}.{}: {}'.format(failure.get('name'), failure.get('methodName'), failure.get('message')), fg='red'))
+      self.failed.update(fileHashes)
+
+  def deploy(self, components, files):
+    """
+    Deploy the files with a package.xml listing only their components, returning the final DeployResult.
+    """
+    extraFiles = {'package.xml': metadata.packageXml(components, self.packageVersion)}
+    self.connection.deploy(lambda: sfdc_utils.zipFiles(self.folder, files, compressLevel=self.compressLevel, extraFiles=extraFiles), testLevel=self.testLevel)
+
+    # Small deploys complete in a few seconds, so the status is checked often
+    poller = Poller(initial=0.5, maximum=5)
+    deployFinished, deployResult = self.connection.isDeploying(includeDetails=False)
+    while not deployFinished:
+      poller.wait((deployResult.status, deployResult.componentsDone, deployResult.testsDone))
+      deployFinished, deployResult = self.connection.isDeploying(includeDetails=False)
+
+    if deployResult.status == 'Failed' or deployResult.numberComponentErrors + deployResult.numberTestErrors > 0:
+      _, deployResult = self.connection.isDeploying(includeDetails=True)
+    return deployResult
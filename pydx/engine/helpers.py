@@ -1,77 +1,321 @@
-import xmltodict
 import shutil
 import glob
 import os
+import secrets
+import sys
+import importlib
 import click
+from concurrent.futures import ProcessPoolExecutor
+
+from . import xml_editor, xml_filter
+from ..utils import tracing
+from ..utils.metadata import PackageIndex
+
+# Layouts of standard objects which come with another object
+LAYOUT_OBJECTS = {'PersonAccount': 'Account', 'CaseClose': 'Case', 'CaseInteraction': 'Case'}
+
+def callbackReference(callback):
+  """
+  Returns the (module, name) pair used to pickle a callback, or None if it cannot be imported by name
+  (e.g. lambdas and nested functions). Element filters are plain data, so they are their own reference.
+  """
+  if isinstance(callback, xml_filter.ElementFilter):
+    return callback
+
+  module = sys.modules.get(getattr(callback, '__module__', None))
+  name = getattr(callback, '__qualname__', '')
+
+  target = module
+  for part in name.split('.'):
+    target = getattr(target, part, None)
+
+  return (module.__name__, name) if target is callback else None
+
+def resolveCallback(reference):
+  if isinstance(reference, xml_filter.ElementFilter):
+    return reference
+
+  module, name = reference
+  target = importlib.import_module(module)
+  for part in name.split('.'):
+    target = getattr(target, part)
+  return target
+
+def editFile(fileName, edits):
+  """
+  Apply a list of (kind, callback) edits to a single file, either as parsed XML ('xml' with xmltodict,
+  'lxml' with an lxml tree), as raw text or as element filters ('filter').
+  The file is read, parsed and written once: consecutive edits of the same kind share the same parsed document.
+  Files with element filters only are streamed, without reading them in memory.
+  """
+  if all(kind == 'filter' for kind, _ in edits):
+    xml_filter.filterFile(fileName, [elementFilter for _, callback in edits for elementFilter in xml_filter.callbackFilters(callback)])
+    return
+
+  with open(fileName, 'r') as fr:
+    text = fr.read()
+
+  # Current representation of the file: None (text), 'xml' or 'lxml'
+  docKind = None
+  doc = None
+
+  for kind, callback in edits:
+    if kind != docKind:
+      if docKind is not None:
+        text = unparse(docKind, doc)
+      doc = parseAs(kind, text)
+      docKind = kind if doc is not None else None
+
+    if kind == 'filter':
+      text = xml_filter.filterText(text, xml_filter.callbackFilters(callback))
+      continue
+
+    callback(fileName, text if doc is None else doc)
+
+  if docKind is not None:
+    text = unparse(docKind, doc)
+
+  # The file is replaced, not rewritten: it may be a hardlink of the snapshot store
+  tmpFile = os.path.join(os.path.dirname(fileName), f'.pydx-{secrets.token_hex(4)}-{os.path.basename(fileName)}')
+  try:
+    with open(tmpFile, 'x') as fw:
+      fw.write(text)
+    os.replace(tmpFile, fileName)
+  finally:
+    if os.path.exists(tmpFile):
+      os.remove(tmpFile)
+
+# xmltodict is only imported when a file is edited with it, the standard plugins do not need it
+
+def parseAs(kind, text):
+  if kind == 'xml':
+    import xmltodict
+    return xmltodict.parse(text)
+  if kind == 'lxml':
+    return xml_editor.parse(text)
+  return None
+
+def unparse(kind, doc):
+  if kind == 'xml':
+    import xmltodict
+    return xmltodict.unparse(doc, pretty=True)
+  return xml_editor.serialize(doc)
+
+def editShard(fileEdits):
+  """
+  Apply the edits of a list of files inside a worker process, with the callbacks given by reference.
+  Returns the (fileName, exception) pairs of the files which failed.
+  """
+  errors = []
+
+  for fileName, edits in fileEdits:
+    try:
+      editFile(fileName, [(kind, resolveCallback(reference)) for kind, reference in edits])
+    except Exception as e:
+      errors.append((fileName, e))
+
+  return errors
+
+def initWorker(path):
+  # Plugins are imported relative to the folder the CLI runs in
+  if path not in sys.path:
+    sys.path.append(path)
+
 class Helper:
 
-  def __init__(self, outputDir):
+  def __init__(self, outputDir, workers=1, cache=None):
+    """
+    With more than one worker, editXML and editRawFile split the files over a process pool.
+    With a PluginCache, they skip the files which did not change since the last run.
+    """
     self.outputDir = outputDir
+    self.workers = workers
+    self.cache = cache
+    self.pool = None
 
-  def removeFolders(self, path):
-    srcPath = f'{self.outputDir}/{path}'
-    try:
-      shutil.rmtree(srcPath)
-    except:
-      print(click.style(f"Error while deleting folder : {srcPath}", fg='red'))
+    # Edits collected while batching, see startBatch
+    self.batch = None
 
-  def filterMetadata(self, path):
+    # Parsed package files, see packageIndex
+    self.packageIndexes = {}
+
+  def startBatch(self):
+    """
+    Collect the following editXML and editRawFile calls instead of running them.
+    When the batch is flushed, the edits are grouped by file, so that each file is parsed and written once,
+    with all its edits applied in the order they were requested.
+    """
+    self.batch = []
+
+  def flush(self):
+    """
+    Run the edits collected so far, if batching.
+    """
+    if not self.batch:
+      return
+
+    fileEdits = {}
+    for path, kind, callback in self.batch:
+      for fileName in sorted(glob.glob(f'{self.outputDir}/{path}')):
+        fileEdits.setdefault(fileName, []).append((kind, callback))
+    self.batch = []
+
+    self.__editFiles(sorted(fileEdits.items()))
+
+  def close(self):
+    if self.pool is not None:
+      self.pool.shutdown()
+      self.pool = None
+
+  def removeFolders(self, path):
+    self.flush()
     srcPath = f'{self.outputDir}/{path}'
-    for filePath in glob.glob(srcPath):
+    with tracing.span('helper.removeFolders', path=path):
       try:
-        os.remove(filePath)
+        shutil.rmtree(srcPath)
       except:
-        print(click.style(f"Error while deleting file : {filePath}", fg='red'))
+        print(click.style(f"Error while deleting folder : {srcPath}", fg='red'))
 
-  def editXML(self, path, callback):
+  def filterMetadata(self, path):
+    self.flush()
     srcPath = f'{self.outputDir}/{path}'
+    with tracing.span('helper.filterMetadata', path=path) as span:
+      filePaths = glob.glob(srcPath)
+      span['files'] = len(filePaths)
+      for filePath in filePaths:
+        try:
+          os.remove(filePath)
+        except:
+          print(click.style(f"Error while deleting file : {filePath}", fg='red'))
 
-    for fileName in glob.glob(srcPath):
-      doc = None
+  def editXML(self, path, callback, engine=None):
+    """
+    Edit the XML files matching path with callback(fileName, document).
+    The engine ('xmltodict' or 'lxml') is given here or by the callback itself, see xml_editor.engine.
+    Callbacks decorated with xml_filter.dropElements are run as streaming filters instead.
+    """
+    if xml_filter.callbackFilters(callback):
+      self.__edit(path, 'filter', callback)
+      return
 
-      fr = open(fileName, 'r')
-      doc = xmltodict.parse(fr.read())
+    engine = engine or xml_editor.callbackEngine(callback)
+    if engine not in xml_editor.ENGINES:
+      raise ValueError(f'Unknown XML engine {engine}, expected one of {xml_editor.ENGINES}')
 
-      callback(fileName, doc)
+    self.__edit(path, 'xml' if engine == 'xmltodict' else 'lxml', callback)
 
-      fw = open(fileName, 'w')
-      fw.write(xmltodict.unparse(doc, pretty=True))
+  def filterElements(self, path, element, key=None, values=None):
+    """
+    Drop from the XML files matching path the elements at element (slash separated tags under the root element)
+    whose key child has one of the given values, or all of them without a key.
+    e.g. filterElements('profiles/*.profile', 'userPermissions', 'name', ['ViewUserPII'])
+    The files are streamed, so this is much faster than editXML on large files.
+    """
+    self.__edit(path, 'filter', xml_filter.ElementFilter(element, key, values))
 
   def editRawFile(self, path, callback):
+    self.__edit(path, 'raw', callback)
+
+  def __edit(self, path, kind, callback):
+    if self.batch is not None:
+      self.batch.append((path, kind, callback))
+      return
+
     srcPath = f'{self.outputDir}/{path}'
 
-    for fileName in glob.glob(srcPath):
-      doc = None
+    self.__editFiles([(fileName, [(kind, callback)]) for fileName in sorted(glob.glob(srcPath))])
 
-      fr = open(fileName, 'r')
-      doc = fr.read()
+  def __editFiles(self, fileEdits):
+    with tracing.span('helper.edit', files=len(fileEdits), workers=self.workers) as span:
+      if self.cache is not None:
+        fileEdits = self.cache.skip(fileEdits)
+        span['edited'] = len(fileEdits)
 
-      callback(fileName, doc)
+      self.__runEdits(fileEdits)
 
-      fw = open(fileName, 'w')
-      fw.write(doc)
+      if self.cache is not None:
+        self.cache.store(fileEdits)
 
-  def removeStandardLayouts(self, packageFile):
-    srcPath = f'{self.outputDir}/layouts/*.layout'
+  def __runEdits(self, fileEdits):
+    references = {callback: callbackReference(callback) for _, edits in fileEdits for _, callback in edits}
+
+    if self.workers <= 1 or len(fileEdits) <= 1 or None in references.values():
+      for fileName, edits in fileEdits:
+        editFile(fileName, edits)
+      return
 
-    package = open(f'{self.outputDir}/{packageFile}', 'r')
+    if self.pool is None:
+      self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=initWorker, initargs=(os.getcwd(),))
 
-    doc = xmltodict.parse(package.read())
+    # Each worker gets a few shards of the list, results are collected in the files order
+    shards = [(fileName, [(kind, references[callback]) for kind, callback in edits]) for fileName, edits in fileEdits]
+    chunksize = max(1, len(shards) // (self.workers * 4))
+    futures = [self.pool.submit(editShard, shards[i:i + chunksize]) for i in range(0, len(shards), chunksize)]
+
+    errors = [error for future in futures for error in future.result()]
+    for fileName, error in errors:
+      print(click.style(f"Error while editing file {fileName}: {error}", fg='red'))
+    if errors:
+      raise errors[0][1]
+
+  def packageIndex(self, packageFile):
+    """
+    The PackageIndex of a package file (relative to the output folder), parsed once and shared by all the helpers
+    until the file changes.
+    """
+    path = f'{self.outputDir}/{packageFile}'
+    modified = os.path.getmtime(path)
+
+    cached = self.packageIndexes.get(path)
+    if cached is None or cached[0] != modified:
+      cached = (modified, PackageIndex.fromFile(path))
+      self.packageIndexes[path] = cached
+
+    return cached[1]
+
+  def removeStandardLayouts(self, packageFile):
+    self.flush()
+    with tracing.span('helper.removeStandardLayouts'):
+      self.__removeStandardLayouts(packageFile)
+
+  def __removeStandardLayouts(self, packageFile):
+    srcPath = f'{self.outputDir}/layouts/*.layout'
 
-    members = []
     try:
-      for type in doc['Package']['types']:
-        if type['name'] == 'CustomObject':
-          members = list(filter(lambda member: member != '*' and '__c' not in member, type['members']))
+      objects = self.packageIndex(packageFile).typeMembers('CustomObject')
 
       for filePath in glob.glob(srcPath):
-        fileName = os.path.basename(filePath).partition('-')[0]
-        if fileName not in members:
-          if fileName == 'PersonAccount' and 'Account' in members:
-            pass
-          elif (fileName == 'CaseClose' or fileName == 'CaseInteraction') and 'Case' in members:
-            pass
-          elif '__c' not in fileName and '__mdt' not in fileName:
-            os.remove(filePath)
+        objectName = os.path.basename(filePath).partition('-')[0]
+        if objectName in objects or LAYOUT_OBJECTS.get(objectName) in objects:
+          continue
+        if '__c' not in objectName and '__mdt' not in objectName:
+          os.remove(filePath)
     except:
-      print(click.style(f"Error while removing standard layouts", fg='red'))
\ No newline at end of file
+      print(click.style(f"Error while removing standard layouts", fg='red'))
+
+  def prunePerPackage(self, packageFile='package.xml'):
+    """
+    Remove the metadata files (relative to the output folder) of the components not listed in the package file,
+    and the folders left empty. Returns the number of files removed.
+    """
+    self.flush()
+    with tracing.span('helper.prunePerPackage') as span:
+      index = self.packageIndex(packageFile)
+      removed = 0
+      # Folders which had some content removed, deleted if nothing is left (e.g. bundles)
+      pruned = set()
+
+      for dirname, _, filenames in os.walk(self.outputDir, topdown=False):
+        for filename in filenames:
+          filePath = os.path.join(dirname, filename)
+          if not index.coversFile(os.path.relpath(filePath, self.outputDir)):
+            os.remove(filePath)
+            removed += 1
+            pruned.add(dirname)
+
+        if dirname in pruned and dirname != self.outputDir and not os.listdir(dirname):
+          os.rmdir(dirname)
+          pruned.add(os.path.dirname(dirname))
+
+      span['removed'] = removed
+      return removed
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import secrets
+import shutil
+import sys
+
+from .helpers import callbackReference
+from .xml_filter import ElementFilter
+from ..utils.sfdc_utils import fileHash
+
+class PluginCache:
+  """
+  On-disk manifest of the files edited by the plugins, used to run them only on the files that changed.
+  For each file and list of edits it stores the hash of the input and of the output, and the output itself:
+  a file which still matches the output is skipped, a file which matches the input gets the stored output back.
+  The whole cache is invalidated when its version (plugins source, settings) changes.
+  """
+
+  def __init__(self, cacheDir, outputDir, version):
+    self.cacheDir = cacheDir
+    self.outputDir = outputDir
+    self.version = version
+    self.manifestFile = os.path.join(cacheDir, 'manifest.json')
+    self.objectsDir = os.path.join(cacheDir, 'objects')
+
+    self.entries = {}
+    if os.path.exists(self.manifestFile):
+      with open(self.manifestFile) as f:
+        manifest = json.load(f)
+      if manifest.get('version') == version:
+        self.entries = manifest['entries']
+
+    # Hash of the input of the files being edited
+    self.inputs = {}
+    self.moduleHashes = {}
+    self.skipped = 0
+
+  @staticmethod
+  def settingsVersion(settingFile, scripts):
+    """
+    Version of the cache for the given settings and plugin modules, computed from their source.
+    """
+    digest = hashlib.sha256()
+    for path in [settingFile] + [getattr(sys.modules.get(script), '__file__', None) or script for script in scripts]:
+      digest.update(path.encode())
+      if os.path.isfile(path):
+        digest.update(fileHash(path).encode())
+    return digest.hexdigest()
+
+  def signature(self, edits):
+    """
+    Identifies a list of edits by the name and the source of their callbacks,
+    or returns None if some callback cannot be identified (e.g. lambdas).
+    """
+    parts = []
+    for kind, callback in edits:
+      reference = callbackReference(callback)
+      if reference is None:
+        return None
+      if isinstance(reference, ElementFilter):
+        parts.append(f'{kind}:{reference!r}')
+        continue
+
+      if reference[0] not in self.moduleHashes:
+        moduleFile = getattr(sys.modules[reference[0]], '__file__', None)
+        self.moduleHashes[reference[0]] = fileHash(moduleFile) if moduleFile else ''
+      parts.append(f'{kind}:{reference[0]}.{reference[1]}:{self.moduleHashes[reference[0]]}')
+
+    return '|'.join(parts)
+
+  def key(self, fileName, edits):
+    signature = self.signature(edits)
+    return None if signature is None else f'{os.path.relpath(fileName, self.outputDir)}|{signature}'
+
+  def skip(self, fileEdits):
+    """
+    Returns the (fileName, edits) pairs which need to be run, restoring the output of the others.
+    """
+    pending = []
+
+    for fileName, edits in fileEdits:
+      key = self.key(fileName, edits)
+      if key is None:
+        pending.append((fileName, edits))
+        continue
+
+      currentHash = fileHash(fileName)
+      entry = self.entries.get(key)
+      storedOutput = os.path.join(self.objectsDir, entry['output']) if entry else None
+
+      if entry and currentHash == entry['output']:
+        self.skipped += 1
+      elif entry and currentHash == entry['input'] and os.path.exists(storedOutput):
+        restoreFile(storedOutput, fileName)
+        self.skipped += 1
+      else:
+        self.inputs[key] = currentHash
+        pending.append((fileName, edits))
+
+    return pending
+
+  def store(self, fileEdits):
+    """
+    Record the output of edits which have just been run.
+    """
+    os.makedirs(self.objectsDir, exist_ok=True)
+
+    for fileName, edits in fileEdits:
+      key = self.key(fileName, edits)
+      if key is None or key not in self.inputs:
+        continue
+
+      outputHash = fileHash(fileName)
+      storedOutput = os.path.join(self.objectsDir, outputHash)
+      if not os.path.exists(storedOutput):
+        shutil.copyfile(fileName, storedOutput)
+
+      self.entries[key] = {'input': self.inputs.pop(key), 'output': outputHash}
+
+  def save(self):
+    """
+    Write the manifest, dropping the entries of files which do not exist anymore and the unused outputs.
+    """
+    self.entries = {key: entry for key, entry in self.entries.items() if os.path.exists(os.path.join(self.outputDir, key.partition('|')[0]))}
+
+    os.makedirs(self.objectsDir, exist_ok=True)
+    used = {entry['output'] for entry in self.entries.values()}
+    for name in os.listdir(self.objectsDir):
+      if name not in used:
+        os.remove(os.path.join(self.objectsDir, name))
+
+    tmpFile = f'{self.manifestFile}.tmp'
+    with open(tmpFile, 'w') as f:
+      json.dump({'version': self.version, 'entries': self.entries}, f)
+    os.replace(tmpFile, self.manifestFile)
+
+def restoreFile(storedOutput, fileName):
+  """
+  Replace a file with a stored output. The file is replaced, not rewritten: it may be a hardlink of the snapshot store.
+  """
+  tmpFile = os.path.join(os.path.dirname(fileName), f'.pydx-{secrets.token_hex(4)}-{os.path.basename(fileName)}')
+  try:
+    shutil.copyfile(storedOutput, tmpFile)
+    os.replace(tmpFile, fileName)
+  finally:
+    if os.path.exists(tmpFile):
+      os.remove(tmpFile)
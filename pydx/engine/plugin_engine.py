@@ -1,9 +1,13 @@
 import json
 import os
 import sys
+import importlib
+import hashlib
 from inspect import getmembers, isfunction
 
 from .helpers import Helper
+from .plugin_cache import PluginCache
+from ..utils import tracing
 
 import os
 
@@ -13,29 +17,87 @@ class PluginEngine:
     f = open(settingFile)
     data = json.load(f)
     
+    self.settingFile = settingFile
     self.outputFolder = outputFolder
 
     self.preDeployScripts = data['preDeploy']
     self.postRetrieveScripts = data['postRetrieve']
 
+    # Number of processes used by the helpers to edit files in parallel
+    self.workers = data.get('workers', 1)
+
+    # In pipeline mode the edits of all the plugins are fused, so each file is parsed once
+    self.pipeline = data.get('pipeline', False)
+
+    # With the cache, edits are run only on the files which changed since the last run
+    self.cache = data.get('cache', False)
+
     # Build context
     self.context = {}
     self.context['ENVIRONMENT'] = os.environ
 
+    # Helper of each phase kept between the runs, see keepHelpers
+    self.helpers = None
+
+  def keepHelpers(self):
+    """
+    Keep the helper of each phase, with its process pool and cache, from one run to the next until close is called.
+    """
+    self.helpers = {}
+
+  def close(self):
+    for helper in (self.helpers or {}).values():
+      helper.close()
+    self.helpers = None
+
   def preDeploy(self):
-    self.__run(self.preDeployScripts)
+    self.__run(self.preDeployScripts, 'preDeploy')
 
   def postRetrieve(self):
-    self.__run(self.postRetrieveScripts)
+    self.__run(self.postRetrieveScripts, 'postRetrieve')
 
-  def __run(self, scripts):
-    sys.path.append(os.getcwd())
-    helper = Helper(self.outputFolder)
-    
-    for script in scripts:
-      module = __import__(script)
-      for funcName, func in getmembers(module, isfunction):
-        func(os.environ, helper)
+  def __run(self, scripts, phase):
+    with tracing.span(f'plugins.{phase}', scripts=scripts):
+      self.__runScripts(scripts, phase)
+
+  def __runScripts(self, scripts, phase):
+    if os.getcwd() not in sys.path:
+      sys.path.append(os.getcwd())
+    modules = [importlib.import_module(script) for script in scripts]
+
+    helper = self.helpers.get(phase) if self.helpers is not None else None
+    if helper is None:
+      helper = self.__createHelper(scripts, phase)
+      if self.helpers is not None:
+        self.helpers[phase] = helper
+
+    if self.pipeline:
+      helper.startBatch()
+
+    try:
+      for module in modules:
+        for funcName, func in getmembers(module, isfunction):
+          with tracing.span('plugin', phase=phase, module=module.__name__, function=funcName), tracing.profiled():
+            func(os.environ, helper)
+
+      # In pipeline mode the edits are run here
+      with tracing.span('plugin.flush', phase=phase), tracing.profiled():
+        helper.flush()
+    finally:
+      if self.helpers is None:
+        helper.close()
+      if helper.cache is not None:
+        helper.cache.save()
+
+  def __createHelper(self, scripts, phase):
+    cache = None
+    if self.cache:
+      # One cache for each phase and output folder, next to the settings file
+      folderId = hashlib.sha256(os.path.abspath(self.outputFolder).encode()).hexdigest()[:12]
+      cacheDir = os.path.join(os.path.dirname(os.path.abspath(self.settingFile)), '.pydx', 'plugin-cache', f'{phase}-{folderId}')
+      cache = PluginCache(cacheDir, self.outputFolder, PluginCache.settingsVersion(self.settingFile, scripts))
+
+    return Helper(self.outputFolder, workers=self.workers, cache=cache)
     
 
 if __name__ == '__main__':
@@ -0,0 +1,104 @@
+""" lxml editing backend for Helper.editXML, writing files back in the format used by Salesforce """
+
+import re
+
+from lxml import etree
+
+NS = 'http://soap.sforce.com/2006/04/metadata'
+NAMESPACES = {'sf': NS}
+INDENT = '    '
+DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+ENGINES = ('xmltodict', 'lxml')
+
+# Text segments (between a tag end and the next tag) containing quotes, which Salesforce escapes
+QUOTED_TEXT = re.compile(r'>[^<"\']*["\'][^<]*<')
+# Empty elements without attributes, which Salesforce writes as an open and a close tag
+EMPTY_ELEMENT = re.compile(r'<([^\s/<>!?]+)/>')
+
+def engine(name):
+  """
+  Decorator choosing the editXML engine of a callback:
+  'xmltodict' callbacks get the document as nested dictionaries, 'lxml' callbacks get the root lxml element.
+  """
+  if name not in ENGINES:
+    raise ValueError(f'Unknown XML engine {name}, expected one of {ENGINES}')
+
+  def decorator(callback):
+    callback.xmlEngine = name
+    return callback
+
+  return decorator
+
+def callbackEngine(callback):
+  return getattr(callback, 'xmlEngine', 'xmltodict')
+
+def parse(text):
+  """
+  Parse a metadata file, keeping its whitespace so untouched nodes are written back as they were.
+  """
+  parser = etree.XMLParser(remove_blank_text=False, resolve_entities=False, huge_tree=True)
+  return etree.fromstring(text.encode('utf-8'), parser)
+
+def tag(name, namespace=NS):
+  return f'{{{namespace}}}{name}'
+
+def appendElement(parent, name, text=None):
+  """
+  Append a child element in the namespace of its parent, returning it. Its indentation is set when the file is written.
+  """
+  namespace = etree.QName(parent).namespace
+  element = etree.SubElement(parent, tag(name, namespace) if namespace else name)
+  element.text = text
+  return element
+
+def removeElement(element):
+  """
+  Remove an element with its line, keeping the indentation of the following element (or of the closing tag of its parent).
+  """
+  parent = element.getparent()
+  previous = element.getprevious()
+
+  if element.getnext() is None:
+    if previous is not None:
+      previous.tail = element.tail
+    else:
+      parent.text = element.tail
+
+  # lxml removes the tail of the element too
+  parent.remove(element)
+
+def indentNewElements(root):
+  """
+  Indent the elements added by a callback like the rest of the file: one element per line, 4 spaces per level.
+  Parsed elements are followed by whitespace, so only the ones without a tail need to be fixed.
+  """
+  added = [element for element in root.iter(etree.Element) if element.tail is None and element is not root]
+
+  for element in added:
+    parent = element.getparent()
+    depth = sum(1 for _ in element.iterancestors())
+
+    if element.getprevious() is None and not (parent.text or '').strip():
+      parent.text = '\n' + INDENT * depth
+
+    if element.getnext() is None:
+      element.tail = '\n' + INDENT * (depth - 1)
+      previous = element.getprevious()
+      if previous is not None and not (previous.tail or '').strip():
+        previous.tail = '\n' + INDENT * depth
+    else:
+      element.tail = '\n' + INDENT * depth
+
+def serialize(root):
+  """
+  Write a document the way Salesforce does: UTF-8 declaration, quotes escaped in text,
+  empty elements as an open and a close tag and a final new line.
+  """
+  indentNewElements(root)
+
+  text = etree.tostring(root, encoding='unicode')
+  text = QUOTED_TEXT.sub(lambda match: match.group(0).replace('"', '&quot;').replace("'", '&apos;'), text)
+  text = EMPTY_ELEMENT.sub(r'<\1></\1>', text)
+
+  return DECLARATION + text + '\n'
@@ -0,0 +1,239 @@
+""" Streaming element filters for Helper.editXML, dropping elements from metadata files in a single pass """
+
+import os
+import shutil
+import stat
+import tempfile
+from io import BytesIO
+from xml.parsers import expat
+
+# Bytes read from the file for each call of the parser
+CHUNK_SIZE = 1024 * 1024
+
+class ElementFilter:
+  """
+  Drop the elements at path (slash separated tag names, from the root element) whose key child has one of the given values,
+  or all of them without a key.
+  """
+
+  def __init__(self, path, key=None, values=None):
+    self.path = tuple(path.split('/'))
+    self.key = key
+    self.values = frozenset(values or ())
+
+    if key is not None and values is None:
+      raise ValueError(f'Filter of {path} by {key} without values')
+
+  def __repr__(self):
+    return f'ElementFilter({"/".join(self.path)!r}, {self.key!r}, {sorted(self.values)!r})'
+
+  def __eq__(self, other):
+    return isinstance(other, ElementFilter) and repr(self) == repr(other)
+
+  def __hash__(self):
+    return hash(repr(self))
+
+  def matches(self, keyText):
+    return self.key is None or keyText in self.values
+
+def dropElements(path, key=None, values=None):
+  """
+  Decorator turning an editXML callback into a streaming filter: editXML does not run the body of the callback,
+  the files are rewritten by filterFile without being parsed into a tree. The body is only run by direct calls.
+  It can be stacked to drop several elements.
+  """
+  def decorator(callback):
+    callback.xmlFilters = (ElementFilter(path, key, values),) + getattr(callback, 'xmlFilters', ())
+    return callback
+
+  return decorator
+
+def callbackFilters(callback):
+  if isinstance(callback, ElementFilter):
+    return (callback,)
+  return getattr(callback, 'xmlFilters', ())
+
+def localName(name):
+  return name.rpartition(':')[2]
+
+WHITESPACE = b' \t\r\n'
+
+class StreamFilter:
+  """
+  Copies an XML stream, leaving out the elements dropped by the filters with the whitespace before them,
+  so the following element (or the closing tag of the parent) keeps its indentation. The other bytes are copied as they are.
+
+  expat only gives the offset where the current event starts, so an element ends where the whitespace before the next event starts.
+  The subtrees which cannot contain a filtered element (or the key of one) are skipped with handlers only counting their tags,
+  and text is only read inside key children.
+  """
+
+  def __init__(self, target, filters):
+    self.target = target
+    self.filters = {}
+    for elementFilter in filters:
+      self.filters.setdefault(elementFilter.path, []).append(elementFilter)
+    # Paths of the elements containing filtered elements
+    self.prefixes = {path[:i] for path in self.filters for i in range(len(path))}
+
+    self.parser = expat.ParserCreate()
+    self.parser.buffer_text = True
+    self.parser.CommentHandler = self.event
+    self.parser.ProcessingInstructionHandler = self.event
+    self.track()
+
+    # Unwritten bytes of the stream, starting at offset "base"
+    self.buffer = bytearray()
+    self.base = 0
+    self.written = 0
+
+    # Tags under the root element, down to the current one, and the number of open tags in the subtree being skipped
+    self.path = None
+    self.skipped = 0
+    # Offset of the last event handled: the bytes before it are final
+    self.lastEvent = 0
+
+    # Element being checked: (filters, start offset, path length), the text of its key children
+    # and, once it is closed, its (start offset, dropped)
+    self.candidate = None
+    self.keyTexts = {}
+    self.keyText = None
+    self.closing = None
+    self.removed = 0
+
+  def track(self):
+    self.parser.StartElementHandler = self.startElement
+    self.parser.EndElementHandler = self.endElement
+
+  def skip(self):
+    self.parser.StartElementHandler = self.skipStart
+    self.parser.EndElementHandler = self.skipEnd
+
+  def skipStart(self, name, attributes):
+    self.skipped += 1
+
+  def skipEnd(self, name):
+    if self.skipped:
+      self.skipped -= 1
+    else:
+      self.track()
+      self.endElement(name)
+
+  def previousEnd(self, offset):
+    """
+    Offset of the end of the whitespace before offset.
+    """
+    index = offset - self.base
+    while index > 0 and self.buffer[index - 1] in WHITESPACE:
+      index -= 1
+    return index + self.base
+
+  def event(self, *args):
+    self.lastEvent = self.parser.CurrentByteIndex
+
+    if self.closing is not None:
+      start, drop = self.closing
+      self.closing = None
+      if drop:
+        self.emit(start)
+        self.written = self.previousEnd(self.lastEvent)
+        self.removed += 1
+
+  def startElement(self, name, attributes):
+    self.event()
+
+    if self.path is None:
+      # Root element
+      self.path = []
+      return
+
+    self.path.append(localName(name))
+
+    if self.candidate is None:
+      path = tuple(self.path)
+      filters = self.filters.get(path)
+      if filters:
+        start = self.previousEnd(self.lastEvent)
+        self.emit(start)
+        self.candidate = (filters, start, len(path))
+      elif path not in self.prefixes:
+        self.skip()
+    elif len(self.path) == self.candidate[2] + 1 and any(self.path[-1] == elementFilter.key for elementFilter in self.candidate[0]):
+      self.keyText = []
+      self.parser.CharacterDataHandler = self.keyText.append
+    else:
+      self.skip()
+
+  def endElement(self, name):
+    self.event()
+
+    if not self.path:
+      return
+
+    if self.candidate is not None:
+      filters, start, depth = self.candidate
+      if len(self.path) == depth:
+        drop = any(elementFilter.matches(self.keyTexts.get(elementFilter.key)) for elementFilter in filters)
+        self.closing = (start, drop)
+        self.candidate = None
+        self.keyTexts = {}
+      elif self.keyText is not None and len(self.path) == depth + 1:
+        self.keyTexts[self.path[-1]] = ''.join(self.keyText)
+        self.keyText = None
+        self.parser.CharacterDataHandler = None
+
+    self.path.pop()
+
+  def emit(self, end):
+    """
+    Write the stream up to the offset end.
+    """
+    if end > self.written:
+      self.target.write(self.buffer[self.written - self.base:end - self.base])
+      self.written = end
+
+  def feed(self, data, final=False):
+    self.buffer += data
+    self.parser.Parse(data, final)
+
+    if final:
+      self.emit(self.base + len(self.buffer))
+    elif self.candidate is None and self.closing is None:
+      self.emit(self.lastEvent)
+
+    del self.buffer[:self.written - self.base]
+    self.base = self.written
+
+def filterStream(source, target, filters):
+  """
+  Copy the binary stream source to target without the elements dropped by the filters, returning how many were dropped.
+  """
+  streamFilter = StreamFilter(target, filters)
+  for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+    streamFilter.feed(chunk)
+  streamFilter.feed(b'', final=True)
+  return streamFilter.removed
+
+def filterText(text, filters):
+  target = BytesIO()
+  filterStream(BytesIO(text.encode('utf-8')), target, filters)
+  return target.getvalue().decode('utf-8')
+
+def filterFile(fileName, filters):
+  """
+  Rewrite a file without the elements dropped by the filters, returning how many were dropped.
+  Files without dropped elements are left untouched.
+  """
+  fd, tmpFile = tempfile.mkstemp(dir=os.path.dirname(fileName) or '.', prefix='.pydx-')
+  try:
+    with open(fileName, 'rb') as source, os.fdopen(fd, 'wb') as target:
+      removed = filterStream(source, target, filters)
+    if removed:
+      shutil.copymode(fileName, tmpFile)
+      # A read-only hardlink of the snapshot store becomes a writable file of its own
+      os.chmod(tmpFile, os.stat(tmpFile).st_mode | stat.S_IWUSR)
+      os.replace(tmpFile, fileName)
+    return removed
+  finally:
+    if os.path.exists(tmpFile):
+      os.remove(tmpFile)
@@ -0,0 +1,233 @@
+""" asyncio client for Salesforce Metadata API, to drive many orgs concurrently """
+
+import asyncio
+
+try:
+  import aiohttp
+except ImportError:
+  raise ImportError('AsyncSfdc needs aiohttp, install it with: pip install "Python-SFDX-Toolkit[async]"')
+
+from . import soap_decoder
+from .sfdc import Sfdc
+from .soap_messages import LOGIN_MSG, CHECK_DEPLOY_STATUS_MSG, RETRIEVE_MSG, CHECK_RETRIEVE_STATUS_MSG
+from .streaming import ZipFileDecoder, encodeZipFile, CHUNK_SIZE
+from .transport import Transport, RETRY_STATUS, NOT_PROCESSED_STATUS
+
+class AsyncTransport:
+  """
+  asyncio counterpart of Transport: a pooled aiohttp session with timeouts and jittered retries.
+  """
+
+  def __init__(self, timeout=(10, 300), retries=3, backoff=0.5, maxBackoff=30, poolSize=10):
+    self.timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+    self.retries = retries
+    self.backoff = backoff
+    self.maxBackoff = maxBackoff
+    self.poolSize = poolSize
+    self.session = None
+
+  delay = Transport.delay
+
+  async def post(self, url, data, headers, idempotent=True):
+    """
+    Make a POST request, retrying it like Transport.post.
+    The response is returned unread: it must be released by the caller (i.e. with "async with").
+    """
+    if self.session is None:
+      self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit_per_host=self.poolSize), timeout=self.timeout)
+
+    replayable = callable(data) or isinstance(data, (str, bytes))
+    attempt = 0
+
+    while True:
+      canRetry = replayable and attempt < self.retries
+
+      try:
+        response = await self.session.post(url, data=data() if callable(data) else data, headers=headers)
+      except aiohttp.ClientConnectorError:
+        if not canRetry:
+          raise
+      except (aiohttp.ClientError, asyncio.TimeoutError):
+        if not canRetry or not idempotent:
+          raise
+      else:
+        if not canRetry or response.status not in (RETRY_STATUS if idempotent else NOT_PROCESSED_STATUS):
+          return response
+        response.release()
+
+      await asyncio.sleep(self.delay(attempt))
+      attempt += 1
+
+  async def close(self):
+    if self.session is not None:
+      await self.session.close()
+
+async def iterateInThread(chunks):
+  """
+  Iterate a blocking iterable (i.e. a file being zipped or read) without blocking the event loop.
+  """
+  iterator = iter(chunks)
+  while True:
+    chunk = await asyncio.to_thread(next, iterator, None)
+    if chunk is None:
+      return
+    yield chunk
+
+class AsyncSfdc:
+
+  def __init__(self, username, password, url, apiVersion, transport=None):
+    """
+    Initializes a new asyncio SFDC object to work with Salesforce Metadata API.
+    The same AsyncTransport can be shared by all the instances to share the connection pool.
+    """
+    self.url = url
+    self.username = username
+    self.password = password
+    self.apiVersion = apiVersion
+    self.sessionId = None
+    self.serverUrl = None
+    self.metadataUrl = None
+    self.asyncProcessId = None
+
+    # Number of requests made to Salesforce, useful to keep track of the API limits
+    self.apiCalls = 0
+
+    self.transport = transport or AsyncTransport()
+
+  async def __post(self, **kwargs):
+    self.apiCalls += 1
+    return await self.transport.post(**kwargs)
+
+  async def __call(self, **kwargs):
+    async with await self.__post(**kwargs) as response:
+      return await response.read()
+
+  async def login(self):
+    """
+    Login into SFDC Metadata API and retrieve SessionID and ServerURL.
+    """
+    login_soap_request_headers = {
+      'content-type': 'text/xml',
+      'charset': 'UTF-8',
+      'SOAPAction': 'login'
+    }
+
+    login_soap_body = LOGIN_MSG.format(username=self.username, password=self.password)
+    login_url = f'{self.url}/services/Soap/u/{self.apiVersion}'
+
+    content = await self.__call(url=login_url, data=login_soap_body, headers=login_soap_request_headers)
+
+    loginResult = soap_decoder.decodeLogin(content)
+    self.sessionId = loginResult.sessionId
+    self.serverUrl = loginResult.serverUrl
+    self.metadataUrl = loginResult.metadataUrl
+
+  async def retrieve(self, package):
+    """
+    Submit a retrieve request to SFDC Metadata API.
+    """
+    retrieve_soap_request_headers = {
+      'content-type': 'text/xml',
+      'charset': 'UTF-8',
+      'SOAPAction': 'retrieve'
+    }
+
+    retrieve_soap_body = RETRIEVE_MSG.format(sessionId=self.sessionId, apiVersion=self.apiVersion, singlePackage=True, unpackaged=package)
+
+    content = await self.__call(url=self.metadataUrl, data=retrieve_soap_body, headers=retrieve_soap_request_headers, idempotent=False)
+
+    self.asyncProcessId = soap_decoder.decodeAsyncResult(content).id
+
+  async def isRetrievingMetadata(self):
+    """
+    Checks the status of a retrieve request.
+    """
+    retrieve_status_soap_request_headers = {
+      'content-type': 'text/xml',
+      'charset': 'UTF-8',
+      'SOAPAction': 'checkRetrieveStatus'
+    }
+
+    retrieve_status_soap_body = CHECK_RETRIEVE_STATUS_MSG.format(sessionId=self.sessionId, asyncProcessId=self.asyncProcessId, includeZip=False)
+
+    content = await self.__call(url=self.metadataUrl, data=retrieve_status_soap_body, headers=retrieve_status_soap_request_headers)
+
+    retrieveResult = soap_decoder.decodeRetrieveStatus(content)
+
+    if retrieveResult.done and retrieveResult.status == 'Failed':
+      raise Exception(f'Retrieve failed: {retrieveResult.errorStatusCode}: {retrieveResult.errorMessage}')
+
+    return retrieveResult.done
+
+  async def getZipFile(self, fileObj=None):
+    """
+    Download the ZIP file of a completed retrieve request, streaming it into a file object
+    (a temporary file by default).
+    """
+    retrieve_status_soap_request_headers = {
+      'content-type': 'text/xml',
+      'charset': 'UTF-8',
+      'SOAPAction': 'checkRetrieveStatus'
+    }
+
+    retrieve_status_soap_body = CHECK_RETRIEVE_STATUS_MSG.format(sessionId=self.sessionId, asyncProcessId=self.asyncProcessId, includeZip=True)
+
+    decoder = ZipFileDecoder(fileObj)
+
+    async with await self.__post(url=self.metadataUrl, data=retrieve_status_soap_body, headers=retrieve_status_soap_request_headers) as response:
+      if response.status != 200:
+        raise Exception(f'ZIP file could not be retrieved: {await response.text()}')
+
+      # Decoding the base64 of the ZIP file takes longer than reading it, so it is done in a worker thread
+      async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        await asyncio.to_thread(decoder.feed, chunk)
+
+    zipFile = await asyncio.to_thread(decoder.close)
+
+    if zipFile is None:
+      raise Exception('ZIP file node could not be found in the retrieve result')
+
+    return zipFile
+
+  async def deploy(self, zipFile, testLevel: str, runTests=[], validateOnly=False):
+    """
+    Submit a deploy request to SFDC Metadata API.
+    The ZIP file is given like for Sfdc.deploy; it is read and encoded in a worker thread while it is sent.
+    """
+    deploy_soap_request_headers = {
+      'content-type': 'text/xml',
+      'charset': 'UTF-8',
+      'SOAPAction': 'deploy'
+    }
+
+    deploy_soap_head, deploy_soap_tail = Sfdc.deployEnvelope(self.sessionId, testLevel, runTests, validateOnly)
+
+    async def deploy_soap_body():
+      chunks = zipFile() if callable(zipFile) else zipFile
+      yield deploy_soap_head.encode()
+      async for chunk in iterateInThread(encodeZipFile([chunks] if isinstance(chunks, bytes) else chunks)):
+        yield chunk
+      yield deploy_soap_tail.encode()
+
+    replayable = callable(zipFile) or isinstance(zipFile, bytes)
+    content = await self.__call(url=self.metadataUrl, data=deploy_soap_body if replayable else deploy_soap_body(), headers=deploy_soap_request_headers, idempotent=False)
+
+    self.asyncProcessId = soap_decoder.decodeAsyncResult(content).id
+
+  async def isDeploying(self, includeDetails=True):
+    """
+    Checks the status of a Deploy request.
+    """
+    deploy_status_soap_request_headers = {
+      'content-type': 'text/xml',
+      'charset': 'UTF-8',
+      'SOAPAction': 'checkDeployStatus'
+    }
+
+    deploy_status_soap_body = CHECK_DEPLOY_STATUS_MSG.format(sessionId=self.sessionId, asyncProcessId=self.asyncProcessId, includeDetails=includeDetails)
+
+    content = await self.__call(url=self.metadataUrl, data=deploy_status_soap_body, headers=deploy_status_soap_request_headers)
+
+    deployResult = soap_decoder.decodeDeployStatus(content)
+
+    return (deployResult.done, deployResult)
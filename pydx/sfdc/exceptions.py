@@ -25,4 +25,21 @@ class SalesforceAuthenticationFailed(SalesforceError):
     self.message = message
 
   def __str__(self):
-    return '{code}: {message}'.format(code=self.code, message=self.message)
\ No newline at end of file
+    return '{code}: {message}'.format(code=self.code, message=self.message)
+
+class SalesforceSoapFault(SalesforceError):
+  """
+  Thrown when the Metadata API answers with a SOAP fault.
+  """
+
+  def __init__(self, code, message):
+    self.code = code
+    self.message = message
+
+  def __str__(self):
+    return '{code}: {message}'.format(code=self.code, message=self.message)
+
+class SfdxAuthError(Exception):
+  """
+  Thrown when an org cannot be found in the SFDX auth store, or its tokens cannot be read.
+  """
@@ -0,0 +1,91 @@
+""" Local cache of Salesforce sessions, to reuse them across commands instead of logging in every time """
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Sessions are considered expired a bit before Salesforce does, to leave time for the request using them
+EXPIRY_MARGIN = 60
+
+# Used when the login response does not tell how long the session is valid
+DEFAULT_SECONDS_VALID = 2 * 60 * 60
+
+class SessionCache:
+  """
+  JSON file, readable only by its owner, with the sessions of each (username, login URL, API version).
+  Salesforce expires a session after some time without activity, so the expiry is moved forward every time a session is used.
+  """
+
+  def __init__(self, path=None):
+    self.path = path or os.path.join(os.path.expanduser('~'), '.pydx', 'sessions.json')
+    self.lock = threading.Lock()
+
+  @staticmethod
+  def key(username, url, apiVersion):
+    return f'{username}|{url}|{apiVersion}'
+
+  def load(self):
+    try:
+      with open(self.path) as f:
+        return json.load(f)
+    except (OSError, ValueError):
+      return {}
+
+  def write(self, sessions):
+    directory = os.path.dirname(self.path)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    # mkstemp creates the file with 0600 permissions
+    fd, tmpFile = tempfile.mkstemp(dir=directory, prefix='.sessions-')
+    try:
+      with os.fdopen(fd, 'w') as f:
+        json.dump(sessions, f)
+      os.replace(tmpFile, self.path)
+    except BaseException:
+      os.remove(tmpFile)
+      raise
+
+  def get(self, username, url, apiVersion):
+    """
+    Returns the cached {sessionId, serverUrl, metadataUrl} of an org, or None if there is no valid one.
+    """
+    key = self.key(username, url, apiVersion)
+
+    with self.lock:
+      sessions = self.load()
+      session = sessions.get(key)
+      now = time.time()
+
+      if session is None or session['expiresAt'] - EXPIRY_MARGIN < now:
+        return None
+
+      session['expiresAt'] = now + session['secondsValid']
+      self.write(sessions)
+
+    return session
+
+  def put(self, username, url, apiVersion, loginResult):
+    secondsValid = loginResult.sessionSecondsValid or DEFAULT_SECONDS_VALID
+
+    with self.lock:
+      sessions = self.load()
+      now = time.time()
+
+      # Expired sessions of other orgs are dropped too
+      sessions = {key: session for key, session in sessions.items() if session['expiresAt'] > now}
+      sessions[self.key(username, url, apiVersion)] = {
+        'sessionId': loginResult.sessionId,
+        'serverUrl': loginResult.serverUrl,
+        'metadataUrl': loginResult.metadataUrl,
+        'secondsValid': secondsValid,
+        'expiresAt': now + secondsValid
+      }
+      self.write(sessions)
+
+  def drop(self, username, url, apiVersion):
+    with self.lock:
+      sessions = self.load()
+      if sessions.pop(self.key(username, url, apiVersion), None) is not None:
+        self.write(sessions)
@@ -1,14 +1,17 @@
-import requests
-from bs4 import BeautifulSoup
-from base64 import b64decode
-from .exceptions import SalesforceAuthenticationFailed
-from .soap_messages import LOGIN_MSG, DEPLOY_MSG, CHECK_DEPLOY_STATUS_MSG, RETRIEVE_MSG, CHECK_RETRIEVE_STATUS_MSG
+from . import soap_decoder
+from .exceptions import SalesforceSoapFault
+from .soap_messages import LOGIN_MSG, DEPLOY_MSG, DEPLOY_RECENT_VALIDATION_MSG, CHECK_DEPLOY_STATUS_MSG, RETRIEVE_MSG, CHECK_RETRIEVE_STATUS_MSG
+from .streaming import decodeZipFile, encodeZipFile, CHUNK_SIZE
+from .transport import Transport
+from ..utils import tracing
 
 class Sfdc:
 
-  def __init__(self, username, password, url, apiVersion):
+  def __init__(self, username, password, url, apiVersion, transport=None, sessionCache=None):
     """
     Initializes a new SFDC object to work with Salesforce Metadata API.
+    All the instances created without a transport share the default connection pool.
+    With a SessionCache, login reuses the cached session of the org when there is a valid one.
     """
     self.url = url
     self.username = username
@@ -19,13 +22,94 @@ class Sfdc:
     self.metadataUrl = None
     self.asyncProcessId = None
 
-    self.retrieveResult = None
+    # Number of requests made to Salesforce, useful to keep track of the API limits
+    self.apiCalls = 0
 
-  def login(self):
+    self.transport = transport or Transport.default()
+    self.sessionCache = sessionCache
+    self.sessionFromCache = False
+
+    # Callable returning a new (access token, instance URL), for the connections created from an access token
+    self.refreshSession = None
+    self.orgId = None
+
+  @classmethod
+  def fromAccessToken(cls, accessToken, instanceUrl, apiVersion, username=None, orgId=None, refreshSession=None, transport=None):
+    """
+    Returns a SFDC object using an OAuth access token (e.g. of an org authorized with the SFDX CLI) instead of logging in.
+    When the token expires, a new one is asked to refreshSession.
+    """
+    connection = cls(username, None, instanceUrl, apiVersion, transport)
+    connection.orgId = orgId
+    connection.refreshSession = refreshSession
+    connection.useAccessToken(accessToken, instanceUrl)
+    return connection
+
+  def useAccessToken(self, accessToken, instanceUrl):
+    self.sessionId = accessToken
+    self.url = instanceUrl
+    self.serverUrl = f'{instanceUrl}/services/Soap/u/{self.apiVersion}'
+    self.metadataUrl = f'{instanceUrl}/services/Soap/m/{self.apiVersion}' + (f'/{self.orgId}' if self.orgId else '')
+
+  def clone(self):
+    """
+    Returns a new SFDC object sharing the session and the transport of this one,
+    to run another async request (e.g. another retrieve) at the same time.
+    """
+    connection = Sfdc(self.username, self.password, self.url, self.apiVersion, self.transport, self.sessionCache)
+    connection.sessionId = self.sessionId
+    connection.serverUrl = self.serverUrl
+    connection.metadataUrl = self.metadataUrl
+    connection.orgId = self.orgId
+    connection.refreshSession = self.refreshSession
+    return connection
+
+  def __post(self, **kwargs):
+    self.apiCalls += 1
+    return self.transport.post(**kwargs)
+
+  def __call(self, buildBody, decode, replayable=True, **kwargs):
+    """
+    Make a request whose body is built from the current session and decode its response.
+    If the session is not valid anymore (e.g. a cached one which has been revoked)
+    the request is made again, once, after a new login.
+    """
+    with tracing.span('sfdc.' + kwargs['headers']['SOAPAction']) as span:
+      try:
+        with self.__post(data=buildBody(), **kwargs) as response:
+          return decode(response)
+      except SalesforceSoapFault as e:
+        if e.code != 'INVALID_SESSION_ID' or not replayable:
+          raise
+
+      span['relogin'] = True
+      self.login(useCache=False)
+
+      with self.__post(data=buildBody(), **kwargs) as response:
+        return decode(response)
+
+  def login(self, useCache=True):
     """
     Login into SFDC Metadata API and retrieve SessionID and ServerURL.
     """
 
+    # Connections created from an access token get a new one instead
+    if self.refreshSession is not None:
+      with tracing.span('sfdc.refresh'):
+        self.useAccessToken(*self.refreshSession())
+      return
+
+    # Reuse the cached session, or drop it when it has been found not valid
+    if self.sessionCache is not None:
+      session = self.sessionCache.get(self.username, self.url, self.apiVersion) if useCache else None
+      if session is not None:
+        self.sessionId = session['sessionId']
+        self.serverUrl = session['serverUrl']
+        self.metadataUrl = session['metadataUrl']
+        self.sessionFromCache = True
+        return
+      self.sessionCache.drop(self.username, self.url, self.apiVersion)
+
     # Setup the headers for the request
     login_soap_request_headers = {
       'content-type': 'text/xml',
@@ -40,19 +124,18 @@ class Sfdc:
     login_url = f'{self.url}/services/Soap/u/{self.apiVersion}'
 
     # Make the request
-    response = requests.post(url=login_url, data=login_soap_body, headers=login_soap_request_headers)
-    soup = BeautifulSoup(response.text, 'xml')
-
-    if response.status_code == 200:
-      # If the request was good, parse it to obtain SessionID and ServerURL
-      self.sessionId = soup.find('sessionId').text
-      self.serverUrl = soup.find('serverUrl').text
-      self.metadataUrl = soup.find('serverUrl').text.replace('/u/', '/m/')
-    else:
-      # Othewise, throw an exception
-      except_code = soup.find('sf:exceptionCode').text
-      except_msg = soup.find('sf:exceptionMessage').text
-      raise SalesforceAuthenticationFailed(except_code, except_msg)
+    with tracing.span('sfdc.login'):
+      response = self.__post(url=login_url, data=login_soap_body, headers=login_soap_request_headers)
+
+    # Parse it to obtain SessionID and ServerURL (a SalesforceAuthenticationFailed is raised otherwise)
+    loginResult = soap_decoder.decodeLogin(response.content)
+    self.sessionId = loginResult.sessionId
+    self.serverUrl = loginResult.serverUrl
+    self.metadataUrl = loginResult.metadataUrl
+    self.sessionFromCache = False
+
+    if self.sessionCache is not None:
+      self.sessionCache.put(self.username, self.url, self.apiVersion, loginResult)
 
   def retrieve(self, package):
     """
@@ -67,14 +150,11 @@ class Sfdc:
     }
 
     # Get the Retrieve SOAP Message and complete it with additional information
-    retrieve_soap_body = RETRIEVE_MSG.format(sessionId=self.sessionId, apiVersion=self.apiVersion, singlePackage=True, unpackaged=package)
+    retrieve_soap_body = lambda: RETRIEVE_MSG.format(sessionId=self.sessionId, apiVersion=self.apiVersion, singlePackage=True, unpackaged=package)
 
-    # Make the request
-    response = requests.post(url=self.metadataUrl, data=retrieve_soap_body, headers=retrieve_soap_request_headers)
-
-    # Parse response to get Async Id
-    soup = BeautifulSoup(response.text, 'xml')
-    self.asyncProcessId = soup.Envelope.Body.retrieveResponse.result.id.text
+    # Make the request and parse response to get Async Id
+    asyncResult = self.__call(retrieve_soap_body, lambda response: soap_decoder.decodeAsyncResult(response.content), url=self.metadataUrl, headers=retrieve_soap_request_headers, idempotent=False)
+    self.asyncProcessId = asyncResult.id
 
   def isRetrievingMetadata(self):
     """
@@ -89,36 +169,57 @@ class Sfdc:
     }
 
     # Get the Retrieve SOAP Message and complete it with additional information
-    retrieve_status_soap_body = CHECK_RETRIEVE_STATUS_MSG.format(sessionId=self.sessionId, asyncProcessId=self.asyncProcessId, includeZip=True)
+    # The ZIP file is not requested here: it is streamed once by getZipFile
+    retrieve_status_soap_body = lambda: CHECK_RETRIEVE_STATUS_MSG.format(sessionId=self.sessionId, asyncProcessId=self.asyncProcessId, includeZip=False)
 
-    # Make the request
-    response = requests.post(url=self.metadataUrl, data=retrieve_status_soap_body, headers=retrieve_status_soap_request_headers)
+    # Make the request and parse response to check retrieving status
+    retrieveResult = self.__call(retrieve_status_soap_body, lambda response: soap_decoder.decodeRetrieveStatus(response.content), url=self.metadataUrl, headers=retrieve_status_soap_request_headers)
+
+    if retrieveResult.done and retrieveResult.status == 'Failed':
+      raise Exception(f'Retrieve failed: {retrieveResult.errorStatusCode}: {retrieveResult.errorMessage}')
+
+    return retrieveResult.done
+
+  def getZipFile(self, fileObj=None):
+    """
+    Download the ZIP file of a completed retrieve request.
+    The response is streamed and decoded in chunks into a file object
+    (a temporary file by default), so the memory usage does not depend on the ZIP size.
+    """
+
+    # Setup the headers for the request
+    retrieve_status_soap_request_headers = {
+      'content-type': 'text/xml',
+      'charset': 'UTF-8',
+      'SOAPAction': 'checkRetrieveStatus'
+    }
+
+    # Get the Retrieve SOAP Message and complete it with additional information
+    retrieve_status_soap_body = lambda: CHECK_RETRIEVE_STATUS_MSG.format(sessionId=self.sessionId, asyncProcessId=self.asyncProcessId, includeZip=True)
 
-    # Parse response to check retrieving status
-    soup = BeautifulSoup(response.text, 'xml')
-    result = soup.Body.checkRetrieveStatusResponse.result.done
+    def decode(response):
+      if response.status_code != 200:
+        # Raises the SOAP fault of the response, if there is one
+        soap_decoder.parse(response.content)
+        raise Exception(f'ZIP file could not be retrieved: {response.text}')
+      return decodeZipFile(response.iter_content(chunk_size=CHUNK_SIZE), fileObj)
 
-    if result is None:
-      raise Exception(f'Result node could not be found: {response.text}')
-    elif result.text == 'true':
-      self.retrieveResult = response.text
-      return True
-    else:
-      return False
+    # Make the request, without loading the body in memory
+    zipFile = self.__call(retrieve_status_soap_body, decode, url=self.metadataUrl, headers=retrieve_status_soap_request_headers, stream=True)
 
-  def getZipFile(self):
-    if self.retrieveResult is not None:
-      soup = BeautifulSoup(self.retrieveResult, 'xml')
-      zipfile_base64 = soup.Body.checkRetrieveStatusResponse.result.zipFile.text
-      return b64decode(zipfile_base64)
+    if zipFile is None:
+      raise Exception('ZIP file node could not be found in the retrieve result')
 
-  def deploy(self, zipFile, testLevel: str, runTests=[], validateOnly=False):
+    return zipFile
+
+  @staticmethod
+  def deployEnvelope(sessionId, testLevel, runTests=[], validateOnly=False):
     """
-    Submit a deploy request to SFDC Metadata API.
+    Build the Deploy SOAP Message, returning the text before and after the ZIP file.
     """
     attributes = {
-      'sessionId': self.sessionId,
-      'ZipFile': zipFile,
+      'sessionId': sessionId,
+      'ZipFile': '{ZipFile}',
       'allowMissingFiles': False,
       'autoUpdatePackage': False,
       'checkOnly': validateOnly,
@@ -129,8 +230,8 @@ class Sfdc:
       'singlePackage': True
     }
 
-    if testLevel:
-      attributes['testLevel'] = '<met:testLevel>{}</met:testLevel>'.format(testLevel)
+    # Without a test level Salesforce applies the default one of the org
+    attributes['testLevel'] = '<met:testLevel>{}</met:testLevel>'.format(testLevel) if testLevel else ''
     
     testsTag = ''
     if runTests and str(testLevel).lower() == 'runspecifiedtests':
@@ -138,6 +239,16 @@ class Sfdc:
         testsTag += '<met:runTests>{}</met:runTests>'.format(test)
     attributes['tests'] = testsTag
 
+    head, _, tail = DEPLOY_MSG.format(**attributes).partition('{ZipFile}')
+    return head, tail
+
+  def deploy(self, zipFile, testLevel: str, runTests=[], validateOnly=False, encoded=False):
+    """
+    Submit a deploy request to SFDC Metadata API.
+    The ZIP file can be given as bytes, as an iterable of byte chunks or as a callable
+    returning such iterable (which lets the request be retried):
+    it is base64-encoded while the request body is being sent, unless it is already encoded.
+    """
     # Setup the headers for the request
     deploy_soap_request_headers = {
       'content-type': 'text/xml',
@@ -145,20 +256,51 @@ class Sfdc:
       'SOAPAction': 'deploy'
     }
 
-    # Get the Retrieve SOAP Message and complete it with additional information
-    deploy_soap_body = DEPLOY_MSG.format(**attributes)
-
-    # Make the request
-    response = requests.post(url=self.metadataUrl, data=deploy_soap_body, headers=deploy_soap_request_headers)
+    def deploy_soap_body():
+      # Get the Deploy SOAP Message and complete it with additional information
+      deploy_soap_head, deploy_soap_tail = self.deployEnvelope(self.sessionId, testLevel, runTests, validateOnly)
+      chunks = zipFile() if callable(zipFile) else zipFile
+      yield deploy_soap_head.encode()
+      chunks = [chunks] if isinstance(chunks, bytes) else chunks
+      yield from (chunks if encoded else encodeZipFile(chunks))
+      yield deploy_soap_tail.encode()
+
+    # Make the request, the body is sent with chunked transfer encoding
+    # and it can be built again for a retry only if the ZIP file can be read again
+    replayable = callable(zipFile) or isinstance(zipFile, bytes)
+    asyncResult = self.__call(
+      lambda: deploy_soap_body if replayable else deploy_soap_body(),
+      lambda response: soap_decoder.decodeAsyncResult(response.content),
+      replayable=replayable, url=self.metadataUrl, headers=deploy_soap_request_headers, idempotent=False
+    )
+
+    # Async Id of the deploy
+    self.asyncProcessId = asyncResult.id
+
+
+  def deployRecentValidation(self, validationId):
+    """
+    Quick deploy: deploy the components of a recent successful validation (with tests) without sending them or running the tests again.
+    """
+    deploy_recent_validation_soap_request_headers = {
+      'content-type': 'text/xml',
+      'charset': 'UTF-8',
+      'SOAPAction': 'deployRecentValidation'
+    }
 
-    # Parse response to get Async Id
-    soup = BeautifulSoup(response.text, 'xml')
-    self.asyncProcessId = soup.Envelope.Body.deployResponse.result.id.text
+    deploy_recent_validation_soap_body = lambda: DEPLOY_RECENT_VALIDATION_MSG.format(sessionId=self.sessionId, validationId=validationId)
 
+    # Async Id of the deploy
+    self.asyncProcessId = self.__call(
+      deploy_recent_validation_soap_body,
+      lambda response: soap_decoder.decodeDeployRecentValidation(response.content),
+      url=self.metadataUrl, headers=deploy_recent_validation_soap_request_headers, idempotent=False
+    )
 
-  def isDeploying(self):
+  def isDeploying(self, includeDetails=True):
     """
     Checks the status of a Deploy request.
+    Details (components and tests results) can be skipped to make the check lighter.
     """
      # Setup the headers for the request
     deploy_status_soap_request_headers = {
@@ -168,37 +310,9 @@ class Sfdc:
     }
 
     # Get the Deploy SOAP Message and complete it with additional information
-    deploy_status_soap_body = CHECK_DEPLOY_STATUS_MSG.format(sessionId=self.sessionId, asyncProcessId=self.asyncProcessId, includeDetails=True)
-
-    # Make the request
-    response = requests.post(url=self.metadataUrl, data=deploy_status_soap_body, headers=deploy_status_soap_request_headers)
-
-    # Parse response to check retrieving status
-    soup = BeautifulSoup(response.text, 'xml')
-    result = soup.Body.checkDeployStatusResponse.result.done
+    deploy_status_soap_body = lambda: CHECK_DEPLOY_STATUS_MSG.format(sessionId=self.sessionId, asyncProcessId=self.asyncProcessId, includeDetails=includeDetails)
 
-    deployResult = {
-      'numberComponentsDeployed': int(soup.Body.checkDeployStatusResponse.result.numberComponentsDeployed.text),
-      'numberComponentErrors': int(soup.Body.checkDeployStatusResponse.result.numberComponentErrors.text),
-
-      'componentsDone': int(soup.Body.checkDeployStatusResponse.result.numberComponentsDeployed.text) + int(soup.Body.checkDeployStatusResponse.result.numberComponentErrors.text),
-      'numberComponentsTotal': int(soup.Body.checkDeployStatusResponse.result.numberComponentsTotal.text),
-
-      'numberTestsCompleted': int(soup.Body.checkDeployStatusResponse.result.numberTestsCompleted.text),
-      'numberTestErrors': int(soup.Body.checkDeployStatusResponse.result.numberTestErrors.text),
-
-      'testsDone': int(soup.Body.checkDeployStatusResponse.result.numberTestsCompleted.text) + int(soup.Body.checkDeployStatusResponse.result.numberTestErrors.text),
-      'numberTestsTotal': int(soup.Body.checkDeployStatusResponse.result.numberTestsTotal.text),
-
-      'stateDetail': soup.Body.checkDeployStatusResponse.result.stateDetail.text if soup.Body.checkDeployStatusResponse.result.stateDetail else None,
-
-      'status': soup.Body.checkDeployStatusResponse.result.status.text,
-    }
+    # Make the request and parse response to check deploying status
+    deployResult = self.__call(deploy_status_soap_body, lambda response: soap_decoder.decodeDeployStatus(response.content), url=self.metadataUrl, headers=deploy_status_soap_request_headers)
 
-    if result is None:
-      raise Exception(f'Result node could not be found: {response.text}')
-    elif result.text == 'true':
-      self.retrieveResult = response.text
-      return (True, deployResult)
-    else:
-      return (False, deployResult)
\ No newline at end of file
+    return (deployResult.done, deployResult)
@@ -0,0 +1,140 @@
+""" Orgs authorized with the SFDX CLI: aliases and OAuth tokens read from its local auth store, without running the CLI """
+
+import json
+import os
+import subprocess
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlencode
+
+from .exceptions import SfdxAuthError, SalesforceAuthenticationFailed
+
+# Client id of the connected app used by "sfdx auth:web:login"
+DEFAULT_CLIENT_ID = 'PlatformCLI'
+
+# Service and account of the SFDX encryption key in the OS keychain
+KEYCHAIN_SERVICE = 'sfdx'
+KEYCHAIN_ACCOUNT = 'local'
+
+@dataclass
+class SfdxAuth:
+  username: str
+  instanceUrl: str
+  accessToken: str
+  loginUrl: str
+  clientId: str = DEFAULT_CLIENT_ID
+  refreshToken: Optional[str] = None
+  orgId: Optional[str] = None
+
+def sfdxFolder():
+  return os.environ.get('SFDX_DIR') or os.path.join(os.path.expanduser('~'), '.sfdx')
+
+def readJson(path):
+  try:
+    with open(path) as f:
+      return json.load(f)
+  except (OSError, ValueError):
+    return None
+
+def resolveUsername(orgAlias, folder=None):
+  """
+  The username of an alias set with "sfdx alias:set" (or given to "sfdx auth:*:login -a"), usernames are returned as they are.
+  """
+  aliases = readJson(os.path.join(folder or sfdxFolder(), 'alias.json')) or {}
+  return aliases.get('orgs', {}).get(orgAlias, orgAlias)
+
+def encryptionKey(folder=None):
+  """
+  The key the SFDX CLI encrypts the tokens with: from the generic keychain file when it is used (e.g. on Linux servers and containers),
+  otherwise from the keychain of the OS.
+  """
+  keyFile = readJson(os.path.join(folder or sfdxFolder(), 'key.json'))
+  if keyFile and keyFile.get('key'):
+    return keyFile['key']
+
+  commands = [
+    ['security', 'find-generic-password', '-a', KEYCHAIN_ACCOUNT, '-s', KEYCHAIN_SERVICE, '-w'],
+    ['secret-tool', 'lookup', 'user', KEYCHAIN_ACCOUNT, 'domain', KEYCHAIN_SERVICE],
+  ]
+  for command in commands:
+    try:
+      result = subprocess.run(command, capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+      continue
+    if result.returncode == 0 and result.stdout.strip():
+      return result.stdout.strip()
+
+  raise SfdxAuthError('The SFDX encryption key cannot be found in ~/.sfdx/key.json nor in the keychain')
+
+def decrypt(value, key):
+  """
+  Decrypt a token of the auth store, "<iv><ciphertext>:<tag>" in hex, encrypted with AES-256-GCM.
+  Older CLIs use the 32 characters of the key and the 12 characters of the iv as they are, newer ones decode them from hex.
+  """
+  try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.exceptions import InvalidTag
+  except ImportError:
+    raise SfdxAuthError('Reading the SFDX tokens needs cryptography, install it with: pip install "Python-SFDX-Toolkit[sfdx]"')
+
+  if ':' not in value:
+    # Not encrypted (e.g. an access token stored by another tool)
+    return value
+
+  data, _, tag = value.partition(':')
+  if len(key) == 64:
+    keyBytes, iv, ciphertext = bytes.fromhex(key), bytes.fromhex(data[:24]), data[24:]
+  else:
+    keyBytes, iv, ciphertext = key.encode(), data[:12].encode(), data[12:]
+
+  try:
+    return AESGCM(keyBytes).decrypt(iv, bytes.fromhex(ciphertext) + bytes.fromhex(tag), None).decode()
+  except (InvalidTag, ValueError):
+    raise SfdxAuthError('The SFDX tokens cannot be decrypted with the SFDX encryption key')
+
+def readAuth(orgAlias, folder=None):
+  """
+  The SfdxAuth of an org alias or username authorized with the SFDX CLI, with its tokens decrypted.
+  """
+  folder = folder or sfdxFolder()
+  username = resolveUsername(orgAlias, folder)
+
+  authFile = readJson(os.path.join(folder, f'{username}.json'))
+  if not authFile or not authFile.get('accessToken') or not authFile.get('instanceUrl'):
+    raise SfdxAuthError(f'No SFDX authorization found for {orgAlias}')
+
+  key = None
+  tokens = {}
+  for name in ('accessToken', 'refreshToken'):
+    if authFile.get(name):
+      if ':' in authFile[name] and key is None:
+        key = encryptionKey(folder)
+      tokens[name] = decrypt(authFile[name], key)
+
+  return SfdxAuth(
+    username=authFile.get('username', username),
+    instanceUrl=authFile['instanceUrl'].rstrip('/'),
+    accessToken=tokens['accessToken'],
+    loginUrl=(authFile.get('loginUrl') or 'https://login.salesforce.com').rstrip('/'),
+    clientId=authFile.get('clientId') or DEFAULT_CLIENT_ID,
+    refreshToken=tokens.get('refreshToken'),
+    orgId=authFile.get('orgId'),
+  )
+
+def refreshAccessToken(auth, transport):
+  """
+  Get a new access token with the refresh token of the org, returning the (access token, instance URL).
+  """
+  if not auth.refreshToken:
+    raise SalesforceAuthenticationFailed('INVALID_SESSION_ID', f'The access token of {auth.username} expired, authorize the org again with the SFDX CLI')
+
+  body = urlencode({'grant_type': 'refresh_token', 'client_id': auth.clientId, 'refresh_token': auth.refreshToken})
+  with transport.post(url=f'{auth.loginUrl}/services/oauth2/token', data=body, headers={'content-type': 'application/x-www-form-urlencoded'}) as response:
+    result = response.json()
+
+  if 'access_token' not in result:
+    raise SalesforceAuthenticationFailed(result.get('error', 'REFRESH_FAILED'), result.get('error_description', response.text))
+
+  auth.accessToken = result['access_token']
+  auth.instanceUrl = result.get('instance_url', auth.instanceUrl).rstrip('/')
+  return auth.accessToken, auth.instanceUrl
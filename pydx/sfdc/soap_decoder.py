@@ -0,0 +1,222 @@
+""" Single-pass decoders for Salesforce SOAP responses """
+
+from dataclasses import dataclass, field
+from typing import Optional
+
+from lxml import etree
+
+from .exceptions import SalesforceAuthenticationFailed, SalesforceSoapFault
+
+@dataclass
+class LoginResult:
+  sessionId: str
+  serverUrl: str
+  metadataUrl: str
+  sessionSecondsValid: Optional[int] = None
+
+@dataclass
+class AsyncResult:
+  id: str
+  done: bool = False
+  state: Optional[str] = None
+
+@dataclass
+class RetrieveResult:
+  done: bool
+  status: Optional[str] = None
+  errorStatusCode: Optional[str] = None
+  errorMessage: Optional[str] = None
+
+@dataclass
+class DeployResult:
+  done: bool
+  status: str
+  stateDetail: Optional[str] = None
+  numberComponentsDeployed: int = 0
+  numberComponentErrors: int = 0
+  numberComponentsTotal: int = 0
+  numberTestsCompleted: int = 0
+  numberTestErrors: int = 0
+  numberTestsTotal: int = 0
+  componentFailures: list = field(default_factory=list)
+  testFailures: list = field(default_factory=list)
+
+  @property
+  def componentsDone(self):
+    return self.numberComponentsDeployed + self.numberComponentErrors
+
+  @property
+  def testsDone(self):
+    return self.numberTestsCompleted + self.numberTestErrors
+
+class ResultTarget:
+  """
+  lxml parser target collecting, in a single pass and without building any tree,
+  the text of the requested nodes below the <result> node of a response.
+  Repeated nodes (e.g. deploy failures) are collected as records, everything else is skipped.
+  """
+
+  FAULT_FIELDS = ('faultcode', 'faultstring', 'exceptionCode', 'exceptionMessage')
+
+  def __init__(self, fields=(), records=None):
+    self.fields = set(fields)
+    self.records = records or {}
+    self.values = {}
+    self.recordValues = {path: [] for path in self.records}
+    self.fault = {}
+
+    self.stack = []
+    self.resultDepth = None
+    self.resultClosed = False
+    self.record = None
+    self.text = None
+
+  def path(self):
+    return '/'.join(self.stack[self.resultDepth + 1:])
+
+  def start(self, tag, attrib):
+    name = tag.rpartition('}')[2]
+    self.stack.append(name)
+
+    if self.resultClosed:
+      return
+
+    if self.resultDepth is None:
+      if name == 'result':
+        self.resultDepth = len(self.stack) - 1
+        # Results which are a plain value (e.g. the id returned by deployRecentValidation)
+        if '' in self.fields:
+          self.text = []
+      elif name in self.FAULT_FIELDS:
+        self.text = []
+      return
+
+    path = self.path()
+    if path in self.records:
+      self.record = (path, {})
+    elif path in self.fields or (self.record and path.rpartition('/')[0] == self.record[0] and name in self.records[self.record[0]]):
+      self.text = []
+
+  def data(self, data):
+    if self.text is not None:
+      self.text.append(data)
+
+  def end(self, tag):
+    name = self.stack[-1]
+
+    if self.text is not None:
+      text = ''.join(self.text)
+      self.text = None
+      if self.resultDepth is None:
+        self.fault[name] = text
+      elif self.record:
+        self.record[1][name] = text
+      else:
+        self.values[self.path()] = text
+    elif self.record and self.path() == self.record[0]:
+      self.recordValues[self.record[0]].append(self.record[1])
+      self.record = None
+    elif self.resultDepth == len(self.stack) - 1:
+      self.resultClosed = True
+
+    self.stack.pop()
+
+  def close(self):
+    return self
+
+def parse(content, fields=(), records=None):
+  """
+  Parse a SOAP response, raising its fault as an exception if there is one.
+  """
+  if isinstance(content, str):
+    content = content.encode()
+
+  target = ResultTarget(fields, records)
+  parser = etree.XMLParser(target=target, huge_tree=True, resolve_entities=False)
+  try:
+    etree.fromstring(content, parser)
+  except etree.XMLSyntaxError as e:
+    raise SalesforceSoapFault('INVALID_RESPONSE', f'{e}: {content[:500]}')
+
+  if target.fault:
+    raise SalesforceSoapFault(
+      target.fault.get('exceptionCode') or target.fault.get('faultcode', '').rpartition(':')[2],
+      target.fault.get('exceptionMessage') or target.fault.get('faultstring')
+    )
+
+  if target.resultDepth is None:
+    raise SalesforceSoapFault('INVALID_RESPONSE', f'Result node could not be found: {content[:500]}')
+
+  return target
+
+def decodeLogin(content):
+  """
+  Decode the response of a partner API login.
+  """
+  try:
+    target = parse(content, fields=('sessionId', 'serverUrl', 'userInfo/sessionSecondsValid'))
+  except SalesforceSoapFault as e:
+    raise SalesforceAuthenticationFailed(e.code, e.message)
+
+  values = target.values
+  sessionSecondsValid = values.get('userInfo/sessionSecondsValid')
+
+  return LoginResult(
+    sessionId=values['sessionId'],
+    serverUrl=values['serverUrl'],
+    metadataUrl=values['serverUrl'].replace('/u/', '/m/'),
+    sessionSecondsValid=int(sessionSecondsValid) if sessionSecondsValid else None
+  )
+
+def decodeAsyncResult(content):
+  """
+  Decode the response of a retrieve or deploy request.
+  """
+  values = parse(content, fields=('id', 'done', 'state')).values
+
+  return AsyncResult(id=values['id'], done=values.get('done') == 'true', state=values.get('state'))
+
+def decodeDeployRecentValidation(content):
+  """
+  Decode the response of a deployRecentValidation request, returning the id of the new deploy.
+  """
+  return parse(content, fields=('',)).values['']
+
+def decodeRetrieveStatus(content):
+  """
+  Decode the response of a checkRetrieveStatus request, skipping the ZIP file and the file properties.
+  """
+  values = parse(content, fields=('done', 'status', 'errorStatusCode', 'errorMessage')).values
+
+  return RetrieveResult(
+    done=values.get('done') == 'true',
+    status=values.get('status'),
+    errorStatusCode=values.get('errorStatusCode'),
+    errorMessage=values.get('errorMessage')
+  )
+
+def decodeDeployStatus(content):
+  """
+  Decode the response of a checkDeployStatus request.
+  Only failures are read from the details: successes, which are most of a large response, are skipped.
+  """
+  counters = ('numberComponentsDeployed', 'numberComponentErrors', 'numberComponentsTotal', 'numberTestsCompleted', 'numberTestErrors', 'numberTestsTotal')
+
+  target = parse(
+    content,
+    fields=('done', 'status', 'stateDetail') + counters,
+    records={
+      'details/componentFailures': ('componentType', 'fullName', 'fileName', 'problemType', 'problem', 'lineNumber'),
+      'details/runTestResult/failures': ('name', 'methodName', 'message', 'stackTrace')
+    }
+  )
+  values = target.values
+
+  return DeployResult(
+    done=values.get('done') == 'true',
+    status=values.get('status'),
+    stateDetail=values.get('stateDetail') or None,
+    componentFailures=target.recordValues['details/componentFailures'],
+    testFailures=target.recordValues['details/runTestResult/failures'],
+    **{counter: int(values.get(counter) or 0) for counter in counters}
+  )
@@ -46,6 +46,22 @@ DEPLOY_MSG = \
    </soapenv:Body>
 </soapenv:Envelope>"""
 
+DEPLOY_RECENT_VALIDATION_MSG = \
+    """<soapenv:Envelope
+xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"
+xmlns:met="http://soap.sforce.com/2006/04/metadata">
+   <soapenv:Header>
+      <met:SessionHeader>
+         <met:sessionId>{sessionId}</met:sessionId>
+      </met:SessionHeader>
+   </soapenv:Header>
+   <soapenv:Body>
+      <met:deployRecentValidation>
+         <met:validationId>{validationId}</met:validationId>
+      </met:deployRecentValidation>
+   </soapenv:Body>
+</soapenv:Envelope>"""
+
 CHECK_DEPLOY_STATUS_MSG = \
     """<soapenv:Envelope
 xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"
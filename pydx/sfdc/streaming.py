@@ -0,0 +1,104 @@
+""" Streaming helpers to move base64 ZIP payloads in and out of SOAP messages """
+
+import binascii
+import tempfile
+import xml.sax
+
+# Size of the chunks read from the HTTP response body
+CHUNK_SIZE = 1024 * 1024
+
+class ZipFileHandler(xml.sax.handler.ContentHandler):
+  """
+  SAX handler which base64-decodes the content of the <zipFile> node
+  straight into a file object, a few characters at a time.
+  """
+
+  def __init__(self, fileObj):
+    super().__init__()
+    self.fileObj = fileObj
+    self.found = False
+    self.inZipFile = False
+    self.pending = ''
+
+  def startElement(self, name, attrs):
+    if name.rpartition(':')[2] == 'zipFile':
+      self.found = True
+      self.inZipFile = True
+
+  def endElement(self, name):
+    if self.inZipFile and name.rpartition(':')[2] == 'zipFile':
+      self.inZipFile = False
+      self.flush(final=True)
+
+  def characters(self, content):
+    if self.inZipFile:
+      self.pending += ''.join(content.split())
+      self.flush()
+
+  def flush(self, final=False):
+    # base64 can only be decoded in groups of 4 characters
+    size = len(self.pending) if final else len(self.pending) - len(self.pending) % 4
+    if size:
+      self.fileObj.write(binascii.a2b_base64(self.pending[:size]))
+      self.pending = self.pending[size:]
+
+class ZipFileDecoder:
+  """
+  Incremental parser of a checkRetrieveStatus response, fed with byte chunks,
+  which writes the decoded ZIP into a file object.
+  If no file object is given, a temporary file is created.
+  """
+
+  def __init__(self, fileObj=None):
+    self.fileObj = fileObj if fileObj is not None else tempfile.TemporaryFile()
+    self.handler = ZipFileHandler(self.fileObj)
+    self.parser = xml.sax.make_parser()
+    self.parser.setContentHandler(self.handler)
+
+  def feed(self, chunk):
+    if chunk:
+      self.parser.feed(chunk)
+
+  def close(self):
+    """
+    Returns the file object rewound, ready to be opened by ZipFile,
+    or None if the response did not contain any ZIP file.
+    """
+    self.parser.close()
+
+    if not self.handler.found:
+      self.fileObj.close()
+      return None
+
+    self.fileObj.seek(0)
+    return self.fileObj
+
+def decodeZipFile(chunks, fileObj=None):
+  """
+  Incrementally parse a checkRetrieveStatus response, given as an iterable
+  of byte chunks, and write the decoded ZIP into a file object (see ZipFileDecoder).
+  """
+  decoder = ZipFileDecoder(fileObj)
+
+  for chunk in chunks:
+    decoder.feed(chunk)
+
+  return decoder.close()
+
+def encodeZipFile(chunks):
+  """
+  Base64-encode a ZIP file, given as an iterable of byte chunks,
+  yielding the encoded chunks as soon as they are available.
+  """
+  pending = b''
+
+  for chunk in chunks:
+    pending += chunk
+    # base64 can only be encoded in groups of 3 bytes
+    size = len(pending) - len(pending) % 3
+    if size:
+      yield binascii.b2a_base64(pending[:size], newline=False)
+      pending = pending[size:]
+
+  if pending:
+    yield binascii.b2a_base64(pending, newline=False)
@@ -0,0 +1,87 @@
+""" Pooled HTTP transport used to talk with Salesforce """
+
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Status codes of transient errors (500 is not here since SOAP faults use it)
+RETRY_STATUS = (502, 503, 504)
+
+# Status codes for which a request is known not to be processed by the server
+NOT_PROCESSED_STATUS = (503,)
+
+class Transport:
+  """
+  Keep-alive HTTP transport with connection pooling, timeouts and
+  retries with jittered exponential backoff.
+  The same transport can be shared by several Sfdc instances to share the pool.
+  """
+
+  _default = None
+
+  def __init__(self, timeout=(10, 300), retries=3, backoff=0.5, maxBackoff=30, poolSize=10):
+    """
+    timeout: seconds to wait for the connection and for the response, as accepted by requests.
+    retries: how many times a failed request is retried.
+    backoff: base delay of the exponential backoff.
+    maxBackoff: maximum delay between two attempts.
+    poolSize: number of connections kept alive for each host.
+    """
+    self.timeout = timeout
+    self.retries = retries
+    self.backoff = backoff
+    self.maxBackoff = maxBackoff
+
+    adapter = HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize)
+    self.session = requests.Session()
+    self.session.mount('https://', adapter)
+    self.session.mount('http://', adapter)
+
+  @classmethod
+  def default(cls):
+    """
+    Returns the transport shared by all the Sfdc instances created without one.
+    """
+    if cls._default is None:
+      cls._default = cls()
+    return cls._default
+
+  def post(self, url, data, headers, stream=False, idempotent=True):
+    """
+    Make a POST request, retrying it on connection errors and transient server errors.
+    data can be a callable returning the body, so that a streamed body can be built again for each attempt;
+    any other iterator is sent only once.
+    Non idempotent requests are retried only when the server surely did not process them.
+    """
+    replayable = callable(data) or isinstance(data, (str, bytes))
+    attempt = 0
+
+    while True:
+      canRetry = replayable and attempt < self.retries
+
+      try:
+        response = self.session.post(url=url, data=data() if callable(data) else data, headers=headers, timeout=self.timeout, stream=stream)
+      except requests.ConnectTimeout:
+        if not canRetry:
+          raise
+      except (requests.ConnectionError, requests.Timeout):
+        if not canRetry or not idempotent:
+          raise
+      else:
+        if not canRetry or response.status_code not in (RETRY_STATUS if idempotent else NOT_PROCESSED_STATUS):
+          return response
+        response.close()
+
+      time.sleep(self.delay(attempt))
+      attempt += 1
+
+  def delay(self, attempt):
+    """
+    Seconds to wait before the next attempt (exponential backoff with full jitter).
+    """
+    return random.uniform(0, min(self.maxBackoff, self.backoff * 2 ** attempt))
+
+  def close(self):
+    self.session.close()
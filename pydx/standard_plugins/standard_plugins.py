@@ -1,31 +1,45 @@
+from ..engine.xml_editor import engine, NAMESPACES
+from ..engine.xml_filter import dropElements
+
+PERMISSIONS_TO_REMOVE = ["ManageSandboxes","ManageTranslation", "EditBillingInfo", "RemoveDirectMessageMembers", "ConsentApiUpdate", "Packaging2PromoteVersion", "ViewFlowUsageAndFlowEventData", "ViewUserPII", "TraceXdsQueries", "AIViewInsightObjects"]
+
+LIST_VIEWS_TO_REMOVE = ['CompletedTasks', 'DelegatedTasks', 'RecurringTasks', 'UnscheduledTasks', 'OpenTasks', 'OverdueTasks', 'TodaysTasks', 'MyRecentEvents', 'MyTeamsRecentEvents', 'MyTeamsUpcomingEvents', 'MyUpcomingEvents', 'TodaysAgenda']
+
+# Helper.editXML gives these plugins an lxml root or streams the files through their filters,
+# the xmltodict bodies are used when they are called directly with a parsed document
+
+def asList(value):
+  """xmltodict gives a single element as a dictionary and repeated ones as a list"""
+  if value is None:
+    return []
+  return value if isinstance(value, list) else [value]
+
+@engine('lxml')
 def enableClassAccessLevel(fileName, data):
   """Enable all classes to users' profiles"""
-  if 'classAccesses' in data['Profile']:
-    for classAccess in data['Profile']['classAccesses']:
+  if isinstance(data, dict):
+    for classAccess in asList(data['Profile'].get('classAccesses')):
       classAccess['enabled'] = 'true'
+    return
 
+  for enabled in data.iterfind('sf:classAccesses/sf:enabled', NAMESPACES):
+    enabled.text = 'true'
+
+@dropElements('userPermissions', 'name', PERMISSIONS_TO_REMOVE)
 def deleteProfilePermissions(fileName, data):
   """Remove permissions which usually break the deployment"""
-  permissionsToRemove = ["ManageSandboxes","ManageTranslation", "EditBillingInfo", "RemoveDirectMessageMembers", "ConsentApiUpdate", "Packaging2PromoteVersion", "ViewFlowUsageAndFlowEventData", "ViewUserPII", "TraceXdsQueries", "AIViewInsightObjects"]
-
   if 'userPermissions' in data['Profile']:
-    for userPermission in data['Profile']['userPermissions']:
-      if userPermission['name'] in permissionsToRemove:
-        data['Profile']['userPermissions'].remove(userPermission)
+    data['Profile']['userPermissions'] = [userPermission for userPermission in asList(data['Profile']['userPermissions']) if userPermission['name'] not in PERMISSIONS_TO_REMOVE]
 
+@dropElements('oauthConfig/consumerKey')
 def removeOAuthConfig(fileName, data):
   """Remove OAuth consumer key from connected apps (it is regenerated automatically in each Salesforce org)"""
-  if 'consumerKey' in data['ConnectedApp']['oauthConfig']:
-    del data['ConnectedApp']['oauthConfig']['consumerKey']
+  oauthConfig = data['ConnectedApp'].get('oauthConfig')
+  if oauthConfig and 'consumerKey' in oauthConfig:
+    del oauthConfig['consumerKey']
 
+@dropElements('listViews', 'fullName', LIST_VIEWS_TO_REMOVE)
 def removeUselessListViews(fileName, data):
   """Remove Tasks and Events List Views that, I don't know why, Salesforce duplicates everytime it deploys"""
-  listViewToRemove = ['CompletedTasks', 'DelegatedTasks', 'RecurringTasks', 'UnscheduledTasks', 'OpenTasks', 'OverdueTasks', 'TodaysTasks', 'MyRecentEvents', 'MyTeamsRecentEvents', 'MyTeamsUpcomingEvents', 'MyUpcomingEvents', 'TodaysAgenda']
-
   if 'listViews' in data['CustomObject']:
-    listViewsToMaintain = []
-    for listView in data['CustomObject']['listViews']:
-      if listView['fullName'] not in listViewToRemove:
-        listViewsToMaintain.append(listView)
-
-    data['CustomObject']['listViews'] = listViewsToMaintain
\ No newline at end of file
+    data['CustomObject']['listViews'] = [listView for listView in asList(data['CustomObject']['listViews']) if listView['fullName'] not in LIST_VIEWS_TO_REMOVE]
@@ -0,0 +1,135 @@
+""" Test selection: index of the Apex classes and triggers of a folder, finding the test classes which exercise changed components """
+
+import hashlib
+import json
+import os
+import re
+
+# Comments, string literals (skipped) and identifiers of Apex sources
+TOKENS = re.compile(r"//[^\n]*|/\*.*?\*/|'(?:\\.|[^'\\\n])*'|(@?[A-Za-z_][A-Za-z0-9_]*)", re.S)
+TRIGGER = re.compile(r'trigger\s+\w+\s+on\s+(\w+)', re.I)
+
+# Folder and extension of the indexed sources
+SOURCES = {'classes': '.cls', 'triggers': '.trigger'}
+
+def parseApex(text):
+  """
+  Returns whether an Apex source is a test class, the object of a trigger (None for a class)
+  and the identifiers it references (lowercase, since Apex is case insensitive).
+  """
+  tokens = [token for token in TOKENS.findall(text) if token]
+  identifiers = {token.lower() for token in tokens}
+  isTest = '@istest' in identifiers or 'testmethod' in identifiers
+  trigger = TRIGGER.match(' '.join(tokens))
+
+  return isTest, trigger.group(1).lower() if trigger else None, sorted(identifier for identifier in identifiers if not identifier.startswith('@'))
+
+def apexName(relPath):
+  """
+  Name of the class or trigger of a source (or of its -meta.xml), None for other files.
+  """
+  directory, _, fileName = relPath.replace(os.sep, '/').rpartition('/')
+  fileName = fileName[:-len('-meta.xml')] if fileName.endswith('-meta.xml') else fileName
+  extension = SOURCES.get(directory)
+  if extension and fileName.endswith(extension):
+    return fileName[:-len(extension)]
+  return None
+
+class TestIndex:
+  """
+  Apex classes and triggers of a folder, with the identifiers they reference.
+  Sources are only parsed again when their size or modification time changes.
+  """
+
+  def __init__(self, indexFile):
+    self.indexFile = indexFile
+    self.sources = {}
+
+    if os.path.exists(indexFile):
+      with open(indexFile) as f:
+        self.sources = json.load(f)
+
+  @staticmethod
+  def location(settingFile, folder):
+    """
+    Path of the index of a folder, inside the ".pydx" folder next to the settings file.
+    """
+    key = hashlib.sha256(os.path.abspath(folder).encode()).hexdigest()[:16]
+    return os.path.join(os.path.dirname(os.path.abspath(settingFile)), '.pydx', 'apex-tests', f'{key}.json')
+
+  def update(self, folder):
+    """
+    Index the new and changed sources of the folder and forget the deleted ones, returning how many were parsed.
+    """
+    found = {}
+    for directory, extension in SOURCES.items():
+      if not os.path.isdir(os.path.join(folder, directory)):
+        continue
+      for entry in os.scandir(os.path.join(folder, directory)):
+        if entry.name.endswith(extension) and entry.is_file():
+          found[f'{directory}/{entry.name}'] = entry.stat()
+
+    parsed = 0
+    for relPath, stat in found.items():
+      source = self.sources.get(relPath)
+      if source and source['size'] == stat.st_size and source['mtime'] == stat.st_mtime_ns:
+        continue
+
+      with open(os.path.join(folder, relPath), encoding='utf-8', errors='replace') as f:
+        isTest, sObject, references = parseApex(f.read())
+      self.sources[relPath] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'isTest': isTest, 'sObject': sObject, 'references': references}
+      parsed += 1
+
+    for relPath in set(self.sources) - set(found):
+      del self.sources[relPath]
+
+    return parsed
+
+  def save(self):
+    os.makedirs(os.path.dirname(self.indexFile), exist_ok=True)
+    tmpFile = f'{self.indexFile}.tmp'
+    with open(tmpFile, 'w') as f:
+      json.dump(self.sources, f)
+    os.replace(tmpFile, self.indexFile)
+
+  def dependents(self):
+    """
+    Returns {name: names of the classes and triggers referencing it} and {name: (name, is test)}, with lowercase keys.
+    A test referencing an object also depends on the triggers of that object.
+    """
+    names = {}
+    triggers = {}
+    for relPath, source in self.sources.items():
+      name = apexName(relPath)
+      names[name.lower()] = (name, source['isTest'])
+      if source['sObject']:
+        triggers.setdefault(source['sObject'], []).append(name.lower())
+
+    dependents = {}
+    for relPath, source in self.sources.items():
+      name = apexName(relPath).lower()
+      for reference in source['references']:
+        if reference != name and reference in names:
+          dependents.setdefault(reference, set()).add(name)
+        if source['isTest']:
+          for trigger in triggers.get(reference, ()):
+            dependents.setdefault(trigger, set()).add(name)
+
+    return dependents, names
+
+  def testsFor(self, changedFiles):
+    """
+    Returns the names of the test classes which reference, directly or through other classes,
+    a class or trigger among the changed files (including the changed test classes).
+    """
+    dependents, names = self.dependents()
+
+    pending = [name.lower() for name in map(apexName, changedFiles) if name and name.lower() in names]
+    seen = set(pending)
+    while pending:
+      for dependent in dependents.get(pending.pop(), ()):
+        if dependent not in seen:
+          seen.add(dependent)
+          pending.append(dependent)
+
+    return sorted(names[name][0] for name in seen if names[name][1])
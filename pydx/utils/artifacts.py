@@ -0,0 +1,145 @@
+""" Deploy artifacts: content hash of a deploy, cache of the encoded ZIP files and validations which can be quick deployed """
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+# Days a successful validation can be quick deployed by Salesforce
+VALIDATION_DAYS = 10
+# Encoded ZIP files kept in the artifact cache
+ARTIFACTS_KEPT = 3
+# Size of the chunks read from a cached artifact
+CHUNK_SIZE = 1024 * 1024
+
+def treeHash(hashes, extraFiles=None):
+  """
+  Content hash of a deploy, from the {relative path: file hash} of its files and the {name: content} of the generated ones
+  (e.g. the package.xml of a delta deploy). Unlike the ZIP file, it does not depend on the modification times of the files.
+  """
+  entries = dict(hashes)
+  for name, content in (extraFiles or {}).items():
+    entries[name] = hashlib.sha256(content.encode()).hexdigest()
+
+  digest = hashlib.sha256()
+  for path in sorted(entries):
+    digest.update(f'{path}\0{entries[path]}\n'.encode())
+  return digest.hexdigest()
+
+def pydxFolder(settingFile):
+  """
+  The ".pydx" folder next to the settings file, where pydx keeps its state.
+  """
+  return os.path.join(os.path.dirname(os.path.abspath(settingFile)), '.pydx')
+
+class ArtifactCache:
+  """
+  Encoded (base64) ZIP files of the last deploys, by tree hash and compression level,
+  so that an unchanged tree is neither zipped nor encoded again.
+  """
+
+  def __init__(self, cacheDir, kept=ARTIFACTS_KEPT):
+    self.cacheDir = cacheDir
+    self.kept = kept
+
+  def path(self, treeHash, compressLevel):
+    return os.path.join(self.cacheDir, f'{treeHash}-{compressLevel}.b64')
+
+  def get(self, treeHash, compressLevel):
+    """
+    Returns a callable yielding the chunks of the cached artifact (so the upload can be retried), or None if it is not cached.
+    """
+    path = self.path(treeHash, compressLevel)
+    if not os.path.exists(path):
+      return None
+
+    # The most recently used artifacts are kept
+    os.utime(path)
+
+    def chunks():
+      with open(path, 'rb') as f:
+        yield from iter(lambda: f.read(CHUNK_SIZE), b'')
+
+    return chunks
+
+  def store(self, treeHash, compressLevel, chunks):
+    """
+    Yield the encoded chunks while writing them to the cache. The artifact is only added once all of them have been consumed,
+    so an interrupted upload does not leave a truncated one.
+    """
+    os.makedirs(self.cacheDir, exist_ok=True)
+    fd, tmpFile = tempfile.mkstemp(dir=self.cacheDir, suffix='.tmp')
+
+    try:
+      with os.fdopen(fd, 'wb') as f:
+        for chunk in chunks:
+          f.write(chunk)
+          yield chunk
+      os.replace(tmpFile, self.path(treeHash, compressLevel))
+    finally:
+      if os.path.exists(tmpFile):
+        os.remove(tmpFile)
+
+    self.prune()
+
+  def prune(self):
+    artifacts = sorted(
+      (os.path.join(self.cacheDir, name) for name in os.listdir(self.cacheDir) if name.endswith('.b64')),
+      key=os.path.getmtime, reverse=True
+    )
+    for path in artifacts[self.kept:]:
+      os.remove(path)
+
+class Validations:
+  """
+  Successful validations of the trees deployed to an org, by tree hash, with their tests.
+  A deploy of the same tree, with the same tests, can use them for a quick deploy.
+  """
+
+  def __init__(self, recordFile):
+    self.recordFile = recordFile
+    self.validations = {}
+
+    if os.path.exists(recordFile):
+      with open(recordFile) as f:
+        self.validations = json.load(f)
+
+  @staticmethod
+  def location(settingFile, username, url):
+    key = hashlib.sha256(f'{username}|{url}'.encode()).hexdigest()[:16]
+    return os.path.join(pydxFolder(settingFile), 'validations', f'{key}.json')
+
+  @staticmethod
+  def tests(testLevel, runTests):
+    return {'testLevel': testLevel, 'runTests': sorted([runTests] if isinstance(runTests, str) else runTests or [])}
+
+  def find(self, treeHash, testLevel, runTests):
+    """
+    Returns the id of a validation of the tree which can still be quick deployed, or None.
+    """
+    validation = self.validations.get(treeHash)
+    if validation is None or validation['tests'] != self.tests(testLevel, runTests):
+      return None
+    if time.time() - validation['validatedAt'] > VALIDATION_DAYS * 24 * 3600:
+      return None
+    return validation['id']
+
+  def add(self, treeHash, validationId, testLevel, runTests):
+    self.validations[treeHash] = {'id': validationId, 'validatedAt': time.time(), 'tests': self.tests(testLevel, runTests)}
+
+  def drop(self, treeHash):
+    self.validations.pop(treeHash, None)
+
+  def clear(self):
+    self.validations = {}
+
+  def save(self):
+    # Expired validations are dropped
+    self.validations = {key: value for key, value in self.validations.items() if time.time() - value['validatedAt'] <= VALIDATION_DAYS * 24 * 3600}
+
+    os.makedirs(os.path.dirname(self.recordFile), exist_ok=True)
+    tmpFile = f'{self.recordFile}.tmp'
+    with open(tmpFile, 'w') as f:
+      json.dump(self.validations, f, indent=2)
+    os.replace(tmpFile, self.recordFile)
@@ -0,0 +1,166 @@
+""" Retrieve a large package as many smaller retrieve jobs running concurrently """
+
+import os
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from zipfile import ZipFile
+
+from .extract import ExtractStats, extractZip
+from .metadata import MERGED_TYPES, componentForFile
+from .polling import Poller
+from . import tracing
+
+# Child elements naming the component an entry of a profile (permission set, translation) refers to, by priority
+ENTRY_KEYS = ('apexClass', 'apexPage', 'application', 'externalDataSource', 'field', 'flow', 'layout', 'object', 'recordType', 'tab', 'name', 'startAddress')
+
+@dataclass
+class ChunkResult:
+  index: int
+  attempts: int = 0
+  apiCalls: int = 0
+  stats: ExtractStats = field(default_factory=ExtractStats)
+  errors: list = field(default_factory=list)
+  # {relative path: content} of the files of MERGED_TYPES, which only hold the entries of the components of the chunk
+  mergedFiles: dict = field(default_factory=dict)
+
+  @property
+  def succeeded(self):
+    return len(self.errors) < self.attempts
+
+def retrieveChunk(connection, package, outputPath):
+  """
+  Run a whole retrieve job on its own connection: submit, poll, download and extract.
+  The package.xml of the chunk is not extracted, since it only lists a part of the package,
+  nor are the files of MERGED_TYPES, which are returned to be merged with the ones of the other chunks.
+  Returns the ExtractStats of the chunk and the {relative path: content} of those files.
+  """
+  connection.retrieve(package=package)
+
+  poller = Poller(initial=2)
+  while not connection.isRetrievingMetadata():
+    poller.wait()
+
+  zipFile = connection.getZipFile()
+  with ZipFile(zipFile) as archive:
+    mergedFiles = {
+      info.filename: archive.read(info) for info in archive.infolist()
+      if not info.is_dir() and (componentForFile(info.filename) or ('',))[0] in MERGED_TYPES
+    }
+  zipFile.seek(0)
+
+  return extractZip(zipFile, outputPath, exclude=('package.xml',) + tuple(mergedFiles)), mergedFiles
+
+def retrieveChunks(connection, packages, outputPath, concurrency=4, retries=2, onProgress=None):
+  """
+  Retrieve the given packages ("<types>" texts) with at most "concurrency" jobs at the same time,
+  all sharing the session and the connection pool of a logged in connection.
+  A failed chunk is retried on its own, up to "retries" more times.
+  onProgress(completed, total) is called every time a chunk completes.
+  Returns a ChunkResult for each package, in the packages order.
+  """
+  results = [ChunkResult(index) for index in range(len(packages))]
+
+  def run(index):
+    result = results[index]
+    chunkConnection = connection.clone()
+
+    with tracing.span('retrieve.chunk', index=index) as span:
+      while result.attempts <= retries:
+        result.attempts += 1
+        try:
+          result.stats, result.mergedFiles = retrieveChunk(chunkConnection, packages[index], outputPath)
+          break
+        except Exception as e:
+          result.errors.append(str(e))
+          if result.attempts <= retries:
+            time.sleep(chunkConnection.transport.delay(result.attempts - 1))
+
+      result.apiCalls = chunkConnection.apiCalls
+      span.update(attempts=result.attempts, files=result.stats.files)
+
+    return result
+
+  with ThreadPoolExecutor(max_workers=concurrency) as executor:
+    futures = [executor.submit(run, index) for index in range(len(packages))]
+    for completed, future in enumerate(as_completed(futures), start=1):
+      future.result()
+      if onProgress:
+        onProgress(completed, len(packages))
+
+  return results
+
+def mergeEntries(contents):
+  """
+  Merge the versions of a profile (permission set, translation) retrieved by each chunk, each one holding only the entries
+  of the components of its chunk: the entries are deduplicated and sorted like Salesforce does, by element name
+  and then by the component they refer to. Returns the merged file.
+  """
+  from lxml import etree
+  from ..engine import xml_editor
+
+  root = None
+  # The same entry is in many chunks, it is kept as many times as in the chunk which has it most
+  entries = {}
+  for content in contents:
+    document = xml_editor.parse(content.decode('utf-8'))
+    root = document if root is None else root
+    counts = {}
+    for element in document.iterchildren(etree.Element):
+      key = etree.tostring(element, with_tail=False)
+      counts[key] = counts.get(key, 0) + 1
+      if counts[key] > len(entries.get(key, ())):
+        entries.setdefault(key, []).append(element)
+
+  def entryKey(element):
+    children = {etree.QName(child).localname: child.text or '' for child in element.iterchildren(etree.Element)}
+    return etree.QName(element).localname, next((children[key] for key in ENTRY_KEYS if key in children), '')
+
+  for element in list(root):
+    root.remove(element)
+  root.text = '\n' + xml_editor.INDENT
+  for element in sorted((element for elements in entries.values() for element in elements), key=entryKey):
+    element.tail = '\n' + xml_editor.INDENT
+    root.append(element)
+  if len(root):
+    root[-1].tail = '\n'
+
+  return xml_editor.serialize(root).encode('utf-8')
+
+def mergeChunkFiles(results, outputPath):
+  """
+  Write the merged files of MERGED_TYPES retrieved by the chunks, rewriting only the ones which changed.
+  Returns the ExtractStats of the files written.
+  """
+  byFile = {}
+  for result in results:
+    for relPath, content in result.mergedFiles.items():
+      byFile.setdefault(relPath, []).append(content)
+
+  stats = ExtractStats()
+  with tracing.span('retrieve.merge', files=len(byFile)):
+    for relPath, contents in sorted(byFile.items()):
+      content = contents[0] if len(contents) == 1 else mergeEntries(contents)
+      path = os.path.join(outputPath, *relPath.split('/'))
+      stats.files += 1
+
+      if os.path.isfile(path):
+        with open(path, 'rb') as f:
+          if f.read() == content:
+            continue
+
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      # The file is replaced, not rewritten: it may be a hardlink of the snapshot store
+      tmpFile = os.path.join(os.path.dirname(path), f'.pydx-{secrets.token_hex(4)}-{os.path.basename(path)}')
+      try:
+        with open(tmpFile, 'xb') as f:
+          f.write(content)
+        os.replace(tmpFile, path)
+      finally:
+        if os.path.exists(tmpFile):
+          os.remove(tmpFile)
+      stats.changed += 1
+      stats.bytesWritten += len(content)
+
+  return stats
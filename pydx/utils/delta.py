@@ -0,0 +1,87 @@
+""" Delta deploys: find the metadata changed since a git ref or since the last successful deploy """
+
+import hashlib
+import json
+import os
+import subprocess
+
+from . import metadata
+from .sfdc_utils import listFiles, fileHash
+
+def changedSince(folder, ref):
+  """
+  Returns the files of a folder (relative to it) which differ from the given git ref,
+  including uncommitted and untracked files.
+  """
+  def git(*args):
+    result = subprocess.run(['git', '-C', folder] + list(args), capture_output=True, text=True)
+    if result.returncode != 0:
+      raise Exception(f'git {" ".join(args)} failed: {result.stderr.strip()}')
+    return [line for line in result.stdout.splitlines() if line]
+
+  changed = git('diff', '--name-only', '--relative', '--diff-filter=ACMRT', ref, '--', '.')
+  untracked = git('ls-files', '--others', '--exclude-standard', '--', '.')
+  return sorted(set(changed + untracked))
+
+class DeployManifest:
+  """
+  Hashes of the files of a folder at the time of its last successful deploy to an org.
+  """
+
+  def __init__(self, manifestFile):
+    self.manifestFile = manifestFile
+    self.hashes = {}
+
+    if os.path.exists(manifestFile):
+      with open(manifestFile) as f:
+        self.hashes = json.load(f)
+
+  @staticmethod
+  def location(settingFile, username, url, folder):
+    """
+    Path of the manifest of a folder deployed to an org, inside the ".pydx" folder next to the settings file.
+    """
+    key = hashlib.sha256(f'{username}|{url}|{os.path.abspath(folder)}'.encode()).hexdigest()[:16]
+    return os.path.join(os.path.dirname(os.path.abspath(settingFile)), '.pydx', 'deploys', f'{key}.json')
+
+  def exists(self):
+    return os.path.exists(self.manifestFile)
+
+  def changed(self, hashes):
+    """
+    Returns the files whose hash differs from the last deploy.
+    """
+    return sorted(path for path, value in hashes.items() if self.hashes.get(path) != value)
+
+  def save(self, hashes):
+    os.makedirs(os.path.dirname(self.manifestFile), exist_ok=True)
+    tmpFile = f'{self.manifestFile}.tmp'
+    with open(tmpFile, 'w') as f:
+      json.dump(hashes, f, indent=0)
+    os.replace(tmpFile, self.manifestFile)
+
+def folderHashes(folder):
+  return {path: fileHash(os.path.join(folder, path)) for path in listFiles(folder)}
+
+def deltaPackage(folder, changedFiles):
+  """
+  Compute the components of the changed files, returning them as {type name: set of members}
+  together with all the files to deploy (changed files and their companions).
+  The package.xml is ignored, since a new one is generated.
+  Raises an exception if a changed file cannot be mapped to a component.
+  """
+  components = {}
+  files = set()
+
+  for relPath in changedFiles:
+    if relPath == 'package.xml' or not os.path.isfile(os.path.join(folder, relPath)):
+      continue
+
+    component = metadata.componentForFile(relPath)
+    if component is None:
+      raise Exception(f'Unknown metadata file: {relPath}')
+
+    components.setdefault(component[0], set()).add(component[1])
+    files.update(metadata.companionFiles(folder, relPath))
+
+  return components, sorted(files)
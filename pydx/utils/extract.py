@@ -0,0 +1,107 @@
+""" Extract retrieved ZIP files straight into their final folder, rewriting only the files which changed """
+
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from zipfile import ZipFile
+
+from . import tracing
+
+# Size of the chunks compared and written while extracting an entry
+CHUNK_SIZE = 256 * 1024
+
+@dataclass
+class ExtractStats:
+  files: int = 0
+  changed: int = 0
+  bytesWritten: int = 0
+
+  def add(self, other):
+    self.files += other.files
+    self.changed += other.changed
+    self.bytesWritten += other.bytesWritten
+
+def targetPath(outputPath, name, stripPrefix=''):
+  """
+  Returns where an entry is extracted, or None if it is outside of stripPrefix.
+  Raises an exception for entries which would be written outside of the output folder.
+  """
+  if not name.startswith(stripPrefix):
+    return None
+
+  relPath = name[len(stripPrefix):]
+  root = os.path.realpath(outputPath)
+  path = os.path.realpath(os.path.join(root, *relPath.split('/')))
+
+  if os.path.commonpath([root, path]) != root:
+    raise Exception(f'Unsafe path in ZIP file: {name}')
+
+  return path
+
+def sameContent(archive, info, path):
+  """
+  Compare an entry with a file on disk, reading both one chunk at a time.
+  """
+  try:
+    if os.path.getsize(path) != info.file_size:
+      return False
+  except OSError:
+    return False
+
+  with archive.open(info) as entry, open(path, 'rb') as f:
+    while True:
+      chunk = entry.read(CHUNK_SIZE)
+      if chunk != f.read(len(chunk) or 1):
+        return False
+      if not chunk:
+        return True
+
+def extractEntry(archive, info, path):
+  stats = ExtractStats(files=1)
+
+  if sameContent(archive, info, path):
+    return stats
+
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  # The file is replaced, not rewritten: it may be a hardlink of the snapshot store
+  tmpFile = os.path.join(os.path.dirname(path), f'.pydx-{secrets.token_hex(4)}-{os.path.basename(path)}')
+  try:
+    with archive.open(info) as entry, open(tmpFile, 'xb') as f:
+      for chunk in iter(lambda: entry.read(CHUNK_SIZE), b''):
+        f.write(chunk)
+        stats.bytesWritten += len(chunk)
+    os.replace(tmpFile, path)
+  finally:
+    if os.path.exists(tmpFile):
+      os.remove(tmpFile)
+
+  stats.changed = 1
+  return stats
+
+def extractZip(zipFile, outputPath, stripPrefix='', exclude=(), workers=8):
+  """
+  Extract a ZIP file (path or file object) into outputPath, dropping stripPrefix from the entry names.
+  The entries are extracted by a thread pool and the files whose content is already on disk are not
+  rewritten, so their modification time does not change. Returns the ExtractStats of the extraction.
+  """
+  stats = ExtractStats()
+
+  with tracing.span('extract', output=outputPath) as span, ZipFile(zipFile, 'r') as archive:
+    entries = []
+    for info in archive.infolist():
+      path = targetPath(outputPath, info.filename, stripPrefix)
+      if path is None or info.filename[len(stripPrefix):] in exclude:
+        continue
+      if info.is_dir():
+        os.makedirs(path, exist_ok=True)
+      else:
+        entries.append((info, path))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+      for entryStats in executor.map(lambda entry: extractEntry(archive, *entry), entries):
+        stats.add(entryStats)
+
+    span.update(files=stats.files, changed=stats.changed, bytes=stats.bytesWritten)
+
+  return stats
@@ -0,0 +1,226 @@
+""" Mapping between metadata files (Metadata API format) and metadata components """
+
+import os
+from urllib.parse import unquote
+from xml.sax.saxutils import escape
+from dataclasses import dataclass
+from typing import Optional
+
+from .sfdc_utils import package_types
+
+@dataclass(frozen=True)
+class MetadataType:
+  name: str
+  # Suffix of the files, None when the member name keeps the whole file name (e.g. documents)
+  suffix: Optional[str]
+  # 'file': one file for each component, 'bundle': one folder for each component,
+  # 'folder': components grouped in folders (the member name includes the folder)
+  kind: str = 'file'
+
+METADATA_TYPES = {
+  'applications': MetadataType('CustomApplication', '.app'),
+  'approvalProcesses': MetadataType('ApprovalProcess', '.approvalProcess'),
+  'assignmentRules': MetadataType('AssignmentRules', '.assignmentRules'),
+  'aura': MetadataType('AuraDefinitionBundle', None, 'bundle'),
+  'authproviders': MetadataType('AuthProvider', '.authprovider'),
+  'autoResponseRules': MetadataType('AutoResponseRules', '.autoResponseRules'),
+  'classes': MetadataType('ApexClass', '.cls'),
+  'communities': MetadataType('Community', '.community'),
+  'components': MetadataType('ApexComponent', '.component'),
+  'connectedApps': MetadataType('ConnectedApp', '.connectedApp'),
+  'contentassets': MetadataType('ContentAsset', '.asset'),
+  'customMetadata': MetadataType('CustomMetadata', '.md'),
+  'customPermissions': MetadataType('CustomPermission', '.customPermission'),
+  'dashboards': MetadataType('Dashboard', '.dashboard', 'folder'),
+  'documents': MetadataType('Document', None, 'folder'),
+  'duplicateRules': MetadataType('DuplicateRule', '.duplicateRule'),
+  'email': MetadataType('EmailTemplate', '.email', 'folder'),
+  'escalationRules': MetadataType('EscalationRules', '.escalationRules'),
+  'flexipages': MetadataType('FlexiPage', '.flexipage'),
+  'flows': MetadataType('Flow', '.flow'),
+  'globalValueSets': MetadataType('GlobalValueSet', '.globalValueSet'),
+  'groups': MetadataType('Group', '.group'),
+  'labels': MetadataType('CustomLabels', '.labels'),
+  'layouts': MetadataType('Layout', '.layout'),
+  'letterhead': MetadataType('Letterhead', '.letter'),
+  'lwc': MetadataType('LightningComponentBundle', None, 'bundle'),
+  'matchingRules': MetadataType('MatchingRules', '.matchingRule'),
+  'namedCredentials': MetadataType('NamedCredential', '.namedCredential'),
+  'notificationtypes': MetadataType('CustomNotificationType', '.notiftype'),
+  'objectTranslations': MetadataType('CustomObjectTranslation', '.objectTranslation'),
+  'objects': MetadataType('CustomObject', '.object'),
+  'pages': MetadataType('ApexPage', '.page'),
+  'pathAssistants': MetadataType('PathAssistant', '.pathAssistant'),
+  'permissionsetgroups': MetadataType('PermissionSetGroup', '.permissionsetgroup'),
+  'permissionsets': MetadataType('PermissionSet', '.permissionset'),
+  'profiles': MetadataType('Profile', '.profile'),
+  'queues': MetadataType('Queue', '.queue'),
+  'quickActions': MetadataType('QuickAction', '.quickAction'),
+  'remoteSiteSettings': MetadataType('RemoteSiteSetting', '.remoteSite'),
+  'reportTypes': MetadataType('ReportType', '.reportType'),
+  'reports': MetadataType('Report', '.report', 'folder'),
+  'roles': MetadataType('Role', '.role'),
+  'settings': MetadataType('Settings', '.settings'),
+  'sharingRules': MetadataType('SharingRules', '.sharingRules'),
+  'sites': MetadataType('CustomSite', '.site'),
+  'standardValueSets': MetadataType('StandardValueSet', '.standardValueSet'),
+  'staticresources': MetadataType('StaticResource', '.resource'),
+  'tabs': MetadataType('CustomTab', '.tab'),
+  'translations': MetadataType('Translations', '.translation'),
+  'triggers': MetadataType('ApexTrigger', '.trigger'),
+  'weblinks': MetadataType('CustomPageWebLink', '.weblink'),
+  'workflows': MetadataType('Workflow', '.workflow'),
+}
+
+# Types whose components are stored inside the file of another component: {child type: container type}
+CHILD_TYPES = {
+  **{name: 'CustomObject' for name in ('BusinessProcess', 'CompactLayout', 'CustomField', 'FieldSet', 'Index', 'ListView', 'RecordType', 'SharingReason', 'ValidationRule', 'WebLink')},
+  **{name: 'Workflow' for name in ('WorkflowAlert', 'WorkflowFieldUpdate', 'WorkflowKnowledgePublish', 'WorkflowOutboundMessage', 'WorkflowRule', 'WorkflowSend', 'WorkflowTask')},
+  **{name: 'SharingRules' for name in ('SharingCriteriaRule', 'SharingGuestRule', 'SharingOwnerRule', 'SharingTerritoryRule')},
+  'CustomLabel': 'CustomLabels',
+  'AssignmentRule': 'AssignmentRules',
+  'AutoResponseRule': 'AutoResponseRules',
+  'EscalationRule': 'EscalationRules',
+  'MatchingRule': 'MatchingRules',
+}
+
+# Types whose retrieved files only hold the entries (permissions, translations) of the other components of the same retrieve
+MERGED_TYPES = ('Profile', 'PermissionSet', 'Translations', 'CustomObjectTranslation')
+
+META_SUFFIX = '-meta.xml'
+
+def containerComponent(typeName, member):
+  """
+  Returns the (type name, member name) of the component whose file holds a component of a child type
+  (e.g. CustomObject Account for CustomField Account.Name), or None for the other types.
+  A wildcard member stands for all the containers of its type.
+  """
+  containerType = CHILD_TYPES.get(typeName)
+  if containerType is None:
+    return None
+  if containerType == 'CustomLabels':
+    # All the labels are in labels/CustomLabels.labels
+    return containerType, 'CustomLabels'
+  return containerType, '*' if member == '*' else member.partition('.')[0]
+
+def componentForFile(relPath):
+  """
+  Returns the (type name, member name) of the component a file belongs to,
+  or None if the file is not a known metadata file.
+  """
+  parts = relPath.replace(os.sep, '/').split('/')
+  metadataType = METADATA_TYPES.get(parts[0])
+
+  if metadataType is None or len(parts) < 2:
+    return None
+
+  if metadataType.kind == 'bundle':
+    return (metadataType.name, parts[1]) if len(parts) > 2 else None
+
+  if metadataType.kind == 'folder':
+    if len(parts) == 2:
+      # The folder itself, described by "<folder>-meta.xml"
+      return (metadataType.name, parts[1][:-len(META_SUFFIX)]) if parts[1].endswith(META_SUFFIX) else None
+    name = '/'.join(parts[1:])
+  elif len(parts) == 2:
+    name = parts[1]
+  else:
+    return None
+
+  if name.endswith(META_SUFFIX):
+    name = name[:-len(META_SUFFIX)]
+
+  if metadataType.suffix is not None:
+    if not name.endswith(metadataType.suffix):
+      return None
+    name = name[:-len(metadataType.suffix)]
+
+  return (metadataType.name, name)
+
+def companionFiles(root, relPath):
+  """
+  Returns all the files (relative to root) which must be deployed together with the given one:
+  the file itself and its "-meta.xml", or the whole folder of a bundle.
+  """
+  parts = relPath.replace(os.sep, '/').split('/')
+  metadataType = METADATA_TYPES.get(parts[0])
+
+  if metadataType is not None and metadataType.kind == 'bundle' and len(parts) > 2:
+    bundle = os.path.join(root, parts[0], parts[1])
+    return sorted(
+      os.path.relpath(os.path.join(dirname, filename), root).replace(os.sep, '/')
+      for dirname, _, files in os.walk(bundle) for filename in files
+    )
+
+  relPath = '/'.join(parts)
+  mainFile = relPath[:-len(META_SUFFIX)] if relPath.endswith(META_SUFFIX) else relPath
+  return [path for path in (mainFile, mainFile + META_SUFFIX) if os.path.isfile(os.path.join(root, path))]
+
+class PackageIndex:
+  """
+  The components of a package.xml, by type: the set of members of each type and the types with a wildcard.
+  """
+
+  def __init__(self, version, types):
+    self.version = version
+    self.members = {}
+    for typeName, members in types:
+      self.members.setdefault(typeName, set()).update(members)
+    self.wildcards = {typeName for typeName, members in self.members.items() if '*' in members}
+
+    # Members of the containers of the listed child components (e.g. CustomObject Account for CustomField Account.Name)
+    self.containers = {}
+    for typeName, members in self.members.items():
+      for member in members:
+        container = containerComponent(typeName, member)
+        if container is not None:
+          self.containers.setdefault(container[0], set()).add(container[1])
+
+  @classmethod
+  def fromFile(cls, path):
+    return cls(*package_types(path))
+
+  def typeMembers(self, typeName):
+    """
+    The members listed for a type, without the wildcard.
+    """
+    return self.members.get(typeName, set()) - {'*'}
+
+  def contains(self, typeName, member):
+    return typeName in self.wildcards or member in self.members.get(typeName, ())
+
+  def containsChildren(self, typeName, member):
+    """
+    Whether components of child types stored in the file of a component are listed.
+    """
+    members = self.containers.get(typeName, ())
+    return '*' in members or member in members
+
+  def coversFile(self, relPath):
+    """
+    Whether a retrieved file belongs to the package, listed itself or through its child components (e.g. an object with a field).
+    Files which are not metadata components (e.g. package.xml) always do.
+    Salesforce encodes some characters of the file names (e.g. layouts), so the decoded name is checked too.
+    """
+    component = componentForFile(relPath)
+    if component is None:
+      return True
+
+    typeName, member = component
+    return any(self.contains(typeName, name) or self.containsChildren(typeName, name) for name in (member, unquote(member)))
+
+def packageXml(components, apiVersion):
+  """
+  Build a package.xml for the given {type name: set of members} components.
+  """
+  lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<Package xmlns="http://soap.sforce.com/2006/04/metadata">']
+
+  for typeName in sorted(components):
+    lines.append('    <types>')
+    lines.extend(f'        <members>{escape(member)}</members>' for member in sorted(components[typeName]))
+    lines.append(f'        <name>{typeName}</name>')
+    lines.append('    </types>')
+
+  lines.append(f'    <version>{apiVersion}</version>')
+  lines.append('</Package>')
+  return '\n'.join(lines) + '\n'
@@ -0,0 +1,164 @@
+""" Run retrieve and deploy operations on many orgs concurrently """
+
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import click
+
+from ..sfdc.async_sfdc import AsyncSfdc, AsyncTransport
+from ..sfdc.soap_decoder import DeployResult
+from . import sfdc_utils
+from .extract import extractZip
+from .polling import Poller
+
+# Size of the chunks read from the ZIP file sent to each org
+CHUNK_SIZE = 64 * 1024
+
+@dataclass
+class OrgResult:
+  name: str
+  status: str
+  elapsed: float
+  apiCalls: int
+  deployResult: Optional[DeployResult] = None
+  error: Optional[str] = None
+
+def loadTargets(path):
+  """
+  Read the target orgs from a JSON file containing a list of
+  {"name": ..., "username": ..., "password": ..., "sandbox": true/false} objects.
+  """
+  with open(path) as f:
+    targets = json.load(f)
+
+  for target in targets:
+    for key in ('name', 'username', 'password'):
+      if key not in target:
+        raise click.BadParameter(f'"{key}" is missing for target {target}', param_hint='orgs')
+
+  return targets
+
+def readChunks(path):
+  with open(path, 'rb') as f:
+    for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+      yield chunk
+
+class MultiProgress:
+  """
+  Combined progress of all the orgs: a line is printed every time the state of an org changes,
+  prefixed by the number of orgs already completed.
+  """
+
+  FINAL_STATES = ('Succeeded', 'SucceededPartial', 'Failed', 'Canceled', 'Retrieved', 'Error')
+
+  def __init__(self, names):
+    self.states = {name: 'Queued' for name in names}
+    self.width = max(len(name) for name in names)
+
+  def update(self, name, state):
+    if self.states[name] == state:
+      return
+    self.states[name] = state
+
+    completed = sum(1 for value in self.states.values() if value.partition(':')[0] in self.FINAL_STATES)
+    color = 'red' if state.startswith(('Failed', 'Error')) else 'green' if state in self.FINAL_STATES else 'bright_black'
+    click.echo('{} {} {}'.format(click.style(f'[{completed}/{len(self.states)}]', fg='yellow'), click.style(name.ljust(self.width), fg='yellow'), click.style(state, fg=color)))
+
+async def deployOrg(target, apiVersion, zipPath, testLevel, runTests, validate, transport, semaphore, progress):
+  name = target['name']
+
+  async with semaphore:
+    start = time.time()
+    connection = AsyncSfdc(target['username'], target['password'], sfdc_utils.sfdc_url(target.get('sandbox', False)), apiVersion, transport)
+
+    try:
+      progress.update(name, 'Connecting')
+      await connection.login()
+
+      orgTestLevel = testLevel
+      if not target.get('sandbox', False) and testLevel == 'NoTestRun':
+        orgTestLevel = 'RunLocalTests'
+
+      progress.update(name, 'Uploading')
+      await connection.deploy(lambda: readChunks(zipPath), testLevel=orgTestLevel, runTests=runTests, validateOnly=validate)
+
+      poller = Poller()
+      deployFinished, deployResult = await connection.isDeploying(includeDetails=False)
+
+      while not deployFinished:
+        progress.update(name, '{} [{}/{}]'.format(deployResult.status, deployResult.componentsDone + deployResult.testsDone, deployResult.numberComponentsTotal + deployResult.numberTestsTotal))
+        await asyncio.sleep(poller.nextInterval((deployResult.status, deployResult.componentsDone, deployResult.testsDone)))
+        deployFinished, deployResult = await connection.isDeploying(includeDetails=False)
+
+      if deployResult.status == 'Failed' or deployResult.numberComponentErrors + deployResult.numberTestErrors > 0:
+        _, deployResult = await connection.isDeploying(includeDetails=True)
+
+      progress.update(name, deployResult.status)
+      return OrgResult(name, deployResult.status, time.time() - start, connection.apiCalls, deployResult=deployResult)
+    except Exception as e:
+      progress.update(name, f'Error: {e}')
+      return OrgResult(name, 'Error', time.time() - start, connection.apiCalls, error=str(e))
+
+async def retrieveOrg(target, apiVersion, packageText, outputPath, transport, semaphore, progress):
+  name = target['name']
+
+  async with semaphore:
+    start = time.time()
+    connection = AsyncSfdc(target['username'], target['password'], sfdc_utils.sfdc_url(target.get('sandbox', False)), apiVersion, transport)
+
+    try:
+      progress.update(name, 'Connecting')
+      await connection.login()
+
+      progress.update(name, 'Retrieving')
+      await connection.retrieve(package=packageText)
+
+      poller = Poller(initial=2)
+      while not await connection.isRetrievingMetadata():
+        await asyncio.sleep(poller.nextInterval())
+
+      progress.update(name, 'Downloading')
+      with await connection.getZipFile() as zipFile:
+        await asyncio.to_thread(extractZip, zipFile, outputPath)
+
+      progress.update(name, 'Retrieved')
+      return OrgResult(name, 'Retrieved', time.time() - start, connection.apiCalls)
+    except Exception as e:
+      progress.update(name, f'Error: {e}')
+      return OrgResult(name, 'Error', time.time() - start, connection.apiCalls, error=str(e))
+
+async def runAll(coroutineFactory, targets, concurrency):
+  """
+  Run one coroutine per target, at most "concurrency" at the same time, sharing one connection pool.
+  """
+  transport = AsyncTransport(poolSize=concurrency)
+  semaphore = asyncio.Semaphore(concurrency)
+  progress = MultiProgress([target['name'] for target in targets])
+
+  try:
+    return await asyncio.gather(*[coroutineFactory(target, transport, semaphore, progress) for target in targets])
+  finally:
+    await transport.close()
+
+def deployMulti(targets, apiVersion, zipPath, testLevel, runTests, validate, concurrency):
+  """
+  Deploy the same ZIP file to all the targets, returning the results in the targets order.
+  """
+  return asyncio.run(runAll(
+    lambda target, transport, semaphore, progress: deployOrg(target, apiVersion, zipPath, testLevel, runTests, validate, transport, semaphore, progress),
+    targets,
+    concurrency
+  ))
+
+def retrieveMulti(targets, apiVersion, packageText, outputPaths, concurrency):
+  """
+  Retrieve the same package from all the targets, each one into its own output folder.
+  """
+  return asyncio.run(runAll(
+    lambda target, transport, semaphore, progress: retrieveOrg(target, apiVersion, packageText, outputPaths[target['name']], transport, semaphore, progress),
+    targets,
+    concurrency
+  ))
@@ -0,0 +1,31 @@
+import time
+
+class Poller:
+  """
+  Adaptive polling intervals for the status checks of async operations.
+  The interval grows while nothing changes between two checks and shrinks when some progress is observed.
+  """
+
+  def __init__(self, initial=1, maximum=30, factor=2):
+    self.initial = initial
+    self.maximum = maximum
+    self.factor = factor
+
+    self.interval = initial
+    self.lastProgress = None
+
+  def nextInterval(self, progress=None):
+    """
+    Compute the seconds to wait before the next check, given the progress observed by the last one
+    (any comparable value, i.e. the number of components and tests done).
+    """
+    if progress is not None and progress != self.lastProgress:
+      self.interval = max(self.initial, self.interval / self.factor)
+    else:
+      self.interval = min(self.maximum, self.interval * self.factor)
+
+    self.lastProgress = progress
+    return self.interval
+
+  def wait(self, progress=None):
+    time.sleep(self.nextInterval(progress))
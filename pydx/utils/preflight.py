@@ -0,0 +1,215 @@
+""" Local checks of a deploy folder before it is uploaded: well-formed XML files with the expected root element
+and a package.xml matching the files """
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from urllib.parse import unquote
+from xml.parsers import expat
+
+from . import metadata
+from .sfdc_utils import fileHash, listFiles
+
+# Bumped when the checks change, invalidating the cached results
+CHECK_VERSION = 1
+
+# Folders whose components have a content file which is not XML, next to their "-meta.xml"
+CONTENT_FOLDERS = {'classes', 'triggers', 'pages', 'components', 'staticresources', 'documents', 'email', 'contentassets', 'aura', 'lwc'}
+
+# Root element of the "-meta.xml" of the folders, by folder type
+FOLDER_ROOTS = {'Dashboard': 'DashboardFolder', 'Document': 'DocumentFolder', 'EmailTemplate': 'EmailFolder', 'Report': 'ReportFolder'}
+
+# Manifests at the root of the deploy folder
+MANIFESTS = ('package.xml', 'destructiveChanges.xml', 'destructiveChangesPre.xml', 'destructiveChangesPost.xml')
+
+@dataclass
+class CheckResult:
+  files: int = 0
+  # Files parsed, the others came from the cache
+  parsed: int = 0
+  # (relative path, message) of the problems which would make the deploy fail, and of the suspicious ones
+  errors: list = field(default_factory=list)
+  warnings: list = field(default_factory=list)
+
+def expectedRoot(relPath):
+  """
+  Returns whether a file must be XML and the name of its root element (None if it cannot be told).
+  """
+  if relPath in MANIFESTS:
+    return True, 'Package'
+
+  parts = relPath.split('/')
+  metadataType = metadata.METADATA_TYPES.get(parts[0])
+  isMeta = relPath.endswith(metadata.META_SUFFIX)
+
+  if metadataType is None or len(parts) < 2:
+    return isMeta, None
+
+  if metadataType.kind == 'bundle':
+    # Only the "-meta.xml" of a bundle describes it, the other files are sources
+    return isMeta, metadataType.name if isMeta else None
+  if parts[0] in CONTENT_FOLDERS and not isMeta:
+    return False, None
+
+  component = metadata.componentForFile(relPath)
+  if component is None:
+    return isMeta, None
+  if metadataType.kind == 'folder' and len(parts) == 2:
+    return True, FOLDER_ROOTS.get(metadataType.name)
+  if metadataType.name == 'Settings':
+    # e.g. settings/Account.settings is an AccountSettings
+    return True, f'{component[1]}Settings'
+  return True, metadataType.name
+
+def checkFile(path, relPath):
+  """
+  Returns the problems of a file: XML which is not well-formed or a root element which does not match its folder.
+  """
+  isXml, root = expectedRoot(relPath)
+  if not isXml:
+    return []
+
+  roots = []
+
+  def startElement(name, attributes):
+    roots.append(name.rpartition(':')[2])
+    parser.StartElementHandler = None
+
+  parser = expat.ParserCreate()
+  parser.StartElementHandler = startElement
+  try:
+    with open(path, 'rb') as f:
+      parser.ParseFile(f)
+  except expat.ExpatError as e:
+    return [f'XML not well-formed at line {e.lineno}, column {e.offset + 1}: {expat.ErrorString(e.code)}']
+
+  if root is not None and roots and roots[0] != root:
+    return [f'root element is <{roots[0]}>, expected <{root}>']
+  return []
+
+def checkShard(folder, relPaths):
+  return [(relPath, checkFile(os.path.join(folder, relPath), relPath)) for relPath in relPaths]
+
+def checkPackage(folder, relPaths):
+  """
+  Cross-check the package.xml of the folder with its files, returning the (errors, warnings):
+  members without files make the deploy fail, files of components which are not listed are not deployed.
+  """
+  packageFile = os.path.join(folder, 'package.xml')
+  if not os.path.isfile(packageFile):
+    return [('package.xml', 'missing')], []
+
+  try:
+    package = metadata.PackageIndex.fromFile(packageFile)
+  except Exception as e:
+    return [('package.xml', f'cannot be read: {e}')], []
+
+  errors = []
+  warnings = []
+  components = {}
+  relPathSet = set(relPaths)
+
+  for relPath in relPaths:
+    component = metadata.componentForFile(relPath)
+    if component is None:
+      continue
+    components.setdefault(component[0], set()).update((component[1], unquote(component[1])))
+
+    if not package.coversFile(relPath):
+      warnings.append((relPath, f'{component[0]} {component[1]} is not in package.xml, it will not be deployed'))
+
+    # Content files are deployed with their "-meta.xml"
+    directory = relPath.split('/')[0]
+    if directory in CONTENT_FOLDERS and metadata.METADATA_TYPES[directory].kind != 'bundle' and not relPath.endswith(metadata.META_SUFFIX) and f'{relPath}{metadata.META_SUFFIX}' not in relPathSet:
+      errors.append((relPath, f'missing {relPath.rpartition("/")[2]}{metadata.META_SUFFIX}'))
+
+  # Only the types stored in their own files can be checked (e.g. not CustomField, which is inside the objects)
+  knownTypes = {metadataType.name for metadataType in metadata.METADATA_TYPES.values()}
+  for typeName in sorted(knownTypes & set(package.members)):
+    for member in sorted(package.typeMembers(typeName) - components.get(typeName, set())):
+      errors.append(('package.xml', f'{typeName} {member} has no file'))
+
+  return errors, warnings
+
+class CheckCache:
+  """
+  Problems found in each file, by relative path and hash of the content, so unchanged files are not parsed again.
+  """
+
+  def __init__(self, cacheFile):
+    self.cacheFile = cacheFile
+    self.files = {}
+
+    if cacheFile and os.path.exists(cacheFile):
+      with open(cacheFile) as f:
+        cache = json.load(f)
+      if cache.get('version') == CHECK_VERSION:
+        self.files = cache['files']
+
+  @staticmethod
+  def location(settingFile, folder):
+    """
+    Path of the cache of a folder, inside the ".pydx" folder next to the settings file.
+    """
+    key = hashlib.sha256(os.path.abspath(folder).encode()).hexdigest()[:16]
+    return os.path.join(os.path.dirname(os.path.abspath(settingFile)), '.pydx', 'checks', f'{key}.json')
+
+  def get(self, relPath, contentHash):
+    cached = self.files.get(relPath)
+    return cached[1] if cached and cached[0] == contentHash else None
+
+  def save(self, results, complete):
+    """
+    Store the {relative path: (hash, problems)} of a check, which replace the previous ones if the check was complete.
+    """
+    self.files = results if complete else {**self.files, **results}
+    if not self.cacheFile:
+      return
+    os.makedirs(os.path.dirname(self.cacheFile), exist_ok=True)
+    tmpFile = f'{self.cacheFile}.tmp'
+    with open(tmpFile, 'w') as f:
+      json.dump({'version': CHECK_VERSION, 'files': self.files}, f)
+    os.replace(tmpFile, self.cacheFile)
+
+def checkFolder(folder, cacheFile=None, hashes=None, workers=None, package=True):
+  """
+  Check every file of a deploy folder and its package.xml, parsing the files in parallel.
+  The hashes of the files ({relative path: hash}) are computed if they are not given, if only some files of the folder
+  are given (e.g. a delta deploy with a generated package.xml) package must be False.
+  """
+  if hashes is None:
+    hashes = {relPath: fileHash(os.path.join(folder, relPath)) for relPath in listFiles(folder)}
+
+  cache = CheckCache(cacheFile)
+  result = CheckResult(files=len(hashes))
+  problems = {}
+  pending = []
+
+  for relPath, contentHash in hashes.items():
+    cached = cache.get(relPath, contentHash)
+    if cached is None:
+      pending.append(relPath)
+    else:
+      problems[relPath] = cached
+
+  workers = workers or os.cpu_count() or 1
+  if workers <= 1 or len(pending) < 2 * workers:
+    parsed = checkShard(folder, pending)
+  else:
+    # Each worker gets a few shards of the list, like Helper does for the plugins
+    chunksize = max(1, len(pending) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+      futures = [pool.submit(checkShard, folder, pending[i:i + chunksize]) for i in range(0, len(pending), chunksize)]
+      parsed = [entry for future in futures for entry in future.result()]
+
+  problems.update(parsed)
+  result.parsed = len(parsed)
+  cache.save({relPath: (hashes[relPath], problems[relPath]) for relPath in hashes}, complete=package)
+
+  result.errors = [(relPath, message) for relPath in sorted(problems) for message in problems[relPath]]
+  if package:
+    packageErrors, result.warnings = checkPackage(folder, sorted(hashes))
+    result.errors += packageErrors
+  return result
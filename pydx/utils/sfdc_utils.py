@@ -1,17 +1,31 @@
 from bs4 import BeautifulSoup
+from xml.sax.saxutils import escape
 import zipfile
-from io import BytesIO
+import hashlib
 import os
 
-from base64 import b64encode
+from . import tracing
+
+# Size of the chunks read from the files and yielded by zipDirectory
+CHUNK_SIZE = 64 * 1024
 
 
 def sfdc_url(sandbox=False):
+  # Login endpoint override, e.g. a My Domain URL or a local Metadata API stand-in
+  if os.environ.get('PYDX_LOGIN_URL'):
+    return os.environ['PYDX_LOGIN_URL'].rstrip('/')
   if sandbox:
     return 'https://test.salesforce.com'
   else:
     return 'https://login.salesforce.com'
 
+def fileHash(path):
+  digest = hashlib.sha256()
+  with open(path, 'rb') as f:
+    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+      digest.update(chunk)
+  return digest.hexdigest()
+
 def package_creator(path):
 
   packageFile = open(path, 'r')
@@ -28,15 +42,142 @@ def package_creator(path):
 
   return packageVersion, packageText
 
-def zipDirectory(path):
-  mem_zip = BytesIO()
+def package_types(path):
+  """
+  Returns the version and the (type name, members) pairs of a package.xml file.
+  """
+  with open(path, 'r') as packageFile:
+    soup = BeautifulSoup(packageFile.read(), 'xml')
+
+  packageVersion = soup.find('version').text
+  types = [
+    (metadata.find('name').text, [member.text for member in metadata.find_all('members')])
+    for metadata in soup.Package.find_all('types')
+  ]
+
+  return packageVersion, types
+
+def package_batches(types, batchSize):
+  """
+  Split the (type name, members) pairs of a package into balanced batches of at most batchSize members,
+  returning the "<types>" text of each batch. The components stored in the same file (e.g. the fields of an object,
+  the labels) stay in the same batch, since each batch would overwrite the file with its part only: a wildcard keeps
+  all the components of its type and of its child types together. The types whose files hold the permissions
+  or translations of the other components (e.g. profiles) are in every batch, their files are merged after the retrieve.
+  """
+  from .metadata import CHILD_TYPES, MERGED_TYPES, containerComponent
+
+  shared = [(name, members) for name, members in types if name in MERGED_TYPES]
+  wildcardTypes = {CHILD_TYPES.get(name, name) for name, members in types if '*' in members and name not in MERGED_TYPES}
+
+  # Members which must be retrieved together, by the file holding them
+  units = {}
+  for name, members in types:
+    if name in MERGED_TYPES:
+      continue
+    for member in members:
+      containerType = CHILD_TYPES.get(name, name)
+      key = (containerType, '*') if containerType in wildcardTypes else containerComponent(name, member) or (name, member)
+      units.setdefault(key, []).append((name, member))
+
+  # The shared members take room in every batch
+  capacity = max(1, batchSize - sum(len(members) for _, members in shared))
+  weights = [capacity if any(member == '*' for _, member in unit) else len(unit) for unit in units.values()]
+  # Same number of batches as filling them up to capacity, but with the members spread evenly
+  limit = -(-sum(weights) // -(-sum(weights) // capacity)) if weights else capacity
+
+  batches = []
+  current = []
+  size = 0
+
+  def close():
+    nonlocal current, size
+    members = {}
+    for name, member in current:
+      members.setdefault(name, []).append(member)
+    for name, sharedMembers in shared:
+      members.setdefault(name, []).extend(sharedMembers)
+    if members:
+      batches.append(''.join(
+        '<types>{}<name>{}</name></types>'.format(''.join(f'<members>{escape(member)}</members>' for member in typeMembers), escape(name))
+        for name, typeMembers in members.items()
+      ))
+    current = []
+    size = 0
+
+  for unit, weight in zip(units.values(), weights):
+    if current and size + weight > limit:
+      close()
+    current.extend(unit)
+    size += weight
+
+  close()
+  return batches
+
+class ZipStream:
+  """Unseekable buffer used by ZipFile to build an archive one chunk at a time"""
+
+  def __init__(self):
+    self.buffer = bytearray()
+    self.size = 0
+
+  def write(self, data):
+    self.buffer += data
+    self.size += len(data)
+    return len(data)
+
+  def flush(self):
+    pass
+
+  def pop(self):
+    data = bytes(self.buffer)
+    self.buffer.clear()
+    return data
+
+def listFiles(path):
+  """
+  Returns the paths, relative to the given directory and with "/" as separator, of all the files inside it.
+  """
+  return sorted(
+    os.path.relpath(os.path.join(dirname, filename), path).replace(os.sep, '/')
+    for dirname, subdirs, files in os.walk(path) for filename in files
+  )
+
+def zipDirectory(path, compressLevel=6):
+  """
+  Zip the content of a directory, yielding the archive in chunks while it is built.
+  A compression level of 0 disables the compression: entries are still deflate
+  streams, since STORED entries cannot be written with data descriptors.
+  """
+  return zipFiles(path, listFiles(path), compressLevel)
+
+def zipFiles(path, files, compressLevel=6, extraFiles=None):
+  """
+  Zip the given files, relative to a directory, yielding the archive in chunks like zipDirectory.
+  extraFiles is a {name: content} dictionary of entries added from memory (e.g. a generated package.xml).
+  """
+  stream = ZipStream()
+
+  # The span also includes the time spent by the consumer (e.g. the upload) between the chunks
+  with tracing.span('zip', files=len(files), compressLevel=compressLevel) as span:
+    # The entries opened or written by name get the compression of the archive
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=compressLevel) as zf:
+      for relPath in files:
+        filePath = os.path.join(path, relPath)
+
+        with open(filePath, 'rb') as src, zf.open(relPath, 'w') as dest:
+          for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+            dest.write(chunk)
+            if len(stream.buffer) >= CHUNK_SIZE:
+              yield stream.pop()
+
+        yield stream.pop()
 
-  zf = zipfile.ZipFile(mem_zip, "w")
+      for name, content in (extraFiles or {}).items():
+        zf.writestr(name, content)
+        yield stream.pop()
 
-  for dirname, subdirs, files in os.walk(path):
-    zf.write(dirname)
-    for filename in files:
-      zipPath = os.path.join(dirname, filename)
-      zf.write(zipPath, zipPath.replace(path, ''))
+    # Central directory
+    yield stream.pop()
 
-  return b64encode(mem_zip.getvalue()).decode()
+    span['bytes'] = stream.size
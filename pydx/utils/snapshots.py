@@ -0,0 +1,422 @@
+""" Content-addressed store of retrieved trees: each content is kept once, whatever the org and the date it was retrieved from """
+
+import errno
+import hashlib
+import json
+import os
+import re
+import secrets
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from .sfdc_utils import fileHash, listFiles
+from .watcher import ignored
+
+# How the files of a tree share the content of the blobs, 'auto' uses the first one the filesystem supports
+LINK_MODES = ('auto', 'reflink', 'hardlink', 'copy')
+
+# The blobs are read-only: a hardlinked file edited in place would change every snapshot and tree sharing it
+BLOB_MODE = 0o444
+FILE_MODE = 0o644
+
+# ioctl cloning a file on Linux (btrfs, XFS, overlayfs on them...)
+FICLONE = 0x40049409
+
+# Errors of a link mode which cannot work between the store and the tree, so the next mode is tried
+UNSUPPORTED = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL, errno.ENOTTY, errno.EPERM, errno.EMLINK, errno.ENOSYS}
+
+def defaultStore():
+  return os.environ.get('PYDX_STORE') or os.path.join(os.path.expanduser('~'), '.pydx', 'store')
+
+def reflink(src, dst):
+  """
+  Copy-on-write clone of a file, raising OSError where the filesystem does not support it.
+  """
+  if sys.platform == 'darwin':
+    import ctypes
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) != 0:
+      error = ctypes.get_errno()
+      raise OSError(error, os.strerror(error), dst)
+    return
+
+  if not sys.platform.startswith('linux'):
+    raise OSError(errno.EOPNOTSUPP, 'Reflinks are not supported', dst)
+
+  import fcntl
+  fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, FILE_MODE)
+  try:
+    with open(src, 'rb') as source:
+      fcntl.ioctl(fd, FICLONE, source.fileno())
+  except OSError:
+    os.close(fd)
+    os.remove(dst)
+    raise
+  os.close(fd)
+
+class Linker:
+  """
+  Creates a file with the content of another one, with the first link mode which works between them:
+  reflinks share the content until one of the files is written, hardlinks are the same (read-only) file, copies duplicate it.
+  """
+
+  def __init__(self, mode='auto'):
+    self.modes = ['reflink', 'hardlink', 'copy'] if mode == 'auto' else [mode]
+    # Modes which created files
+    self.used = set()
+
+  @property
+  def mode(self):
+    return self.modes[0]
+
+  def link(self, src, dst, fileMode):
+    """
+    Create dst (which must not exist) from src, returning the mode used. Hardlinks keep the mode of src.
+    """
+    while True:
+      modes = self.modes
+      try:
+        if modes[0] == 'hardlink':
+          os.link(src, dst)
+        elif modes[0] == 'reflink':
+          reflink(src, dst)
+          os.chmod(dst, fileMode)
+        else:
+          shutil.copyfile(src, dst)
+          os.chmod(dst, fileMode)
+        self.used.add(modes[0])
+        return modes[0]
+      except OSError as e:
+        if e.errno not in UNSUPPORTED or len(modes) == 1:
+          raise
+        # The next files (between the same folders) will not be able to use it either
+        if self.modes is modes:
+          self.modes = modes[1:]
+
+@dataclass
+class Snapshot:
+  org: str
+  id: str
+  createdAt: float
+  files: int
+  bytes: int
+  manifestFile: str
+
+  @property
+  def ref(self):
+    return f'{self.org}@{self.id}'
+
+  def hashes(self):
+    """
+    The {relative path: hash} of the files of the snapshot.
+    """
+    hashes = {}
+    with open(self.manifestFile) as f:
+      next(f)
+      for line in f:
+        digest, _, relPath = line.rstrip('\n').partition(' ')
+        hashes[relPath] = digest
+    return hashes
+
+@dataclass
+class StoreStats:
+  files: int = 0
+  hashed: int = 0
+  added: int = 0
+  bytesAdded: int = 0
+  linked: int = 0
+  written: int = 0
+  removed: int = 0
+  mode: str = ''
+
+class SnapshotStore:
+  """
+  Blobs keyed by the hash of their content ("objects/ab/cdef..."), the manifest of each snapshot of an org ("snapshots/<org>/<id>.txt")
+  and, for each working tree, the snapshot it holds with the hash and the stat of its files ("trees/<key>.json"),
+  so that only the files which changed are hashed and written when a snapshot is committed or checked out.
+  """
+
+  def __init__(self, root, linkMode='auto', workers=8):
+    self.root = root
+    self.linker = Linker(linkMode)
+    self.workers = workers
+
+  def blobPath(self, digest):
+    return os.path.join(self.root, 'objects', digest[:2], digest[2:])
+
+  def orgFolder(self, org):
+    return os.path.join(self.root, 'snapshots', re.sub(r'[^\w.@+-]', '_', org))
+
+  def treeFile(self, folder):
+    key = hashlib.sha256(os.path.abspath(folder).encode()).hexdigest()[:16]
+    return os.path.join(self.root, 'trees', f'{key}.json')
+
+  def loadTree(self, folder):
+    treeFile = self.treeFile(folder)
+    if not os.path.exists(treeFile):
+      return {'folder': os.path.abspath(folder), 'snapshot': None, 'files': {}}
+    with open(treeFile) as f:
+      return json.load(f)
+
+  def saveTree(self, folder, snapshotRef, files):
+    treeFile = self.treeFile(folder)
+    os.makedirs(os.path.dirname(treeFile), exist_ok=True)
+    tmpFile = f'{treeFile}.tmp'
+    with open(tmpFile, 'w') as f:
+      json.dump({'folder': os.path.abspath(folder), 'snapshot': snapshotRef, 'files': files}, f, indent=0)
+    os.replace(tmpFile, treeFile)
+
+  def scan(self, folder, known):
+    """
+    The {relative path: [hash, mtime, size, inode]} of the files of a folder, hashing only the files whose stat differs from the known ones.
+    Returns them with the number of files hashed.
+    """
+    files = {}
+    stale = []
+    for relPath in listFiles(folder):
+      if ignored(relPath):
+        continue
+      stat = os.stat(os.path.join(folder, relPath))
+      entry = [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+      if relPath in known and known[relPath][1:] == entry:
+        files[relPath] = known[relPath]
+      else:
+        files[relPath] = [None] + entry
+        stale.append(relPath)
+
+    with ThreadPoolExecutor(max_workers=self.workers) as executor:
+      for relPath, digest in zip(stale, executor.map(lambda relPath: fileHash(os.path.join(folder, relPath)), stale)):
+        files[relPath][0] = digest
+
+    return files, len(stale)
+
+  def place(self, src, dst, fileMode):
+    """
+    Replace dst with a link to src, through a temporary file so that dst is never partially written.
+    """
+    tmpFile = os.path.join(os.path.dirname(dst), f'.pydx-{secrets.token_hex(4)}-{os.path.basename(dst)}')
+    try:
+      mode = self.linker.link(src, tmpFile, fileMode)
+      os.replace(tmpFile, dst)
+    finally:
+      if os.path.lexists(tmpFile):
+        os.remove(tmpFile)
+    return mode
+
+  def commit(self, org, folder):
+    """
+    Add the files of a folder to the store as a new snapshot of the org, returning the Snapshot and the StoreStats.
+    Only the contents missing from the store are added (without copying them when they can be linked),
+    and the files whose content was already in it are replaced by links to the same blob.
+    """
+    self.linker.used.clear()
+    tree = self.loadTree(folder)
+    files, hashed = self.scan(folder, tree['files'])
+    stats = StoreStats(files=len(files), hashed=hashed)
+
+    # The files listed in the tree are already links to their blob, each missing content is added from the first of its files
+    fresh = [relPath for relPath, entry in files.items() if tree['files'].get(relPath) != entry]
+    firstFiles = {}
+    for relPath in fresh:
+      firstFiles.setdefault(files[relPath][0], relPath)
+    missing = [relPath for digest, relPath in firstFiles.items() if not os.path.exists(self.blobPath(digest))]
+
+    def addBlob(relPath):
+      blob = self.blobPath(files[relPath][0])
+      os.makedirs(os.path.dirname(blob), exist_ok=True)
+      self.place(os.path.join(folder, relPath), blob, BLOB_MODE)
+      # With a hardlink, the file is the blob: it is read-only too
+      os.chmod(blob, BLOB_MODE)
+
+    def linkFile(relPath):
+      blob = self.blobPath(files[relPath][0])
+      if os.stat(blob).st_ino == files[relPath][3]:
+        return False
+      self.place(blob, os.path.join(folder, relPath), FILE_MODE)
+      return True
+
+    with ThreadPoolExecutor(max_workers=self.workers) as executor:
+      list(executor.map(addBlob, missing))
+      stats.added = len(missing)
+      stats.bytesAdded = sum(files[relPath][2] for relPath in missing)
+
+      if self.linker.mode != 'copy':
+        added = set(missing)
+        others = [relPath for relPath in fresh if relPath not in added]
+        for relPath, linked in zip(others, executor.map(linkFile, others)):
+          if linked:
+            stats.linked += 1
+            stat = os.stat(os.path.join(folder, relPath))
+            files[relPath] = [files[relPath][0], stat.st_mtime_ns, stat.st_size, stat.st_ino]
+    stats.mode = ', '.join(sorted(self.linker.used))
+
+    snapshot = self.writeManifest(org, {relPath: entry[0] for relPath, entry in files.items()}, sum(entry[2] for entry in files.values()))
+    self.saveTree(folder, snapshot.ref, files)
+    return snapshot, stats
+
+  def writeManifest(self, org, hashes, size):
+    orgFolder = self.orgFolder(org)
+    os.makedirs(orgFolder, exist_ok=True)
+
+    createdAt = time.time()
+    snapshotId = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(createdAt))
+    manifestFile = os.path.join(orgFolder, f'{snapshotId}.txt')
+
+    tmpFile = f'{manifestFile}.tmp'
+    with open(tmpFile, 'w') as f:
+      f.write(json.dumps({'org': org, 'id': snapshotId, 'createdAt': createdAt, 'files': len(hashes), 'bytes': size}) + '\n')
+      for relPath in sorted(hashes):
+        f.write(f'{hashes[relPath]} {relPath}\n')
+    os.replace(tmpFile, manifestFile)
+
+    return Snapshot(org, snapshotId, createdAt, len(hashes), size, manifestFile)
+
+  def snapshots(self, org=None):
+    """
+    The snapshots of an org (or of all the orgs), oldest first, reading only the header of their manifests.
+    """
+    snapshotsFolder = os.path.join(self.root, 'snapshots')
+    orgFolders = [self.orgFolder(org)] if org else [os.path.join(snapshotsFolder, name) for name in sorted(os.listdir(snapshotsFolder))] if os.path.isdir(snapshotsFolder) else []
+
+    snapshots = []
+    for orgFolder in orgFolders:
+      if not os.path.isdir(orgFolder):
+        continue
+      for name in sorted(os.listdir(orgFolder)):
+        if not name.endswith('.txt'):
+          continue
+        manifestFile = os.path.join(orgFolder, name)
+        with open(manifestFile) as f:
+          header = json.loads(f.readline())
+        snapshots.append(Snapshot(header['org'], header['id'], header['createdAt'], header['files'], header['bytes'], manifestFile))
+    return snapshots
+
+  def resolve(self, ref):
+    """
+    The snapshot of a reference: "<org>" for the last one of the org, "<org>@<id>" for the last one whose id starts with the given one (e.g. "@20240115").
+    """
+    # Usernames contain "@" too
+    org, snapshotId = ref, ''
+    if not os.path.isdir(self.orgFolder(ref)) and '@' in ref:
+      org, _, snapshotId = ref.rpartition('@')
+
+    matching = [snapshot for snapshot in self.snapshots(org) if snapshot.id.startswith(snapshotId)]
+    if not matching:
+      raise Exception(f'No snapshot found for {ref}')
+    return matching[-1]
+
+  def checkout(self, snapshot, folder, force=False):
+    """
+    Make the folder hold the files of a snapshot, writing only the files which differ. Returns the StoreStats.
+    Files changed since the last commit or checkout in the folder are not overwritten, unless force is set.
+    """
+    os.makedirs(folder, exist_ok=True)
+    self.linker.used.clear()
+    tree = self.loadTree(folder)
+    files, hashed = self.scan(folder, tree['files'])
+    target = snapshot.hashes()
+    stats = StoreStats(files=len(target), hashed=hashed)
+
+    modified = sorted(relPath for relPath, entry in files.items() if tree['files'].get(relPath) != entry and target.get(relPath) != entry[0])
+    if modified and not force:
+      raise Exception('{} files were changed since the last snapshot of {} and would be overwritten: {}{}'.format(
+        len(modified), folder, ', '.join(modified[:5]), '...' if len(modified) > 5 else ''
+      ))
+
+    missing = sorted(relPath for relPath, digest in target.items() if not os.path.exists(self.blobPath(digest)))
+    if missing:
+      raise Exception(f'The store is damaged, the content of {len(missing)} files of {snapshot.ref} is missing (e.g. {missing[0]})')
+
+    for relPath in sorted(files.keys() - target.keys()):
+      os.remove(os.path.join(folder, relPath))
+      del files[relPath]
+      stats.removed += 1
+      removeEmptyFolders(folder, os.path.dirname(relPath))
+
+    def writeFile(relPath):
+      path = os.path.join(folder, relPath)
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      self.place(self.blobPath(target[relPath]), path, FILE_MODE)
+
+    changed = [relPath for relPath, digest in target.items() if relPath not in files or files[relPath][0] != digest]
+    with ThreadPoolExecutor(max_workers=self.workers) as executor:
+      list(executor.map(writeFile, changed))
+    stats.written = len(changed)
+    stats.mode = ', '.join(sorted(self.linker.used))
+
+    for relPath in changed:
+      stat = os.stat(os.path.join(folder, relPath))
+      files[relPath] = [target[relPath], stat.st_mtime_ns, stat.st_size, stat.st_ino]
+    self.saveTree(folder, snapshot.ref, files)
+    return stats
+
+  def prune(self, keep):
+    """
+    Remove all but the last keep snapshots of each org, then the blobs no snapshot uses. Returns the (snapshots, blobs, bytes) removed.
+    """
+    removed = 0
+    byOrg = {}
+    for snapshot in self.snapshots():
+      byOrg.setdefault(snapshot.org, []).append(snapshot)
+    for orgSnapshots in byOrg.values():
+      for snapshot in orgSnapshots[:-keep] if keep else orgSnapshots:
+        os.remove(snapshot.manifestFile)
+        removed += 1
+
+    used = set()
+    for snapshot in self.snapshots():
+      used.update(snapshot.hashes().values())
+
+    blobs = freed = 0
+    for digest, path in self.blobs():
+      if digest not in used:
+        stat = os.stat(path)
+        os.remove(path)
+        blobs += 1
+        # The content of a blob still linked in a tree is not freed
+        freed += stat.st_size if stat.st_nlink == 1 else 0
+    return removed, blobs, freed
+
+  def verify(self):
+    """
+    Hash the content of every blob, removing the ones which changed (e.g. a hardlinked file edited in place). Returns their hashes.
+    """
+    blobs = list(self.blobs())
+    with ThreadPoolExecutor(max_workers=self.workers) as executor:
+      damaged = [digest for (digest, path), actual in zip(blobs, executor.map(lambda blob: fileHash(blob[1]), blobs)) if actual != digest]
+    for digest in damaged:
+      os.remove(self.blobPath(digest))
+    return damaged
+
+  def blobs(self):
+    """
+    Yield the (hash, path) of the blobs of the store.
+    """
+    objectsFolder = os.path.join(self.root, 'objects')
+    if not os.path.isdir(objectsFolder):
+      return
+    for prefix in sorted(os.listdir(objectsFolder)):
+      for name in os.listdir(os.path.join(objectsFolder, prefix)):
+        if not name.startswith('.pydx-'):
+          yield prefix + name, os.path.join(objectsFolder, prefix, name)
+
+  def usage(self):
+    """
+    The number of blobs and their total size.
+    """
+    count = size = 0
+    for _, path in self.blobs():
+      count += 1
+      size += os.stat(path).st_size
+    return count, size
+
+def removeEmptyFolders(folder, relFolder):
+  while relFolder:
+    try:
+      os.rmdir(os.path.join(folder, relFolder))
+    except OSError:
+      return
+    relFolder = os.path.dirname(relFolder)
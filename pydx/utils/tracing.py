@@ -0,0 +1,138 @@
+""" Timing spans of the pydx phases, written as JSON lines or as a Chrome trace, and optional profiling of the plugins """
+
+import io
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import click
+
+# Number of functions printed by the profiler
+HOTSPOTS = 25
+
+class Tracer:
+  """
+  Collects the spans of a command. It is disabled by default, so spans cost almost nothing unless a trace is requested.
+  """
+
+  def __init__(self):
+    self.traceFile = None
+    self.profiler = None
+    self.events = []
+    self.origin = time.perf_counter()
+    self.ids = iter(range(1, 1 << 62))
+    self.local = threading.local()
+
+  @property
+  def enabled(self):
+    return self.traceFile is not None
+
+  def stack(self):
+    if not hasattr(self.local, 'stack'):
+      self.local.stack = []
+    return self.local.stack
+
+  def record(self, spanId, parent, name, start, end, attributes):
+    self.events.append({
+      'id': spanId,
+      'parent': parent,
+      'name': name,
+      'start': round(start - self.origin, 6),
+      'duration': round(end - start, 6),
+      'pid': os.getpid(),
+      'thread': threading.current_thread().name,
+      'tid': threading.get_ident(),
+      'attributes': attributes
+    })
+
+  def write(self):
+    if self.traceFile.endswith('.json'):
+      # Chrome trace format, can be opened with chrome://tracing or https://ui.perfetto.dev
+      trace = {'traceEvents': [
+        {
+          'name': event['name'], 'cat': 'pydx', 'ph': 'X',
+          'ts': int(event['start'] * 1e6), 'dur': int(event['duration'] * 1e6),
+          'pid': event['pid'], 'tid': event['tid'], 'args': event['attributes']
+        }
+        for event in self.events
+      ]}
+      with open(self.traceFile, 'w') as f:
+        json.dump(trace, f, default=str)
+    else:
+      with open(self.traceFile, 'w') as f:
+        for event in sorted(self.events, key=lambda event: event['start']):
+          f.write(json.dumps(event, default=str) + '\n')
+
+tracer = Tracer()
+
+def start(traceFile=None, profile=False):
+  """
+  Enable the spans (written to traceFile by finish) and/or the profiling of the plugins.
+  """
+  tracer.traceFile = traceFile
+  tracer.profiler = None
+
+  if profile:
+    # Only imported when profiling, every command imports this module
+    import cProfile
+    tracer.profiler = cProfile.Profile()
+
+@contextmanager
+def span(name, **attributes):
+  """
+  Time the enclosed block. The attributes are yielded so the block can add its own (e.g. files, bytes).
+  """
+  if not tracer.enabled:
+    yield attributes
+    return
+
+  stack = tracer.stack()
+  spanId = next(tracer.ids)
+  parent = stack[-1] if stack else None
+  stack.append(spanId)
+  begin = time.perf_counter()
+
+  try:
+    yield attributes
+  except BaseException as e:
+    attributes['error'] = repr(e)
+    raise
+  finally:
+    tracer.record(spanId, parent, name, begin, time.perf_counter(), attributes)
+    stack.remove(spanId)
+
+@contextmanager
+def profiled():
+  """
+  Profile the enclosed block if profiling is enabled. Work done by other processes (e.g. helper workers) is not included.
+  """
+  if tracer.profiler is None or threading.current_thread() is not threading.main_thread():
+    yield
+    return
+
+  tracer.profiler.enable()
+  try:
+    yield
+  finally:
+    tracer.profiler.disable()
+
+def finish():
+  """
+  Write the trace file and print the hotspots found by the profiler.
+  """
+  if tracer.enabled:
+    tracer.write()
+    click.echo('{}{}'.format(click.style('Trace: ', fg='yellow'), click.style(tracer.traceFile, fg='green')))
+
+  # pstats refuses a profiler which never ran (e.g. commands without plugins)
+  if tracer.profiler is not None and tracer.profiler.getstats():
+    import pstats
+
+    output = io.StringIO()
+    stats = pstats.Stats(tracer.profiler, stream=output)
+    if stats.total_calls:
+      stats.sort_stats('cumulative').print_stats(HOTSPOTS)
+      click.echo(click.style('Plugins profile:', fg='yellow'))
+      click.echo(output.getvalue())
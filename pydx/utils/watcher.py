@@ -0,0 +1,134 @@
+""" Watch a source folder for changed files: inotify & co. through watchdog when it is installed, polling otherwise """
+
+import os
+import threading
+import time
+
+# Files and folders which are never reported: pydx state, VCS folders, temporary files of pydx and of the editors
+IGNORED_FOLDERS = {'.pydx', '.git', '.sfdx', '.sf', 'node_modules'}
+IGNORED_PREFIXES = ('.pydx-', '.#')
+IGNORED_SUFFIXES = ('~', '.swp', '.swx', '.tmp')
+
+def ignored(relPath):
+  parts = relPath.split('/')
+  name = parts[-1]
+  return any(part in IGNORED_FOLDERS for part in parts[:-1]) or name.startswith(IGNORED_PREFIXES) or name.endswith(IGNORED_SUFFIXES)
+
+def snapshot(folder):
+  """
+  The {relative path: (modification time, size)} of the files of a folder.
+  """
+  files = {}
+  for dirname, subdirs, filenames in os.walk(folder):
+    subdirs[:] = [subdir for subdir in subdirs if subdir not in IGNORED_FOLDERS]
+    for filename in filenames:
+      path = os.path.join(dirname, filename)
+      relPath = os.path.relpath(path, folder).replace(os.sep, '/')
+      if ignored(relPath):
+        continue
+      try:
+        stat = os.stat(path)
+      except FileNotFoundError:
+        continue
+      files[relPath] = (stat.st_mtime_ns, stat.st_size)
+  return files
+
+class PollingWatcher:
+  """
+  Finds the changed files by comparing snapshots of the folder every interval seconds.
+  """
+
+  def __init__(self, folder, interval=1.0):
+    self.folder = folder
+    self.interval = interval
+    self.files = snapshot(folder)
+
+  def start(self):
+    return self
+
+  def stop(self):
+    pass
+
+  def changes(self, timeout):
+    """
+    Returns the files created, modified or deleted since the last call, waiting up to timeout seconds for one.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+      files = snapshot(self.folder)
+      changed = {relPath for relPath in files.keys() | self.files.keys() if files.get(relPath) != self.files.get(relPath)}
+      self.files = files
+      if changed or time.monotonic() >= deadline:
+        return changed
+      time.sleep(min(self.interval, max(0, deadline - time.monotonic())))
+
+class WatchdogWatcher:
+  """
+  Collects the files reported by a watchdog observer (inotify on Linux, FSEvents on macOS...) until they are asked for.
+  """
+
+  def __init__(self, folder):
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+
+    self.folder = os.path.abspath(folder)
+    self.pending = set()
+    self.condition = threading.Condition()
+
+    watcher = self
+
+    class Handler(FileSystemEventHandler):
+      def on_any_event(self, event):
+        if not event.is_directory:
+          watcher.add(event.src_path, getattr(event, 'dest_path', None))
+
+    self.observer = Observer()
+    self.observer.schedule(Handler(), self.folder, recursive=True)
+
+  def add(self, *paths):
+    relPaths = {os.path.relpath(path, self.folder).replace(os.sep, '/') for path in paths if path}
+    relPaths = {relPath for relPath in relPaths if not relPath.startswith('..') and not ignored(relPath)}
+    if relPaths:
+      with self.condition:
+        self.pending |= relPaths
+        self.condition.notify_all()
+
+  def start(self):
+    self.observer.start()
+    return self
+
+  def stop(self):
+    self.observer.stop()
+    self.observer.join()
+
+  def changes(self, timeout):
+    with self.condition:
+      self.condition.wait_for(lambda: self.pending, timeout)
+      changed, self.pending = self.pending, set()
+    return changed
+
+def createWatcher(folder, polling=False, interval=1.0):
+  """
+  A watchdog watcher, or a polling one if polling is requested or watchdog is not installed.
+  """
+  if not polling:
+    try:
+      return WatchdogWatcher(folder)
+    except ImportError:
+      pass
+  return PollingWatcher(folder, interval)
+
+def batches(watcher, debounce=0.5):
+  """
+  Yield the sets of changed files, each once no other file changed for debounce seconds,
+  so that saving many files (e.g. a git checkout) makes a single batch.
+  """
+  while True:
+    changed = watcher.changes(timeout=3600)
+    while changed:
+      more = watcher.changes(timeout=debounce)
+      if not more:
+        break
+      changed |= more
+    if changed:
+      yield changed
@@ -9,7 +9,7 @@ setup(
   author_email='lnapo94@gmail.com',
   url='https://github.com/lnapo94/Python-SFDX-Tool',
   python_requires='>=3.9',
-  packages=find_packages(),
+  packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
   install_requires=[
     'click==8.1.3',
     'requests==2.27.1',
@@ -18,6 +18,11 @@ setup(
     'lxml==4.8.0',
     'xmltodict==0.13.0'
   ],
+  extras_require={
+    'async': ['aiohttp==3.8.1'],
+    'watch': ['watchdog==2.1.9'],
+    'sfdx': ['cryptography==37.0.2']
+  },
   entry_points={
     'console_scripts': [
       'pydx=pydx.pydx:main',
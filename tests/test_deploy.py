@@ -0,0 +1,45 @@
+import json
+import os
+
+from pydx.commands.deploy import selectTests
+from pydx.sfdc.sfdc import Sfdc
+
+SOURCES = {
+  'classes/Invoice.cls': 'public class Invoice {}',
+  'classes/InvoiceTest.cls': '@isTest class InvoiceTest { @isTest static void run() { new Invoice(); } }',
+  'classes/Untested.cls': 'public class Untested {}',
+  'objects/Account.object': '<CustomObject/>',
+}
+
+def makeFolder(tmp_path):
+  folder = os.path.join(tmp_path, 'src')
+  for relPath, content in SOURCES.items():
+    os.makedirs(os.path.join(folder, os.path.dirname(relPath)), exist_ok=True)
+    with open(os.path.join(folder, relPath), 'w') as f:
+      f.write(content)
+  settingFile = os.path.join(tmp_path, 'pydx.json')
+  with open(settingFile, 'w') as f:
+    json.dump({'preDeploy': [], 'postRetrieve': []}, f)
+  return folder, settingFile
+
+def testProductionDeployWithoutApexHasNoTestLevel(tmp_path):
+  folder, settingFile = makeFolder(tmp_path)
+
+  testLevel, runTests = selectTests(folder, settingFile, ['objects/Account.object'], production=True)
+  assert (testLevel, runTests) == (None, [])
+
+  # Salesforce applies its default test level, which runs no test without Apex
+  head, _ = Sfdc.deployEnvelope('SESSION', testLevel, runTests)
+  assert 'testLevel' not in head
+
+def testProductionDeployOfApex(tmp_path):
+  folder, settingFile = makeFolder(tmp_path)
+
+  assert selectTests(folder, settingFile, ['classes/Invoice.cls'], production=True) == ('RunSpecifiedTests', ['InvoiceTest'])
+  assert selectTests(folder, settingFile, ['classes/Untested.cls'], production=True) == ('RunLocalTests', [])
+
+def testSandboxDeployWithoutTests(tmp_path):
+  folder, settingFile = makeFolder(tmp_path)
+
+  assert selectTests(folder, settingFile, ['objects/Account.object']) == ('NoTestRun', [])
+  assert selectTests(folder, settingFile, ['classes/Untested.cls']) == ('NoTestRun', [])
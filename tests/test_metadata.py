@@ -0,0 +1,72 @@
+import os
+
+from pydx.engine.helpers import Helper
+from pydx.utils.metadata import PackageIndex
+
+PACKAGE = """<?xml version="1.0" encoding="UTF-8"?>
+<Package xmlns="http://soap.sforce.com/2006/04/metadata">
+    <types>
+        <members>Account.MyField__c</members>
+        <name>CustomField</name>
+    </types>
+    <types>
+        <members>*</members>
+        <name>CustomLabel</name>
+    </types>
+    <types>
+        <members>Account.MyRule</members>
+        <name>WorkflowRule</name>
+    </types>
+    <version>55.0</version>
+</Package>
+"""
+
+FILES = [
+  'objects/Account.object',
+  'objects/Contact.object',
+  'labels/CustomLabels.labels',
+  'workflows/Account.workflow',
+  'workflows/Contact.workflow',
+  'classes/MyClass.cls',
+  'classes/MyClass.cls-meta.xml',
+]
+
+def writeFiles(folder):
+  with open(os.path.join(folder, 'package.xml'), 'w') as f:
+    f.write(PACKAGE)
+  for relPath in FILES:
+    os.makedirs(os.path.join(folder, os.path.dirname(relPath)), exist_ok=True)
+    with open(os.path.join(folder, relPath), 'w') as f:
+      f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+
+def testChildComponentsCoverTheirContainerFile(tmp_path):
+  writeFiles(tmp_path)
+  index = PackageIndex.fromFile(os.path.join(tmp_path, 'package.xml'))
+
+  assert index.coversFile('objects/Account.object')
+  assert index.coversFile('labels/CustomLabels.labels')
+  assert index.coversFile('workflows/Account.workflow')
+  assert not index.coversFile('objects/Contact.object')
+  assert not index.coversFile('workflows/Contact.workflow')
+  assert not index.coversFile('classes/MyClass.cls')
+
+def testChildWildcardCoversEveryContainer(tmp_path):
+  index = PackageIndex('55.0', [('CustomField', ['*'])])
+
+  assert index.coversFile('objects/Account.object')
+  assert index.coversFile('objects/Foo__c.object')
+  assert not index.coversFile('workflows/Account.workflow')
+
+def testPrunePerPackageKeepsContainersOfChildComponents(tmp_path):
+  writeFiles(tmp_path)
+
+  helper = Helper(str(tmp_path))
+  removed = helper.prunePerPackage('package.xml')
+
+  remaining = sorted(
+    os.path.relpath(os.path.join(dirname, filename), tmp_path).replace(os.sep, '/')
+    for dirname, _, filenames in os.walk(tmp_path) for filename in filenames
+  )
+  assert remaining == ['labels/CustomLabels.labels', 'objects/Account.object', 'package.xml', 'workflows/Account.workflow']
+  assert removed == 4
+  assert not os.path.exists(os.path.join(tmp_path, 'classes'))
@@ -0,0 +1,49 @@
+import os
+
+from pydx.engine.helpers import Helper
+from pydx.engine.plugin_cache import PluginCache
+from pydx.utils.snapshots import SnapshotStore
+
+PROFILE = """<?xml version="1.0" encoding="UTF-8"?>
+<Profile xmlns="http://soap.sforce.com/2006/04/metadata">
+    <custom>false</custom>
+</Profile>
+"""
+
+def makeCustom(fileName, document):
+  document['Profile']['custom'] = 'true'
+
+def runCachedEdit(tree, cacheDir):
+  helper = Helper(tree, cache=PluginCache(cacheDir, tree, 'test'))
+  helper.editXML('profiles/*.profile', makeCustom)
+  helper.cache.save()
+  return helper.cache.skipped
+
+def testCachedEditDoesNotWriteIntoTheSnapshotStore(tmp_path):
+  retrieved = os.path.join(tmp_path, 'retrieved')
+  os.makedirs(os.path.join(retrieved, 'profiles'))
+  with open(os.path.join(retrieved, 'profiles', 'Admin.profile'), 'w') as f:
+    f.write(PROFILE)
+
+  store = SnapshotStore(os.path.join(tmp_path, 'store'), linkMode='hardlink')
+  snapshot, _ = store.commit('org', retrieved)
+
+  tree = os.path.join(tmp_path, 'tree')
+  cacheDir = os.path.join(tmp_path, 'cache')
+  profile = os.path.join(tree, 'profiles', 'Admin.profile')
+
+  # The first run edits the file and stores its output, the second one restores it from the cache
+  store.checkout(snapshot, tree)
+  assert runCachedEdit(tree, cacheDir) == 0
+  store.checkout(snapshot, tree, force=True)
+  blob = store.blobPath(snapshot.hashes()['profiles/Admin.profile'])
+  assert os.path.samefile(profile, blob)
+  assert runCachedEdit(tree, cacheDir) == 1
+
+  with open(profile) as f:
+    assert '<custom>true</custom>' in f.read()
+  assert not os.path.samefile(profile, blob)
+  for path in (blob, os.path.join(retrieved, 'profiles', 'Admin.profile')):
+    with open(path) as f:
+      assert f.read() == PROFILE
+  assert not store.verify()
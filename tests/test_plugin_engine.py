@@ -0,0 +1,34 @@
+import json
+import os
+import sys
+
+from pydx.engine.plugin_engine import PluginEngine
+
+PLUGIN = """
+helpers = []
+
+def recordHelper(environment, helper):
+  helpers.append(helper)
+"""
+
+def testKeptHelpersAreReusedUntilClosed(tmp_path, monkeypatch):
+  with open(os.path.join(tmp_path, 'engine_test_plugin.py'), 'w') as f:
+    f.write(PLUGIN)
+  settingFile = os.path.join(tmp_path, 'pydx.json')
+  with open(settingFile, 'w') as f:
+    json.dump({'preDeploy': ['engine_test_plugin'], 'postRetrieve': [], 'cache': True}, f)
+  monkeypatch.chdir(tmp_path)
+  monkeypatch.setattr(sys, 'path', list(sys.path))
+
+  engine = PluginEngine(settingFile=settingFile, outputFolder=str(tmp_path))
+  engine.keepHelpers()
+  engine.preDeploy()
+  engine.preDeploy()
+
+  helpers = sys.modules['engine_test_plugin'].helpers
+  assert len(helpers) == 2 and helpers[0] is helpers[1]
+  assert sys.path.count(str(tmp_path)) == 1
+
+  engine.close()
+  engine.preDeploy()
+  assert helpers[2] is not helpers[0]
@@ -0,0 +1,25 @@
+import os
+
+from pydx.utils import preflight
+
+EMAIL_FOLDER = """<?xml version="1.0" encoding="UTF-8"?>
+<EmailFolder xmlns="http://soap.sforce.com/2006/04/metadata">
+    <accessType>Public</accessType>
+    <name>Marketing</name>
+    <publicFolderAccess>ReadWrite</publicFolderAccess>
+</EmailFolder>
+"""
+
+def testFolderRoots():
+  assert preflight.expectedRoot('email/Marketing.emailFolder-meta.xml') == (True, 'EmailFolder')
+  assert preflight.expectedRoot('email/Marketing-meta.xml') == (True, 'EmailFolder')
+  assert preflight.expectedRoot('reports/Sales-meta.xml') == (True, 'ReportFolder')
+  assert preflight.expectedRoot('email/Marketing/Welcome.email') == (False, None)
+
+def testEmailFolderHasNoProblem(tmp_path):
+  path = os.path.join(tmp_path, 'Marketing.emailFolder-meta.xml')
+  with open(path, 'w') as f:
+    f.write(EMAIL_FOLDER)
+
+  assert preflight.checkFile(path, 'email/Marketing.emailFolder-meta.xml') == []
+  assert preflight.checkFile(path, 'reports/Marketing-meta.xml') == ['root element is <EmailFolder>, expected <ReportFolder>']
@@ -0,0 +1,20 @@
+import io
+import os
+import zipfile
+
+from pydx.utils import sfdc_utils
+
+def zipSize(folder, files, compressLevel):
+  content = b''.join(sfdc_utils.zipFiles(folder, files, compressLevel=compressLevel, extraFiles={'package.xml': '<Package/>' * 100}))
+  with zipfile.ZipFile(io.BytesIO(content)) as zf:
+    assert zf.testzip() is None
+    assert zf.read('package.xml') == b'<Package/>' * 100
+    return sum(info.compress_size for info in zf.infolist())
+
+def testCompressLevel(tmp_path):
+  os.makedirs(os.path.join(tmp_path, 'classes'))
+  with open(os.path.join(tmp_path, 'classes', 'MyClass.cls'), 'wb') as f:
+    f.write(os.urandom(20000).hex().encode() + b'public class MyClass {}\n' * 2000)
+
+  sizes = [zipSize(str(tmp_path), ['classes/MyClass.cls'], level) for level in (0, 1, 9)]
+  assert sizes[0] > sizes[1] > sizes[2]
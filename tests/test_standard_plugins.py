@@ -0,0 +1,83 @@
+import os
+
+import xmltodict
+
+from pydx.engine.helpers import Helper
+from pydx.standard_plugins import standard_plugins
+
+PROFILE = """<?xml version="1.0" encoding="UTF-8"?>
+<Profile xmlns="http://soap.sforce.com/2006/04/metadata">
+    <classAccesses>
+        <apexClass>MyClass</apexClass>
+        <enabled>false</enabled>
+    </classAccesses>
+    <custom>false</custom>
+    <userPermissions>
+        <enabled>true</enabled>
+        <name>ViewSetup</name>
+    </userPermissions>
+    <userPermissions>
+        <enabled>true</enabled>
+        <name>ViewUserPII</name>
+    </userPermissions>
+</Profile>
+"""
+
+CONNECTED_APP = """<?xml version="1.0" encoding="UTF-8"?>
+<ConnectedApp xmlns="http://soap.sforce.com/2006/04/metadata">
+    <label>MyApp</label>
+    <oauthConfig>
+        <callbackUrl>https://example.com</callbackUrl>
+        <consumerKey>secret</consumerKey>
+    </oauthConfig>
+</ConnectedApp>
+"""
+
+OBJECT = """<?xml version="1.0" encoding="UTF-8"?>
+<CustomObject xmlns="http://soap.sforce.com/2006/04/metadata">
+    <listViews>
+        <fullName>TodaysTasks</fullName>
+    </listViews>
+    <listViews>
+        <fullName>MyTasks</fullName>
+    </listViews>
+</CustomObject>
+"""
+
+def testDirectCallsEditXmltodictDocuments():
+  profile = xmltodict.parse(PROFILE)
+  standard_plugins.enableClassAccessLevel('Admin.profile', profile)
+  standard_plugins.deleteProfilePermissions('Admin.profile', profile)
+  assert profile['Profile']['classAccesses']['enabled'] == 'true'
+  assert [permission['name'] for permission in profile['Profile']['userPermissions']] == ['ViewSetup']
+
+  connectedApp = xmltodict.parse(CONNECTED_APP)
+  standard_plugins.removeOAuthConfig('MyApp.connectedApp', connectedApp)
+  assert 'consumerKey' not in connectedApp['ConnectedApp']['oauthConfig']
+
+  customObject = xmltodict.parse(OBJECT)
+  standard_plugins.removeUselessListViews('Task.object', customObject)
+  assert [listView['fullName'] for listView in customObject['CustomObject']['listViews']] == ['MyTasks']
+
+def testHelperEditsTheSameWay(tmp_path):
+  files = {'profiles/Admin.profile': PROFILE, 'connectedApps/MyApp.connectedApp': CONNECTED_APP, 'objects/Task.object': OBJECT}
+  for relPath, content in files.items():
+    os.makedirs(os.path.join(tmp_path, os.path.dirname(relPath)), exist_ok=True)
+    with open(os.path.join(tmp_path, relPath), 'w') as f:
+      f.write(content)
+
+  helper = Helper(str(tmp_path))
+  helper.editXML('profiles/*.profile', standard_plugins.enableClassAccessLevel)
+  helper.editXML('profiles/*.profile', standard_plugins.deleteProfilePermissions)
+  helper.editXML('connectedApps/*.connectedApp', standard_plugins.removeOAuthConfig)
+  helper.editXML('objects/*.object', standard_plugins.removeUselessListViews)
+
+  def read(relPath):
+    with open(os.path.join(tmp_path, relPath)) as f:
+      return f.read()
+
+  assert read('profiles/Admin.profile') == PROFILE.replace('<enabled>false</enabled>', '<enabled>true</enabled>').replace(
+    '    <userPermissions>\n        <enabled>true</enabled>\n        <name>ViewUserPII</name>\n    </userPermissions>\n', '')
+  assert '<consumerKey>' not in read('connectedApps/MyApp.connectedApp')
+  assert '<fullName>TodaysTasks</fullName>' not in read('objects/Task.object')
+  assert '<fullName>MyTasks</fullName>' in read('objects/Task.object')
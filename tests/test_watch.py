@@ -0,0 +1,44 @@
+import json
+import os
+import sys
+
+from pydx.commands.watch import WatchSession
+from pydx.utils import delta
+
+PLUGIN = """
+def removePermissions(environment, helper):
+  helper.filterElements('profiles/*.profile', 'userPermissions')
+"""
+
+PROFILE = """<?xml version="1.0" encoding="UTF-8"?>
+<Profile xmlns="http://soap.sforce.com/2006/04/metadata">
+    <custom>false</custom>
+    <userPermissions>
+        <enabled>true</enabled>
+        <name>ViewSetup</name>
+    </userPermissions>
+</Profile>
+"""
+
+def testFirstPluginPassIsNotDeployed(tmp_path, monkeypatch):
+  with open(os.path.join(tmp_path, 'watch_test_plugin.py'), 'w') as f:
+    f.write(PLUGIN)
+  settingFile = os.path.join(tmp_path, 'pydx.json')
+  with open(settingFile, 'w') as f:
+    json.dump({'preDeploy': ['watch_test_plugin'], 'postRetrieve': []}, f)
+  folder = os.path.join(tmp_path, 'src')
+  os.makedirs(os.path.join(folder, 'profiles'))
+  with open(os.path.join(folder, 'profiles', 'Admin.profile'), 'w') as f:
+    f.write(PROFILE)
+  monkeypatch.chdir(tmp_path)
+  monkeypatch.setattr(sys, 'path', list(sys.path))
+
+  manifest = delta.DeployManifest(os.path.join(tmp_path, 'manifest.json'))
+  session = WatchSession(None, manifest, folder, settingFile, '55.0', 'NoTestRun', 1, False)
+  try:
+    with open(os.path.join(folder, 'profiles', 'Admin.profile')) as f:
+      assert '<userPermissions>' not in f.read()
+    # Nothing changed since the session started, so nothing is deployed (the connection would be used)
+    session.push(['profiles/Admin.profile'])
+  finally:
+    session.close()